@@ -1,19 +1,62 @@
+# Imported first, so start-up timings include the imports below
+from app.startup import startup
 from flask import Flask
+from app.assets import setup_assets
+from app.calculator import expression_cache, expression_limits
 from app.config import Config
+from app.executor import executor
+from app.json_provider import FastJSONProvider
 from app.logging_config import setup_logging
 from app.metrics import setup_metrics
+from app.rate_limit import setup_rate_limit
+from app.result_cache import result_cache
+from app.tracing import setup_tracing
 
 
 def create_app(config_class=Config):
+    startup.begin(config_class.STARTUP_BUDGET_MS)
     app = Flask(__name__, 
                 template_folder='../templates',
                 static_folder='../static')
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
     
-    setup_logging(app)
-    setup_metrics(app)
+    with startup.phase('caches'):
+        expression_limits.configure(
+            max_tokens=app.config['EXPRESSION_MAX_TOKENS'],
+            max_nodes=app.config['EXPRESSION_MAX_NODES'],
+            max_depth=app.config['EXPRESSION_MAX_DEPTH'],
+        )
+        expression_cache.clear()
+        expression_cache.resize(app.config['EXPRESSION_CACHE_SIZE'])
+        result_cache.configure(
+            enabled=app.config['RESULT_CACHE_ENABLED'],
+            maxsize=app.config['RESULT_CACHE_SIZE'],
+            ttl=app.config['RESULT_CACHE_TTL'],
+            shared_path=app.config['RESULT_CACHE_SHARED_PATH'],
+            shared_slots=app.config['RESULT_CACHE_SHARED_SLOTS'],
+        )
+    
+    executor.configure(
+        mode=app.config['EXECUTOR_MODE'],
+        workers=app.config['EXECUTOR_WORKERS'],
+        threshold=app.config['EXECUTOR_THRESHOLD'],
+        chunk_size=app.config['EXECUTOR_CHUNK_SIZE'],
+    )
+    
+    with startup.phase('logging'):
+        setup_logging(app)
+    with startup.phase('rate_limit'):
+        setup_rate_limit(app)
+    with startup.phase('tracing'):
+        setup_tracing(app)
+    with startup.phase('metrics'):
+        setup_metrics(app)
     
     from app.routes import main
     app.register_blueprint(main)
+    with startup.phase('assets'):
+        setup_assets(app)
     
-    return app
\ No newline at end of file
+    startup.finish(app, app.config['STARTUP_WARMUP'])
+    return app
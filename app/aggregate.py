@@ -0,0 +1,366 @@
+import math
+import sys
+from array import array
+from typing import Dict, Iterable, List, Sequence
+
+from app.limits import check_budget
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; aggregates fall back to pure Python
+    np = None
+
+
+AGGREGATES = ('sum', 'mean', 'min', 'max', 'variance', 'stddev', 'quantiles', 'dot', 'cumsum')
+DEFAULT_AGGREGATES = ('sum', 'mean', 'min', 'max', 'variance', 'stddev')
+
+# Values per block: large enough to amortize NumPy call overhead, small
+# enough that a block and its temporaries stay in cache
+BLOCK = 1 << 16
+
+
+def as_column(values):
+    """Convert request values (a list, or an existing column) to float64."""
+    if np is not None:
+        if isinstance(values, np.ndarray) and values.dtype == np.float64:
+            return values
+        try:
+            column = np.asarray(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid number format")
+        if column.ndim != 1:
+            raise ValueError("Values must be a flat array of numbers")
+        return column
+    if isinstance(values, array) and values.typecode == 'd':
+        return values
+    if not isinstance(values, list) or any(isinstance(value, bool) for value in values):
+        raise ValueError("Invalid number format")
+    try:
+        return array('d', values)
+    except TypeError:
+        raise ValueError("Invalid number format")
+
+
+def from_float64_bytes(body: bytes):
+    """View a body of packed little-endian float64 values as a column.
+
+    With NumPy the column is a read-only view of ``body``, so no copy is
+    made; without it the bytes are copied once into an ``array('d')``.
+    """
+    if len(body) % 8:
+        raise ValueError("Binary body length must be a multiple of 8 bytes (float64 values)")
+    if np is not None:
+        return np.frombuffer(body, dtype='<f8')
+    column = array('d')
+    column.frombytes(body)
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def aggregate(values, operations: Sequence[str] = DEFAULT_AGGREGATES, other=None,
+              quantiles: Sequence[float] = (), ddof: int = 0) -> Dict[str, object]:
+    """Compute the requested aggregates of ``values`` in one call.
+
+    ``values`` (and ``other``, the second operand of ``dot``) are float64
+    columns from :func:`as_column` or :func:`from_float64_bytes`. Sums are
+    compensated, so their error does not grow with the number of values;
+    variance uses Welford's update (Chan's parallel form over NumPy blocks)
+    with ``ddof`` delta degrees of freedom. Quantiles interpolate linearly.
+    ``cumsum`` returns a column as long as the input; everything else is a
+    float. Results are keyed by operation name.
+    """
+    for operation in operations:
+        if operation not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate: {operation}")
+    count = len(values)
+    if not count:
+        raise ValueError("No values provided")
+    if ddof not in (0, 1):
+        raise ValueError("ddof must be 0 or 1")
+    if 'dot' in operations:
+        if other is None:
+            raise ValueError("Aggregate dot requires other values")
+        if len(other) != count:
+            raise ValueError("Values and other values must have the same length")
+    if 'quantiles' in operations:
+        if not quantiles:
+            raise ValueError("Aggregate quantiles requires quantiles")
+        if not all(isinstance(q, (int, float)) and not isinstance(q, bool) and 0 <= q <= 1 for q in quantiles):
+            raise ValueError("Quantiles must be numbers between 0 and 1")
+    if count <= ddof and ('variance' in operations or 'stddev' in operations):
+        raise ValueError("Not enough values for variance")
+
+    kernel = _NumpyKernel if np is not None else _PythonKernel
+    results = {}
+    wanted = set(operations)
+    if wanted & {'sum', 'mean', 'variance', 'stddev'}:
+        total, mean, m2 = kernel.moments(values, wanted & {'variance', 'stddev'})
+        if 'sum' in wanted:
+            results['sum'] = total
+        if 'mean' in wanted:
+            results['mean'] = mean
+        if m2 is not None:
+            variance = m2 / (count - ddof)
+            if 'variance' in wanted:
+                results['variance'] = variance
+            if 'stddev' in wanted:
+                results['stddev'] = math.sqrt(variance)
+    if 'min' in wanted:
+        results['min'] = kernel.minimum(values)
+    if 'max' in wanted:
+        results['max'] = kernel.maximum(values)
+    if 'quantiles' in wanted:
+        results['quantiles'] = [{'q': q, 'value': value}
+                                for q, value in zip(quantiles, kernel.quantiles(values, quantiles))]
+    if 'dot' in wanted:
+        results['dot'] = kernel.dot(values, other)
+    if 'cumsum' in wanted:
+        results['cumsum'] = kernel.cumsum(values)
+    return results
+
+
+def _fsum(parts: Iterable[float]) -> float:
+    """Exactly rounded sum of ``parts``; infinities and overflow give the IEEE result.
+
+    ``parts`` must be re-iterable: the overflow fallbacks read it again.
+    """
+    try:
+        return math.fsum(parts)
+    except OverflowError:
+        # A partial sum overflowed: halving is exact, and doubling overflows
+        # to inf only if the total itself does
+        try:
+            return 2 * math.fsum(part / 2 for part in parts)
+        except (OverflowError, ValueError):
+            return sum(parts)
+    except ValueError:
+        # inf - inf: plain addition gives the IEEE result
+        return sum(parts)
+
+
+class _Products:
+    """Re-iterable stream of ``values[i] * other[i]``, checking the CPU budget every ``BLOCK`` values."""
+
+    __slots__ = ('values', 'other')
+
+    def __init__(self, values, other):
+        self.values = values
+        self.other = other
+
+    def __iter__(self):
+        for i, (a, b) in enumerate(zip(self.values, self.other)):
+            if not i % BLOCK:
+                check_budget()
+            yield a * b
+
+
+class _NumpyKernel:
+    """Blocked, vectorized aggregates over a float64 array."""
+
+    @staticmethod
+    def two_sum(x):
+        """Sum ``x`` by pairwise error-free TwoSum steps.
+
+        Returns ``(total, error)``: the pairwise floating-point sum and the
+        accumulated rounding errors of its additions, so ``total + error``
+        is the sum to about twice working precision. ``len(x)`` must be a
+        power of two (pad with zeros).
+        """
+        error = 0.0
+        while len(x) > 1:
+            half = len(x) // 2
+            a = x[:half]
+            b = x[half:]
+            s = a + b
+            z = s - a
+            error += float(np.sum((a - (s - z)) + (b - z)))
+            x = s
+        return float(x[0]), error
+
+    @staticmethod
+    def block_sum(block):
+        """``(total, error)`` of one block via :meth:`two_sum`, as floats."""
+        size = len(block)
+        padded = block
+        if size & (size - 1):
+            padded = np.zeros(1 << size.bit_length())
+            padded[:size] = block
+        total, error = _NumpyKernel.two_sum(padded)
+        if not math.isfinite(total + error):
+            return float(np.sum(block)), 0.0
+        return total, error
+
+    @staticmethod
+    def moments(values, second_moment: bool):
+        """``(sum, mean, m2)``; ``m2`` (sum of squared deviations) only if asked.
+
+        Deviations are taken from the data shifted by its first value, so a
+        large common offset does not cost precision in the running mean.
+        """
+        parts = []
+        count = 0
+        mean = 0.0
+        m2 = 0.0
+        shift = float(values[0])
+        with np.errstate(all='ignore'):
+            for start in range(0, len(values), BLOCK):
+                check_budget()
+                block = values[start:start + BLOCK]
+                parts += _NumpyKernel.block_sum(block)
+                if not second_moment:
+                    continue
+                # Chan et al.: merge this block's mean and m2 into the running ones
+                size = len(block)
+                deviations = block - shift
+                block_mean = sum(_NumpyKernel.block_sum(deviations)) / size
+                deviations -= block_mean
+                np.square(deviations, out=deviations)
+                block_m2 = float(np.sum(deviations))
+                merged = count + size
+                delta = block_mean - mean
+                mean += delta * size / merged
+                m2 += block_m2 + delta * delta * count * size / merged
+                count = merged
+        total = _fsum(parts)
+        return total, total / len(values), (m2 if second_moment else None)
+
+    @staticmethod
+    def minimum(values):
+        return float(np.min(values))
+
+    @staticmethod
+    def maximum(values):
+        return float(np.max(values))
+
+    @staticmethod
+    def quantiles(values, quantiles):
+        check_budget()
+        return np.quantile(values, quantiles).tolist()
+
+    @staticmethod
+    def dot(values, other):
+        """Compensated dot product: TwoProduct (Dekker) plus TwoSum."""
+        parts = []
+        split = 134217729.0  # 2**27 + 1
+        with np.errstate(all='ignore'):
+            for start in range(0, len(values), BLOCK):
+                check_budget()
+                a = values[start:start + BLOCK]
+                b = other[start:start + BLOCK]
+                product = a * b
+                c = split * a
+                a_high = c - (c - a)
+                a_low = a - a_high
+                c = split * b
+                b_high = c - (c - b)
+                b_low = b - b_high
+                product_error = ((a_high * b_high - product) + a_high * b_low + a_low * b_high) + a_low * b_low
+                block_parts = _NumpyKernel.block_sum(product) + (float(np.sum(product_error)),)
+                if not math.isfinite(sum(block_parts)):
+                    block_parts = (float(np.dot(a, b)),)
+                parts += block_parts
+        return _fsum(parts)
+
+    @staticmethod
+    def cumsum(values):
+        """Compensated cumulative sums.
+
+        ``np.cumsum`` yields exactly the rounded sequential prefix sums, so
+        the rounding error of every step can be recovered from consecutive
+        prefixes with TwoSum; adding the running sum of those errors back
+        gives each prefix to about twice working precision.
+        """
+        count = len(values)
+        out = np.empty(count)
+        scan = np.empty(min(count, BLOCK) + 1)
+        running = 0.0
+        compensation = 0.0
+        with np.errstate(all='ignore'):
+            for start in range(0, count, BLOCK):
+                check_budget()
+                block = values[start:start + BLOCK]
+                size = len(block)
+                sums = scan[:size + 1]
+                sums[0] = running
+                sums[1:] = block
+                np.cumsum(sums, out=sums)
+                previous = sums[:-1]
+                current = sums[1:]
+                z = current - previous
+                errors = (previous - (current - z)) + (block - z)
+                errors[0] += compensation
+                np.cumsum(errors, out=errors)
+                # Past an infinity the error terms are NaN; keep the IEEE prefix
+                out[start:start + size] = np.where(np.isfinite(current), current + errors, current)
+                running = float(current[-1])
+                compensation = float(errors[-1])
+        return out
+
+
+class _PythonKernel:
+    """Single-pass aggregates over a sequence of floats."""
+
+    @staticmethod
+    def moments(values, second_moment: bool):
+        total = _fsum(values)
+        if not second_moment:
+            return total, total / len(values), None
+        # Welford's update, one value at a time, on the data shifted by its first value
+        count = 0
+        mean = 0.0
+        m2 = 0.0
+        shift = values[0]
+        for i, value in enumerate(values):
+            if not i % BLOCK:
+                check_budget()
+            count += 1
+            value -= shift
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+        return total, total / count, m2
+
+    @staticmethod
+    def minimum(values):
+        return float('nan') if any(value != value for value in values) else min(values)
+
+    @staticmethod
+    def maximum(values):
+        return float('nan') if any(value != value for value in values) else max(values)
+
+    @staticmethod
+    def quantiles(values, quantiles) -> List[float]:
+        if any(value != value for value in values):
+            return [float('nan')] * len(quantiles)
+        ordered = sorted(values)
+        last = len(ordered) - 1
+        results = []
+        for q in quantiles:
+            position = q * last
+            low = int(position)
+            high = min(low + 1, last)
+            results.append(ordered[low] + (ordered[high] - ordered[low]) * (position - low))
+        return results
+
+    @staticmethod
+    def dot(values, other):
+        return _fsum(_Products(values, other))
+
+    @staticmethod
+    def cumsum(values) -> array:
+        out = array('d', bytes(8 * len(values)))
+        total = 0.0
+        compensation = 0.0
+        for i, value in enumerate(values):
+            if not i % BLOCK:
+                check_budget()
+            updated = total + value
+            if abs(total) >= abs(value):
+                compensation += (total - updated) + value
+            else:
+                compensation += (value - updated) + total
+            total = updated
+            # Past an infinity the compensation is NaN; keep the IEEE prefix
+            out[i] = total + compensation if math.isfinite(total) else total
+        return out
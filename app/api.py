@@ -0,0 +1,510 @@
+"""
+Request handlers shared by the Flask blueprint and the ASGI app.
+
+Each handler takes the decoded JSON body (``None`` when the body is missing
+or not valid JSON) and the app config, and returns ``(payload, status)``.
+They never touch a framework request object, so both servers run exactly
+the same validation, calculation and logging code. Streaming endpoints use
+an incremental object (see :class:`CalculationStream`) that each server
+feeds with body bytes as they arrive.
+"""
+
+from app.aggregate import AGGREGATES, DEFAULT_AGGREGATES, from_float64_bytes
+from app.calculator import Calculator, check_finite
+from app.expression import expression_from_handle
+from app.limits import LimitExceeded, cpu_budget
+from app.logging_config import RouteLogger
+from app.numeric import numeric_mode
+from app.result_cache import result_cache
+from app.tracing import stage
+
+calculate_log = RouteLogger('calculate')
+batch_log = RouteLogger('calculate_batch')
+evaluate_log = RouteLogger('evaluate')
+compile_log = RouteLogger('compile_expression')
+stream_log = RouteLogger('calculate_stream')
+aggregate_log = RouteLogger('aggregate')
+
+HEALTH = {
+    'status': 'healthy',
+    'service': 'flask-calculator',
+    'version': '1.0.0'
+}
+
+# Probe bodies: liveness only needs the process to answer, readiness also
+# needs start-up (and any warm-up) to have finished
+LIVE = {'status': 'alive'}
+READY = {'status': 'ready'}
+NOT_READY = {'status': 'starting'}
+
+
+def body_too_large(config, limit='MAX_CONTENT_LENGTH'):
+    """Payload for a request rejected by ``MAX_CONTENT_LENGTH`` (or ``limit``)."""
+    return {'error': f"Request body too large (maximum {config.get(limit)} bytes)"}
+
+
+def calculate(data, config):
+    log = calculate_log.begin()
+    try:
+        if not data:
+            return {'error': 'No data provided'}, 400
+        if not isinstance(data, dict):
+            return {'error': 'Invalid calculation format'}, 400
+        
+        operation = data.get('operation')
+        a = data.get('a')
+        b = data.get('b')
+        
+        if operation is None or a is None:
+            return {'error': 'Missing required parameters'}, 400
+        
+        mode = numeric_mode(data.get('mode'), data.get('precision'), config)
+        if mode is not None:
+            a = mode.parse(a)
+            b = mode.parse(b) if b is not None else None
+            log.info("Calculating", lambda: {'operation': operation, 'a': str(a), 'b': str(b), 'mode': mode.name})
+            with cpu_budget(config.get('REQUEST_CPU_BUDGET')), stage('calculate'):
+                result = Calculator.calculate(operation, a, b, mode)
+            log.info("Calculation successful", lambda: {'result': str(result)})
+            return {
+                'result': mode.serialize(result),
+                'operation': operation,
+                'a': mode.serialize(a),
+                'b': mode.serialize(b) if b is not None else None,
+                'mode': mode.name
+            }, 200
+        
+        try:
+            a = float(a)
+            b = float(b) if b is not None else None
+        except (TypeError, ValueError):
+            return {'error': 'Invalid number format'}, 400
+        
+        log.info("Calculating", lambda: {'operation': operation, 'a': a, 'b': b})
+        
+        # Calculator.calculate is traced here rather than in the calculator:
+        # expressions call it once per node
+        with stage('calculate'):
+            result = check_finite(result_cache.calculate(operation, a, b))
+        
+        log.info("Calculation successful", lambda: {'result': result})
+        
+        return {
+            'result': result,
+            'operation': operation,
+            'a': a,
+            'b': b
+        }, 200
+        
+    except LimitExceeded as e:
+        log.warning("Request rejected", lambda e=e: {'error': str(e), 'reason': e.reason})
+        return {'error': str(e)}, e.status
+    except ValueError as e:
+        log.warning("Calculation error", lambda e=e: {'error': str(e)})
+        return {'error': str(e)}, 400
+    except Exception as e:
+        log.error("Unexpected error", lambda e=e: {'error': str(e)}, exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+
+def calculate_batch(data, config):
+    log = batch_log.begin()
+    try:
+        if not data:
+            return {'error': 'No data provided'}, 400
+        
+        mode = None
+        if isinstance(data, dict):
+            mode = numeric_mode(data.get('mode'), data.get('precision'), config)
+            if 'calculations' in data:
+                data = data['calculations']
+        
+        if isinstance(data, list):
+            if not all(isinstance(row, dict) for row in data):
+                return {'error': 'Invalid batch format'}, 400
+            operations = [row.get('operation') for row in data]
+            a_values = [row.get('a') for row in data]
+            b_values = [row.get('b') for row in data]
+        elif isinstance(data, dict):
+            a_values = data.get('a')
+            b_values = data.get('b')
+            operations = data.get('operation')
+            if not isinstance(a_values, list):
+                return {'error': 'Invalid batch format'}, 400
+            if isinstance(operations, str) or operations is None:
+                operations = [operations] * len(a_values)
+            if b_values is None:
+                b_values = [None] * len(a_values)
+            if not isinstance(operations, list) or not isinstance(b_values, list) \
+                    or not len(operations) == len(a_values) == len(b_values):
+                return {'error': 'Batch columns must have the same length'}, 400
+        else:
+            return {'error': 'Invalid batch format'}, 400
+        
+        max_size = config.get('BATCH_MAX_SIZE', 10000)
+        if len(operations) > max_size:
+            return {'error': f'Batch too large (maximum {max_size} rows)'}, 400
+        
+        with cpu_budget(config.get('REQUEST_CPU_BUDGET')):
+            results, errors = Calculator.calculate_batch(operations, a_values, b_values, mode)
+        error_count = len(errors) - errors.count(None)
+        
+        log.info("Batch calculation", lambda: {'count': len(results), 'error_count': error_count})
+        
+        payload = {
+            'results': results,
+            'errors': errors,
+            'count': len(results),
+            'error_count': error_count
+        }
+        if mode is not None:
+            payload['results'] = [mode.serialize(result) if result is not None else None for result in results]
+            payload['mode'] = mode.name
+        return payload, 200
+        
+    except LimitExceeded as e:
+        log.warning("Request rejected", lambda e=e: {'error': str(e), 'reason': e.reason})
+        return {'error': str(e)}, e.status
+    except ValueError as e:
+        log.warning("Batch calculation error", lambda e=e: {'error': str(e)})
+        return {'error': str(e)}, 400
+    except Exception as e:
+        log.error("Unexpected error", lambda e=e: {'error': str(e)}, exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+
+def evaluate(data, config):
+    log = evaluate_log.begin()
+    try:
+        if data and not isinstance(data, dict):
+            return {'error': 'Invalid expression format'}, 400
+        if not data or ('expression' not in data and 'handle' not in data):
+            return {'error': 'No expression provided'}, 400
+        
+        if 'handle' in data:
+            expression = expression_from_handle(str(data['handle']))
+        else:
+            expression = data['expression']
+        if not isinstance(expression, str):
+            return {'error': 'Expression must be a string'}, 400
+        log.info("Evaluating expression", lambda: {'expression': expression})
+        mode = numeric_mode(data.get('mode'), data.get('precision'), config)
+        
+        if 'bindings' in data:
+            bindings = data['bindings']
+            if isinstance(bindings, dict):
+                rows = max((len(column) for column in bindings.values() if isinstance(column, list)), default=1)
+            else:
+                rows = len(bindings) if isinstance(bindings, list) else 0
+            max_size = config.get('BATCH_MAX_SIZE', 10000)
+            if rows > max_size:
+                return {'error': f'Too many bindings (maximum {max_size} rows)'}, 400
+            
+            compiled = Calculator.compile_expression(expression)
+            with cpu_budget(config.get('REQUEST_CPU_BUDGET')):
+                results, errors = Calculator.evaluate_bindings(compiled, bindings, mode)
+            error_count = len(errors) - errors.count(None)
+            
+            log.info("Evaluation successful", lambda: {'count': len(results), 'error_count': error_count})
+            
+            payload = {
+                'results': results,
+                'errors': errors,
+                'count': len(results),
+                'error_count': error_count,
+                'expression': compiled.source
+            }
+            if mode is not None:
+                payload['results'] = [mode.serialize(result) if result is not None else None for result in results]
+                payload['mode'] = mode.name
+            return payload, 200
+        
+        with cpu_budget(config.get('REQUEST_CPU_BUDGET')):
+            result = Calculator.evaluate_expression(expression, data.get('variables'), mode)
+        if mode is None:
+            check_finite(result)
+        
+        log.info("Evaluation successful", lambda: {'result': str(result)})
+        
+        payload = {
+            'result': result,
+            'expression': expression
+        }
+        if mode is not None:
+            payload['result'] = mode.serialize(result)
+            payload['mode'] = mode.name
+        return payload, 200
+        
+    except LimitExceeded as e:
+        log.warning("Request rejected", lambda e=e: {'error': str(e), 'reason': e.reason})
+        return {'error': str(e)}, e.status
+    except ValueError as e:
+        log.warning("Evaluation error", lambda e=e: {'error': str(e)})
+        return {'error': str(e)}, 400
+    except Exception as e:
+        log.error("Unexpected error", lambda e=e: {'error': str(e)}, exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+
+def aggregate(data, config):
+    log = aggregate_log.begin()
+    try:
+        if not isinstance(data, dict):
+            return {'error': 'Invalid aggregate format'}, 400
+        if data.get('values') is None:
+            return {'error': 'No values provided'}, 400
+        
+        operations = data.get('operations')
+        quantiles = data.get('quantiles') or ()
+        if operations is None:
+            operations = list(DEFAULT_AGGREGATES)
+            if quantiles:
+                operations.append('quantiles')
+            if data.get('other') is not None:
+                operations.append('dot')
+        elif isinstance(operations, str):
+            operations = [operations]
+        if not isinstance(operations, list) or not all(isinstance(name, str) for name in operations):
+            return {'error': f"Operations must be a list of: {', '.join(AGGREGATES)}"}, 400
+        if not isinstance(quantiles, (list, tuple)):
+            return {'error': 'Quantiles must be a list of numbers'}, 400
+        ddof = data.get('ddof', 0)
+        
+        with cpu_budget(config.get('REQUEST_CPU_BUDGET')):
+            results = Calculator.aggregate(data['values'], operations, data.get('other'), quantiles, ddof)
+        count = len(data['values'])
+        
+        log.info("Aggregation successful", lambda: {'count': count, 'operations': operations})
+        
+        return {'count': count, 'results': results}, 200
+        
+    except LimitExceeded as e:
+        log.warning("Request rejected", lambda e=e: {'error': str(e), 'reason': e.reason})
+        return {'error': str(e)}, e.status
+    except ValueError as e:
+        log.warning("Aggregation error", lambda e=e: {'error': str(e)})
+        return {'error': str(e)}, 400
+    except Exception as e:
+        log.error("Unexpected error", lambda e=e: {'error': str(e)}, exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+
+def aggregate_binary(body, args, config):
+    """:func:`aggregate` for a body of packed little-endian float64 values.
+    
+    Parameters come from the query string ``args``: comma-separated
+    ``operations`` and ``quantiles``, ``ddof``, and ``columns=2`` to split
+    the body into equal ``values`` and ``other`` halves (for ``dot``).
+    """
+    try:
+        column = from_float64_bytes(body)
+        data = {'values': column}
+        columns = args.get('columns', '1')
+        if columns == '2':
+            if len(column) % 2:
+                raise ValueError("Binary body must hold two columns of equal length")
+            half = len(column) // 2
+            data['values'] = column[:half]
+            data['other'] = column[half:]
+        elif columns != '1':
+            raise ValueError("columns must be 1 or 2")
+        if args.get('operations'):
+            data['operations'] = args['operations'].split(',')
+        try:
+            if args.get('quantiles'):
+                data['quantiles'] = [float(q) for q in args['quantiles'].split(',')]
+            if args.get('ddof'):
+                data['ddof'] = int(args['ddof'])
+        except ValueError:
+            raise ValueError("Invalid number format")
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return aggregate(data, config)
+
+
+def compile_expression(data, config):
+    log = compile_log.begin()
+    try:
+        if data and not isinstance(data, dict):
+            return {'error': 'Invalid expression format'}, 400
+        if not data or 'expression' not in data:
+            return {'error': 'No expression provided'}, 400
+        
+        if not isinstance(data['expression'], str):
+            return {'error': 'Expression must be a string'}, 400
+        
+        compiled = Calculator.compile_expression(data['expression'])
+        
+        return {
+            'handle': compiled.handle,
+            'expression': compiled.source,
+            'variables': list(compiled.variables)
+        }, 200
+        
+    except LimitExceeded as e:
+        log.warning("Request rejected", lambda e=e: {'error': str(e), 'reason': e.reason})
+        return {'error': str(e)}, e.status
+    except ValueError as e:
+        log.warning("Compilation error", lambda e=e: {'error': str(e)})
+        return {'error': str(e)}, 400
+    except Exception as e:
+        log.error("Unexpected error", lambda e=e: {'error': str(e)}, exc_info=True)
+        return {'error': 'Internal server error'}, 500
+
+
+class LineSplitter:
+    """Split a byte stream into lines while holding at most ``max_line`` bytes.
+    
+    ``push`` returns the complete lines found so far; a line longer than
+    ``max_line`` is discarded as it arrives and reported as None.
+    """
+    
+    def __init__(self, max_line):
+        self.max_line = max_line
+        self._buffer = bytearray()
+        self._overflow = False
+    
+    def push(self, data):
+        lines = []
+        start = 0
+        while True:
+            end = data.find(b'\n', start)
+            if end < 0:
+                break
+            if self._overflow:
+                lines.append(None)
+                self._overflow = False
+            elif self._buffer:
+                self._buffer += data[start:end]
+                lines.append(bytes(self._buffer) if len(self._buffer) <= self.max_line else None)
+                self._buffer.clear()
+            else:
+                lines.append(data[start:end] if end - start <= self.max_line else None)
+            start = end + 1
+        if not self._overflow:
+            self._buffer += data[start:]
+            if len(self._buffer) > self.max_line:
+                self._overflow = True
+                self._buffer.clear()
+        return lines
+    
+    def finish(self):
+        """Return the unterminated last line, if any."""
+        if self._overflow:
+            self._overflow = False
+            return [None]
+        line = bytes(self._buffer)
+        self._buffer.clear()
+        return [line] if line.strip() else []
+
+
+class CalculationStream:
+    """Incremental NDJSON calculation for ``/api/calculate/stream``.
+    
+    Each input line is a ``{"operation", "a", "b"}`` object (optionally with
+    an ``id``, which is echoed back). Parsed lines are buffered and evaluated
+    with :meth:`Calculator.calculate_batch` every ``STREAM_CHUNK_SIZE`` rows,
+    and each chunk comes back as encoded NDJSON bytes, one
+    ``{"line", "result", "error"}`` object per input line. Malformed lines
+    get a per-line error. The last output line is a ``{"done": true, ...}``
+    summary. Memory is bounded by the chunk size and ``STREAM_MAX_LINE_BYTES``,
+    whatever the size of the input.
+    """
+    
+    def __init__(self, config, loads, encode):
+        self.chunk_size = config.get('STREAM_CHUNK_SIZE', 1000)
+        self.splitter = LineSplitter(config.get('STREAM_MAX_LINE_BYTES', 65536))
+        self.loads = loads
+        self.encode = encode
+        self.line = 0
+        self.count = 0
+        self.error_count = 0
+        self.log = stream_log.begin()
+        self._rows = []  # (line, id, operation, a, b, error)
+    
+    def feed(self, data):
+        """Consume a block of body bytes; returns encoded output (maybe empty)."""
+        output = []
+        for raw in self.splitter.push(data):
+            self._add(raw)
+            if len(self._rows) >= self.chunk_size:
+                output.append(self._flush())
+        return b''.join(output)
+    
+    def finish(self):
+        """Flush the remaining rows and append the summary line."""
+        for raw in self.splitter.finish():
+            self._add(raw)
+        output = self._flush()
+        self.log.info("Stream calculation", lambda: {'count': self.count, 'error_count': self.error_count})
+        return output + self.encode({'done': True, 'count': self.count,
+                                     'error_count': self.error_count}) + b'\n'
+    
+    def fail(self, error):
+        """Output line ending a stream that hit an unexpected error."""
+        self.log.error("Unexpected error", lambda: {'error': str(error), 'line': self.line}, exc_info=True)
+        return self.encode({'done': False, 'error': 'Internal server error', 'line': self.line}) + b'\n'
+    
+    def run(self, read, block_size=65536):
+        """Generator of output chunks for a blocking ``read(size)`` callable."""
+        try:
+            while True:
+                data = read(block_size)
+                if not data:
+                    break
+                output = self.feed(data)
+                if output:
+                    yield output
+            yield self.finish()
+        except Exception as e:
+            yield self.fail(e)
+    
+    def _add(self, raw):
+        self.line += 1
+        if raw is None:
+            self._rows.append((self.line, None, None, None, None, 'Line too long'))
+            return
+        if not raw.strip():
+            self.line -= 1
+            return
+        try:
+            row = self.loads(raw)
+        except ValueError:
+            self._rows.append((self.line, None, None, None, None, 'Invalid JSON'))
+            return
+        if not isinstance(row, dict):
+            self._rows.append((self.line, None, None, None, None, 'Invalid calculation format'))
+            return
+        operation = row.get('operation')
+        error = None
+        if operation is not None and not isinstance(operation, str):
+            error = 'Invalid operation'
+        self._rows.append((self.line, row.get('id'), operation, row.get('a'), row.get('b'), error))
+    
+    def _flush(self):
+        rows = self._rows
+        if not rows:
+            return b''
+        self._rows = []
+        
+        valid = [row for row in rows if row[5] is None]
+        results, errors = Calculator.calculate_batch([row[2] for row in valid],
+                                                     [row[3] for row in valid],
+                                                     [row[4] for row in valid])
+        outcome = iter(zip(results, errors))
+        encode = self.encode
+        output = []
+        for line, row_id, _, _, _, error in rows:
+            result = None
+            if error is None:
+                result, error = next(outcome)
+            record = {'line': line, 'result': result, 'error': error}
+            if row_id is not None:
+                record['id'] = row_id
+            output.append(encode(record))
+            self.count += 1
+            if error is not None:
+                self.error_count += 1
+        output.append(b'')
+        return b'\n'.join(output)
+
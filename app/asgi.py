@@ -0,0 +1,377 @@
+"""
+Native ASGI application.
+
+Serves the same API, /health and /metrics contract as the Flask app from an
+asyncio server such as uvicorn. Requests are dispatched straight to the
+handlers in :mod:`app.api` without building a Flask request or pushing a
+context, so a slow client only holds a suspended coroutine instead of one
+of the worker's threads. Small requests run their handler inline on the
+event loop; bodies of at least ``ASGI_OFFLOAD_MIN_BYTES`` and exact-mode
+calculations run in a worker thread, so a large batch or aggregate does not
+stall the other connections.
+"""
+
+import asyncio
+import itertools
+import time
+from urllib.parse import parse_qs
+
+from app import api, create_app
+from app.assets import assets
+from app.limits import admission
+from app.logging_config import request_info
+from app.metrics import metrics_collector, render_metrics
+from app.profiler import render_profile
+from app.rate_limit import REJECTIONS, is_limited_path, rate_limiter
+from app.startup import startup
+from app.tracing import request_attributes, stage, tracer
+
+# path -> (metrics endpoint name, handler); names match the Flask endpoints
+API_ROUTES = {
+    '/api/calculate': ('main.calculate', api.calculate),
+    '/api/calculate/batch': ('main.calculate_batch', api.calculate_batch),
+    '/api/evaluate': ('main.evaluate', api.evaluate),
+    '/api/evaluate/compile': ('main.compile_expression', api.compile_expression),
+    '/api/aggregate': ('main.aggregate', api.aggregate),
+}
+
+AGGREGATE_PATH = '/api/aggregate'
+
+STREAM_PATH = '/api/calculate/stream'
+
+# path -> (metrics endpoint name, profile kind)
+PROFILE_ROUTES = {
+    '/debug/profile': ('debug_profile', 'profile'),
+    '/debug/allocations': ('debug_allocations', 'allocations'),
+}
+
+NOT_FOUND = {'error': 'Not found'}
+METHOD_NOT_ALLOWED = {'error': 'Method not allowed'}
+
+
+class CalculatorASGI:
+    """ASGI callable wrapping one configured Flask app.
+
+    The Flask app is only used at startup: ``create_app`` applies the config
+    to the caches, logging and metrics, builds the static assets and the
+    homepage (see :mod:`app.assets`) and provides the JSON provider, so
+    response bodies are byte-for-byte the same as the WSGI app's.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.json = flask_app.json
+        self.metrics_enabled = self.config.get('METRICS_ENABLED', True)
+        self.metrics_format = self.config.get('METRICS_FORMAT', 'json')
+        self.max_content_length = self.config.get('MAX_CONTENT_LENGTH')
+        self.aggregate_max_content_length = self.config.get('AGGREGATE_MAX_CONTENT_LENGTH')
+        self.offload_min_bytes = self.config.get('ASGI_OFFLOAD_MIN_BYTES', 16384)
+        header = self.config.get('RATE_LIMIT_CLIENT_HEADER', '')
+        self.client_header = header.lower().encode('latin-1') if header else None
+        sample_rate = self.config.get('METRICS_SAMPLE_RATE', 1.0)
+        self.sample_every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self.tracing_enabled = self.config.get('TRACING_ENABLED', True)
+        self.admin_token = self.config.get('ADMIN_TOKEN')
+        self._counter = itertools.count()
+        self.health_body = self.json.encode_constant(api.HEALTH)
+        self.live_body = self.json.encode_constant(api.LIVE)
+        self.ready_body = self.json.encode_constant(api.READY)
+        self.not_ready_body = self.json.encode_constant(api.NOT_READY)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http':
+            await self.handle_http(scope, receive, send)
+        elif scope['type'] == 'lifespan':
+            await self.handle_lifespan(receive, send)
+
+    async def handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if metrics_collector.multiproc_dir:
+                    metrics_collector.publish()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def handle_http(self, scope, receive, send):
+        sample_every = self.sample_every
+        timed = self.metrics_enabled and (
+            sample_every == 1 or (sample_every and not next(self._counter) % sample_every))
+        start = time.perf_counter_ns() if timed else 0
+
+        method = scope['method']
+        path = scope['path']
+        client = scope.get('client')
+        request_id = 'no-request-id'
+        client_id = client[0] if client else 'unknown'
+        traceparent = tracestate = None
+        for name, value in scope['headers']:
+            if name == b'x-request-id':
+                request_id = value.decode('latin-1')
+            elif name == b'traceparent':
+                traceparent = value.decode('latin-1')
+            elif name == b'tracestate':
+                tracestate = value.decode('latin-1')
+            elif name == self.client_header and value:
+                client_id = value.decode('latin-1')
+        request_info.set({
+            'request_id': request_id,
+            'method': method,
+            'path': path,
+            'remote_addr': client[0] if client else None,
+        })
+        trace = None
+        if self.tracing_enabled:
+            trace, token = tracer.start(traceparent, tracestate)
+
+        if rate_limiter.enabled and is_limited_path(path):
+            rejection = rate_limiter.acquire(client_id)
+            if rejection is not None:
+                endpoint, status = 'rate_limit', rejection[0]
+                await self.reject(send, *rejection)
+            else:
+                try:
+                    endpoint, status = await self.route(scope, receive, send, method, path)
+                finally:
+                    rate_limiter.release()
+        else:
+            endpoint, status = await self.route(scope, receive, send, method, path)
+
+        if trace is not None:
+            duration = tracer.finish(trace, token)
+            if trace.sampled:
+                tracer.export(trace, duration, f'{method} {endpoint}',
+                              request_attributes(method, path, endpoint, status), status >= 500)
+        if timed:
+            duration = time.perf_counter_ns() - start
+            metrics_collector.record(method, endpoint, status, duration, sample_every)
+            if trace is not None and trace.stages:
+                metrics_collector.record_stages(endpoint, trace.breakdown(duration), sample_every)
+
+    async def route(self, scope, receive, send, method, path):
+        if path == STREAM_PATH and method == 'POST':
+            await self.stream_calculation(receive, send)
+            return 'main.calculate_stream', 200
+        if method in ('GET', 'HEAD'):
+            asset = assets.index if path == '/' else assets.get(path)
+            if asset is not None:
+                return await self.send_asset(scope, send, method, asset, 'main.index' if path == '/' else 'static')
+        return await self.respond(scope, receive, send, method, path)
+
+    async def send_asset(self, scope, send, method, asset, endpoint):
+        """Answer from a pre-built asset, negotiating encoding and ETag."""
+        accept_encoding = if_none_match = ''
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept_encoding = value.decode('latin-1')
+            elif name == b'if-none-match':
+                if_none_match = value.decode('latin-1')
+        status, body, headers = asset.respond(accept_encoding, if_none_match)
+        headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        if status == 200:
+            headers.append((b'content-length', str(len(body)).encode('ascii')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body if method != 'HEAD' else b''})
+        return endpoint, status
+
+    async def reject(self, send, status, retry_after):
+        """Answer a rate-limited or shed request without reading its body."""
+        body = REJECTIONS[status][1]
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode('ascii')),
+                (b'retry-after', str(retry_after).encode('ascii')),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def respond(self, scope, receive, send, method, path):
+        endpoint, status, body, content_type = await self.dispatch(scope, receive, method, path)
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', content_type),
+                (b'content-length', str(len(body)).encode('ascii')),
+            ] + ([(b'allow', b'POST')] if status == 405 else []),
+        })
+        await send({'type': 'http.response.body', 'body': body if method != 'HEAD' else b''})
+        return endpoint, status
+
+    async def stream_calculation(self, receive, send):
+        """Answer /api/calculate/stream chunk by chunk as the body arrives."""
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [(b'content-type', b'application/x-ndjson')],
+        })
+        calculation = api.CalculationStream(self.config, self.json.loads, self.json.encode)
+        try:
+            while True:
+                message = await receive()
+                if message['type'] != 'http.request':
+                    return
+                output = calculation.feed(message.get('body', b''))
+                if output:
+                    await send({'type': 'http.response.body', 'body': output, 'more_body': True})
+                if not message.get('more_body'):
+                    break
+            output = calculation.finish()
+        except Exception as e:
+            output = calculation.fail(e)
+        await send({'type': 'http.response.body', 'body': output})
+
+    async def dispatch(self, scope, receive, method, path):
+        """Route one request; returns ``(endpoint, status, body, content_type)``."""
+        route = API_ROUTES.get(path)
+        if route is not None:
+            endpoint, handler = route
+            if method != 'POST':
+                return endpoint, 405, self.json.encode_constant(METHOD_NOT_ALLOWED), b'application/json'
+            if path == AGGREGATE_PATH and media_type(scope) == b'application/octet-stream':
+                return await self.aggregate_binary(scope, receive)
+            body = await read_body(receive, self.max_content_length, content_length(scope))
+            if body is None:
+                admission.record('body_too_large')
+                return endpoint, 413, self.json.encode(api.body_too_large(self.config)), b'application/json'
+            with stage('parse'):
+                data = self.json_body(body)
+            offload = len(body) >= self.offload_min_bytes or (
+                isinstance(data, dict) and data.get('mode') not in (None, 'float'))
+            with stage('validate'):
+                payload, status = await self.run(offload, handler, data, self.config)
+            with stage('serialize'):
+                body = self.json.encode(payload)
+            return endpoint, status, body, b'application/json'
+
+        if path == STREAM_PATH:
+            return 'main.calculate_stream', 405, self.json.encode_constant(METHOD_NOT_ALLOWED), b'application/json'
+
+        if method in ('GET', 'HEAD'):
+            if path == '/health':
+                return 'main.health', 200, self.health_body, b'application/json'
+            if path == '/livez':
+                return 'main.livez', 200, self.live_body, b'application/json'
+            if path == '/readyz':
+                if startup.ready:
+                    return 'main.readyz', 200, self.ready_body, b'application/json'
+                return 'main.readyz', 503, self.not_ready_body, b'application/json'
+            if path == '/metrics' and self.metrics_enabled:
+                return ('metrics', 200) + self.metrics_response(scope)
+            if path in PROFILE_ROUTES and self.metrics_enabled:
+                return await self.profile_response(scope, *PROFILE_ROUTES[path])
+
+        return 'unknown', 404, self.json.encode_constant(NOT_FOUND), b'application/json'
+
+    async def aggregate_binary(self, scope, receive):
+        """/api/aggregate with a packed float64 body and its own size limit."""
+        body = await read_body(receive, self.aggregate_max_content_length, content_length(scope))
+        if body is None:
+            admission.record('body_too_large')
+            payload = api.body_too_large(self.config, 'AGGREGATE_MAX_CONTENT_LENGTH')
+            return 'main.aggregate', 413, self.json.encode(payload), b'application/json'
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        args = {name: values[0] for name, values in query.items()}
+        with stage('validate'):
+            payload, status = await self.run(len(body) >= self.offload_min_bytes, api.aggregate_binary,
+                                             body, args, self.config)
+        with stage('serialize'):
+            body = self.json.encode(payload)
+        return 'main.aggregate', status, body, b'application/json'
+
+    async def run(self, offload, handler, *args):
+        """Call a CPU-bound handler, in a worker thread when ``offload`` is set.
+
+        ``asyncio.to_thread`` copies the context, so the request's log
+        fields, trace and CPU budget apply in the thread as they do inline.
+        """
+        if offload:
+            return await asyncio.to_thread(handler, *args)
+        return handler(*args)
+
+    def json_body(self, body):
+        """Decode a request body like ``request.get_json(force=True, silent=True)``."""
+        if not body:
+            return None
+        try:
+            return self.json.loads(body)
+        except ValueError:
+            return None
+
+    def metrics_response(self, scope):
+        requested = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('format')
+        accept = ''
+        for name, value in scope['headers']:
+            if name == b'accept':
+                accept = value.decode('latin-1')
+        body, mimetype = render_metrics(requested[0] if requested else None, accept, self.metrics_format)
+        if mimetype is None:
+            return self.json.encode(body), b'application/json'
+        return body.encode('utf-8'), mimetype.encode('latin-1') + b'; charset=utf-8'
+
+    async def profile_response(self, scope, endpoint, kind):
+        """/debug/profile and /debug/allocations, run off the event loop so it is sampled too."""
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        args = {name: values[0] for name, values in query.items()}
+        authorization = None
+        for name, value in scope['headers']:
+            if name == b'authorization':
+                authorization = value.decode('latin-1')
+        body, status, mimetype = await asyncio.to_thread(render_profile, kind, args, authorization,
+                                                         self.admin_token)
+        if mimetype is None:
+            return endpoint, status, self.json.encode(body), b'application/json'
+        return endpoint, status, body.encode('utf-8'), mimetype.encode('latin-1')
+
+
+def content_length(scope):
+    """The request's Content-Length header as an int, or None."""
+    for name, value in scope['headers']:
+        if name == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def media_type(scope):
+    """The request's Content-Type without parameters, lowercased, or b''."""
+    for name, value in scope['headers']:
+        if name == b'content-type':
+            return value.split(b';', 1)[0].strip().lower()
+    return b''
+
+
+async def read_body(receive, max_size=None, declared_size=None):
+    """Collect the full request body from ``http.request`` messages.
+
+    Returns None, without reading further, as soon as the declared or
+    received size exceeds ``max_size``.
+    """
+    if max_size is not None and declared_size is not None and declared_size > max_size:
+        return None
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] != 'http.request':
+            break
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+
+def create_asgi_app(config_class):
+    return CalculatorASGI(create_app(config_class))
@@ -0,0 +1,384 @@
+"""
+Static asset pipeline.
+
+At startup every file under ``static/`` is minified (CSS and JavaScript;
+comments and whitespace only), fingerprinted with a hash of its content and
+compressed with gzip and, when the optional ``brotli`` package is installed,
+brotli. The homepage is rendered once into the same kind of entry. Requests
+are then answered from memory: the representation is picked from
+``Accept-Encoding`` and a matching ``If-None-Match`` gets a 304, so serving
+the UI costs a dict lookup and a few header comparisons.
+
+Fingerprinted URLs (``/static/css/style.<hash>.css``) never change content
+and are cached for a year as immutable; the plain URLs and the homepage are
+revalidated with their ETag on every use.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from flask import Response, abort, render_template, request
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip variants are always built
+    brotli = None
+
+
+IMMUTABLE = 'public, max-age={max_age}, immutable'
+REVALIDATE = 'no-cache'
+
+# Bodies smaller than this are not worth a compressed variant
+COMPRESS_MIN_SIZE = 256
+
+CONTENT_TYPES = {
+    '.css': 'text/css',
+    '.js': 'text/javascript',
+    '.html': 'text/html',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.ico': 'image/vnd.microsoft.icon',
+    '.woff2': 'font/woff2',
+}
+
+# Characters after which a '/' in JavaScript starts a regex literal, not a division
+_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+
+_CSS_PUNCTUATION = re.compile(r'\s*([{};,>])\s*')
+_CSS_AFTER_COLON = re.compile(r':\s+')
+_JS_NEWLINES = re.compile(r'[ \t\r\f\v]*\n\s*')
+_JS_SPACES = re.compile(r'[ \t\r\f\v]+')
+# Bodies after the opening delimiter, up to and including the closing one
+_STRING_BODIES = {
+    '"': re.compile(r'(?:[^"\\\n]|\\.)*"', re.DOTALL),
+    "'": re.compile(r"(?:[^'\\\n]|\\.)*'", re.DOTALL),
+    '`': re.compile(r'(?:[^`\\]|\\.)*`', re.DOTALL),
+}
+_REGEX_LITERAL = re.compile(r'(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])*/[a-z]*')
+
+
+class Asset:
+    """One served resource: its encoded variants and response headers.
+
+    ``variants`` maps a content coding (``''`` for identity) to
+    ``(body, etag)``; assets published under several URLs share it.
+    """
+
+    __slots__ = ('content_type', 'cache_control', 'variants')
+
+    def __init__(self, content_type: str, cache_control: str, variants: Dict[str, Tuple[bytes, str]]):
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.variants = variants
+
+    def respond(self, accept_encoding: str = '', if_none_match: str = '') -> Tuple[int, bytes, List[Tuple[str, str]]]:
+        """``(status, body, headers)`` for a GET with the given request headers."""
+        coding = ''
+        if len(self.variants) > 1:
+            accepted = accepted_encodings(accept_encoding)
+            for candidate in ('br', 'gzip'):
+                if candidate in self.variants and candidate in accepted:
+                    coding = candidate
+                    break
+        body, etag = self.variants[coding]
+        headers = [
+            ('Content-Type', self.content_type),
+            ('Cache-Control', self.cache_control),
+            ('ETag', etag),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if if_none_match and etag_matches(if_none_match, etag):
+            return 304, b'', headers
+        if coding:
+            headers.append(('Content-Encoding', coding))
+        return 200, body, headers
+
+
+@lru_cache(maxsize=64)
+def accepted_encodings(header: str) -> frozenset:
+    """Content codings an ``Accept-Encoding`` header allows (q > 0)."""
+    codings = set()
+    for item in header.lower().split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip()
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            codings.add(coding)
+    return frozenset(codings)
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` header."""
+    if if_none_match.strip() == '*':
+        return True
+    tag = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == tag:
+            return True
+    return False
+
+
+def _segments(text: str, quotes: str, regex: bool = False):
+    """Split source into ``(kind, text)`` runs of 'code', 'string' and 'comment'.
+
+    Strings are delimited by any of ``quotes`` with backslash escapes;
+    comments are ``/* */`` and, for JavaScript (``regex=True``), ``//``.
+    With ``regex`` a '/' after an operator or opening bracket starts a
+    regex literal, which is kept verbatim like a string.
+    """
+    segments = []
+    start = i = 0
+    size = len(text)
+    last = ''  # last non-space code character before the current run
+    starts = re.compile('[' + re.escape(quotes) + '/]')
+    while True:
+        match = starts.search(text, i)
+        if match is None:
+            break
+        i = match.start()
+        char = text[i]
+        if char == '/' and text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            if end < 0:
+                raise ValueError("Unterminated comment")
+            kind, end = 'comment', end + 2
+        elif char == '/' and regex and text.startswith('//', i):
+            end = text.find('\n', i)
+            kind, end = 'comment', size if end < 0 else end
+        elif char == '/':
+            j = i - 1
+            while j >= start and text[j].isspace():
+                j -= 1
+            previous = text[j] if j >= start else last
+            if not regex or (previous and previous not in _REGEX_PRECEDERS):
+                i += 1
+                continue
+            literal = _REGEX_LITERAL.match(text, i + 1)
+            if literal is None:
+                raise ValueError("Unterminated regex literal")
+            kind, end = 'string', literal.end()
+        else:
+            literal = _STRING_BODIES[char].match(text, i + 1)
+            if literal is None:
+                raise ValueError("Unterminated string")
+            kind, end = 'string', literal.end()
+        j = i - 1
+        while j >= start and text[j].isspace():
+            j -= 1
+        if j >= start:
+            last = text[j]
+        if i > start:
+            segments.append(('code', text[start:i]))
+        segments.append((kind, text[i:end]))
+        if kind == 'string':
+            last = text[end - 1]
+        start = i = end
+    if start < size:
+        segments.append(('code', text[start:]))
+    return segments
+
+
+def minify_css(text: str) -> str:
+    """Drop comments and redundant whitespace; strings are kept as written."""
+    out = []
+    for kind, part in _segments(text, '"\''):
+        if kind == 'comment':
+            out.append(' ')
+        elif kind == 'string':
+            out.append(part)
+        else:
+            part = ' '.join(part.split()) if part.strip() else (' ' if part else '')
+            part = _CSS_PUNCTUATION.sub(r'\1', part)
+            out.append(_CSS_AFTER_COLON.sub(':', part))
+    return ''.join(out).replace(';}', '}').strip()
+
+
+def minify_js(text: str) -> str:
+    """Drop comments, indentation, blank lines and repeated spaces.
+
+    Line breaks between statements are kept, so automatic semicolon
+    insertion sees the same program; strings, template literals and regex
+    literals are copied as written.
+    """
+    out = []
+    last_kind = None
+    for kind, part in _segments(text, '"\'`', regex=True):
+        if kind == 'comment':
+            part = '\n' if part.startswith('//') or '\n' in part else ' '
+        elif kind == 'code':
+            part = _JS_SPACES.sub(' ', _JS_NEWLINES.sub('\n', part))
+        if part.startswith('\n') and out and last_kind != 'string':
+            out[-1] = out[-1].rstrip(' ')
+            if out[-1].endswith('\n') or not out[-1]:
+                part = part.lstrip('\n')
+        out.append(part)
+        last_kind = kind
+    return ''.join(out).strip()
+
+
+MINIFIERS = {
+    'text/css': (minify_css, '"\'', False),
+    'text/javascript': (minify_js, '"\'`', True),
+    'application/javascript': (minify_js, '"\'`', True),
+}
+
+
+def minify(content_type: str, data: bytes) -> bytes:
+    """Minified ``data``, or ``data`` unchanged if it cannot be minified safely.
+
+    The result is accepted only if it has the same string literals in the
+    same order as the source, which catches input the scanner misreads.
+    """
+    entry = MINIFIERS.get(content_type)
+    if entry is None:
+        return data
+    minifier, quotes, regex = entry
+    try:
+        text = data.decode('utf-8')
+        minified = minifier(text)
+        strings = [part for kind, part in _segments(text, quotes, regex) if kind == 'string']
+        if strings != [part for kind, part in _segments(minified, quotes, regex) if kind == 'string']:
+            return data
+    except (UnicodeDecodeError, ValueError):
+        return data
+    return minified.encode('utf-8')
+
+
+def encode_variants(body: bytes, digest: str) -> Dict[str, Tuple[bytes, str]]:
+    """Identity, gzip and brotli bodies with their strong ETags.
+
+    Compressed variants are only kept when they are smaller; gzip output
+    has a zero mtime so the bytes (and ETags) are reproducible.
+    """
+    variants = {'': (body, f'"{digest}"')}
+    if len(body) < COMPRESS_MIN_SIZE:
+        return variants
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(compressed) < len(body):
+        variants['gzip'] = (compressed, f'"{digest}-gzip"')
+    if brotli is not None:
+        compressed = brotli.compress(body, quality=11)
+        if len(compressed) < len(body):
+            variants['br'] = (compressed, f'"{digest}-br"')
+    return variants
+
+
+def content_type_of(name: str) -> str:
+    extension = os.path.splitext(name)[1].lower()
+    # The common types skip mimetypes' first-use read of the system database
+    content_type = CONTENT_TYPES.get(extension) or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if content_type.startswith('text/') or content_type.endswith('javascript'):
+        content_type += '; charset=utf-8'
+    return content_type
+
+
+def fingerprinted(url: str, digest: str) -> str:
+    """``/static/css/style.css`` -> ``/static/css/style.<digest>.css``"""
+    head, name = url.rsplit('/', 1)
+    stem, dot, extension = name.rpartition('.')
+    if not dot:
+        return f'{head}/{name}.{digest}'
+    return f'{head}/{stem}.{digest}.{extension}'
+
+
+class AssetPipeline:
+    """Built assets by URL path, plus the pre-rendered homepage."""
+
+    def __init__(self):
+        self.assets: Dict[str, Asset] = {}
+        self.urls: Dict[str, str] = {}
+        self.index: Optional[Asset] = None
+        self.source_bytes = 0
+        self.served_bytes = 0
+
+    def build(self, folder: Optional[str], minify_assets: bool = True, max_age: int = 31536000):
+        """Load, minify, fingerprint and compress every file in ``folder``."""
+        self.assets = {}
+        self.urls = {}
+        self.source_bytes = 0
+        self.served_bytes = 0
+        if not folder or not os.path.isdir(folder):
+            return
+        immutable = IMMUTABLE.format(max_age=max_age)
+        for root, _, names in os.walk(folder):
+            for name in sorted(names):
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, folder).replace(os.sep, '/')
+                content_type = content_type_of(name)
+                with open(path, 'rb') as f:
+                    body = f.read()
+                self.source_bytes += len(body)
+                if minify_assets:
+                    body = minify(content_type.split(';')[0], body)
+                digest = hashlib.sha256(body).hexdigest()[:16]
+                variants = encode_variants(body, digest)
+                self.served_bytes += len(min((variant[0] for variant in variants.values()), key=len))
+                url = '/static/' + filename
+                versioned = fingerprinted(url, digest)
+                self.assets[url] = Asset(content_type, REVALIDATE, variants)
+                self.assets[versioned] = Asset(content_type, immutable, variants)
+                self.urls[filename] = versioned
+
+    def url(self, filename: str) -> str:
+        """Fingerprinted URL of a static file, for templates."""
+        return self.urls.get(filename) or '/static/' + filename
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    def render_index(self, app, template: str = 'calculator.html'):
+        """Render the homepage once; it only depends on the asset URLs."""
+        with app.test_request_context('/'):
+            body = render_template(template).encode('utf-8')
+        digest = hashlib.sha256(body).hexdigest()[:16]
+        self.index = Asset('text/html; charset=utf-8', REVALIDATE, encode_variants(body, digest))
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'files': len(self.urls),
+            'source_bytes': self.source_bytes,
+            'served_bytes': self.served_bytes,
+            'brotli': brotli is not None,
+        }
+
+
+assets = AssetPipeline()
+
+
+def asset_response(asset: Asset) -> Response:
+    """Flask response for ``asset`` negotiated against the current request."""
+    status, body, headers = asset.respond(request.headers.get('Accept-Encoding', ''),
+                                          request.headers.get('If-None-Match', ''))
+    return Response(body, status, headers)
+
+
+def serve_static(filename: str) -> Response:
+    asset = assets.get('/static/' + filename)
+    if asset is None:
+        abort(404)
+    return asset_response(asset)
+
+
+def setup_assets(app):
+    """Build the assets and serve them in place of Flask's static handler"""
+    assets.build(app.static_folder, app.config['ASSETS_MINIFY'], app.config['ASSETS_MAX_AGE'])
+    app.jinja_env.globals['asset_url'] = assets.url
+    assets.render_index(app)
+    if 'static' in app.view_functions:
+        app.view_functions['static'] = serve_static
@@ -1,61 +1,473 @@
-import operator
 import math
-from typing import Union
+from functools import partial
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from app.aggregate import DEFAULT_AGGREGATES, aggregate, as_column
+from app.executor import column_slice, executor
+from app.expression import CompiledExpression, ExpressionCache, ExpressionLimits, compile_expression
+from app.limits import check_budget
+from app.numeric import NumericMode
+from app.operations import operations
+from app.tracing import stage, traced
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batches fall back to pure Python
+    np = None
+
+
+# JSON has no encoding for inf or nan, so a float result that is not finite
+# is reported as an error rather than a number
+NOT_FINITE = "Result is not a finite number"
+
+
+def check_finite(value):
+    """Return ``value``, raising ValueError if it is an infinite or NaN float."""
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError(NOT_FINITE)
+    return value
+
+
+def _finite_results(values, errors):
+    """Null the results of failed rows and fail the rows whose result is not finite."""
+    results = list(values)
+    for i, error in enumerate(errors):
+        if error is not None:
+            results[i] = None
+        elif isinstance(results[i], float) and not math.isfinite(results[i]):
+            results[i] = None
+            errors[i] = NOT_FINITE
+    return results
 
 
 class Calculator:
     
-    OPERATIONS = {
-        '+': operator.add,
-        '-': operator.sub,
-        '*': operator.mul,
-        '/': operator.truediv,
-        'sqrt': math.sqrt,
-        'sin': math.sin,
-        'cos': math.cos,
-        'tan': math.tan,
-        'log': math.log10,
-        'ln': math.log,
-    }
-    
-    @staticmethod
-    def calculate(operation: str, a: Union[float, int], b: Union[float, int] = None) -> float:
-        if operation not in Calculator.OPERATIONS:
+    # Registry of operation descriptors; see app/operations.py to add one
+    OPERATIONS = operations
+    
+    @staticmethod
+    def calculate(operation: str, a: Union[float, int], b: Union[float, int] = None,
+                  mode: NumericMode = None) -> float:
+        """Apply one operation.
+        
+        Floats dispatch with a single lookup to the operation's pre-bound
+        fast path. With a ``mode`` (see :mod:`app.numeric`) the operands are
+        that mode's exact number type and the mode's own operation table and
+        limits apply.
+        """
+        known = isinstance(operation, str)
+        if mode is None:
+            fast = _DISPATCH.get(operation) if known else None
+            if fast is None:
+                raise ValueError(f"Unknown operation: {operation}")
+            return fast(a, b)
+        
+        # Exact steps can cost milliseconds each; floats are bounded by input size
+        check_budget()
+        func = mode.operations.get(operation) if known else None
+        if func is None:
+            if known and operation in operations:
+                raise ValueError(f"Operation {operation} is not supported in {mode.name} mode")
             raise ValueError(f"Unknown operation: {operation}")
+        descriptor = operations[operation]
+        descriptor.check(a, b)
+        return mode.apply(func, a) if descriptor.arity == 1 else mode.apply(func, a, b)
+    
+    @staticmethod
+    @traced('calculate')
+    def calculate_batch(operations: Sequence[str], a_values: Sequence, b_values: Sequence = None,
+                        mode: NumericMode = None) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+        """Evaluate many calculations in one call.
+        
+        Rows are grouped by operation and every group is evaluated in a single
+        vectorized pass (NumPy when installed, pure Python otherwise); large
+        batches are split into chunks across the configured ``executor``.
+        Returns ``(results, errors)``, two lists parallel to the input where
+        each row has either a result or an error message. With an exact
+        ``mode`` rows are evaluated one at a time.
+        """
+        size = len(operations)
+        if b_values is None:
+            b_values = [None] * size
+        if len(a_values) != size or len(b_values) != size:
+            raise ValueError("Batch columns must have the same length")
+        if mode is not None:
+            return Calculator._calculate_rows(operations, a_values, b_values, mode)
+        
+        errors: List[Optional[str]] = [None] * size
+        codes = [-1.0] * size
+        a_column = [math.nan] * size
+        b_column = [math.nan] * size
+        lookup = Calculator.OPERATIONS.get
+        
+        for i in range(size):
+            operation = operations[i]
+            a = a_values[i]
+            b = b_values[i]
+            if operation is None or a is None:
+                errors[i] = 'Missing required parameters'
+                continue
+            descriptor = lookup(operation) if isinstance(operation, str) else None
+            if descriptor is None:
+                errors[i] = f"Unknown operation: {operation}"
+                continue
+            try:
+                a = float(a)
+                b = float(b) if b is not None else None
+            except (TypeError, ValueError):
+                errors[i] = 'Invalid number format'
+                continue
+            if descriptor.arity == 2 and b is None:
+                errors[i] = f"Operation {operation} requires two operands"
+                continue
+            codes[i] = float(descriptor.code)
+            a_column[i] = a
+            if b is not None:
+                b_column[i] = b
         
-        func = Calculator.OPERATIONS[operation]
+        columns = {'op': codes, 'a': a_column, 'b': b_column}
+        if np is not None:
+            columns = {name: np.asarray(column, dtype=np.float64) for name, column in columns.items()}
+        values, row_errors = executor.run(_batch_kernel, columns, size)
+        if np is not None and not isinstance(values, list):
+            values = values.tolist()
+        for i, message in row_errors:
+            errors[i] = message
         
-        if operation in ['sqrt', 'sin', 'cos', 'tan', 'log', 'ln']:
-            if operation == 'sqrt' and a < 0:
-                raise ValueError("Cannot calculate square root of negative number")
-            if operation in ['log', 'ln'] and a <= 0:
-                raise ValueError("Cannot calculate logarithm of non-positive number")
-            return func(a)
+        return _finite_results(values, errors), errors
+    
+    @staticmethod
+    def _calculate_rows(operations, a_values, b_values, mode):
+        results = []
+        errors = []
+        for operation, a, b in zip(operations, a_values, b_values):
+            try:
+                if operation is None or a is None:
+                    raise ValueError('Missing required parameters')
+                a = mode.parse(a)
+                b = mode.parse(b) if b is not None else None
+                results.append(Calculator.calculate(operation, a, b, mode))
+                errors.append(None)
+            except (TypeError, ValueError) as e:
+                results.append(None)
+                errors.append(str(e) if isinstance(e, ValueError) else 'Invalid number format')
+        return results, errors
+    
+    @staticmethod
+    def calculate_vector(operation: str, a, b=None):
+        """Apply ``operation`` elementwise over whole columns.
+        
+        ``a`` and ``b`` are NumPy arrays (when NumPy is installed) or lists,
+        and either may be a plain float that is broadcast. Returns
+        ``(values, row_errors)``: rows that fail one of the operation's domain
+        checks (or whose scalar function raises ``ValueError`` or
+        ``OverflowError``) are listed in ``row_errors`` as ``(index, message)`` and hold
+        NaN (NumPy) or ``None`` (lists) in ``values``.
+        """
+        descriptor = operations.get(operation)
+        if descriptor is None:
+            raise ValueError(f"Unknown operation: {operation}")
+        if descriptor.arity == 2 and b is None:
+            raise ValueError(f"Operation {operation} requires two operands")
+        check_budget()
+        
+        if np is not None:
+            return Calculator._calculate_vector_numpy(descriptor, a, b)
+        return Calculator._calculate_vector_python(descriptor, a, b)
+    
+    @staticmethod
+    def _calculate_vector_python(descriptor, a, b):
+        """Pure-Python column kernel; ``None`` entries are skipped."""
+        func = descriptor.func
+        domain_error = descriptor.domain_error
+        size = len(a) if isinstance(a, list) else len(b)
+        a_column = a if isinstance(a, list) else [a] * size
+        values = [None] * size
+        row_errors = []
+        
+        if descriptor.arity == 1:
+            for i, x in enumerate(a_column):
+                if x is None:
+                    continue
+                error = domain_error(x)
+                if error is None:
+                    try:
+                        values[i] = func(x)
+                    except (ValueError, OverflowError) as e:
+                        row_errors.append((i, str(e)))
+                else:
+                    row_errors.append((i, error))
         else:
-            if b is None:
-                raise ValueError(f"Operation {operation} requires two operands")
-            if operation == '/' and b == 0:
-                raise ValueError("Division by zero")
-            return func(a, b)
+            b_column = b if isinstance(b, list) else [b] * size
+            for i, (x, y) in enumerate(zip(a_column, b_column)):
+                if x is None or y is None:
+                    continue
+                error = domain_error(x, y)
+                if error is None:
+                    try:
+                        values[i] = func(x, y)
+                    except (ValueError, OverflowError) as e:
+                        row_errors.append((i, str(e)))
+                else:
+                    row_errors.append((i, error))
+        
+        return values, row_errors
     
     @staticmethod
-    def evaluate_expression(expression: str) -> float:
-        expression = expression.strip()
+    def _calculate_vector_numpy(descriptor, a, b):
+        """NumPy column kernel with masked domain errors.
         
-        # Handle negative numbers properly by using regex or manual parsing
-        import re
+        Operations registered without a ``vector`` function run their scalar
+        function over the valid rows.
+        """
+        unary = descriptor.arity == 1
+        invalid = None
+        row_errors = []
+        with np.errstate(all='ignore'):
+            if descriptor.domain:
+                shape = np.broadcast(a, a if unary else b).shape
+                invalid = np.zeros(shape, dtype=bool)
+                for predicate, message in descriptor.domain:
+                    failed = np.broadcast_to(predicate(a, b), shape) & ~invalid
+                    if failed.any():
+                        row_errors.extend((i, message) for i in np.flatnonzero(failed).tolist())
+                        invalid |= failed
+            
+            if descriptor.vector is not None:
+                values = descriptor.vector(a) if unary else descriptor.vector(a, b)
+            else:
+                a_column, b_column = np.broadcast_arrays(a, a if unary else b)
+                values = np.full(a_column.shape, np.nan)
+                func = descriptor.func
+                rows = range(a_column.size) if invalid is None else np.flatnonzero(~invalid).tolist()
+                for i in rows:
+                    try:
+                        values[i] = func(a_column[i]) if unary else func(a_column[i], b_column[i])
+                    except (ValueError, OverflowError) as e:
+                        row_errors.append((i, str(e)))
         
-        # Pattern to match: optional negative sign, digits/decimal, operator, optional negative sign, digits/decimal (and nothing else)
-        pattern = r'^(-?\d+(?:\.\d+)?)\s*([+\-*/])\s*(-?\d+(?:\.\d+)?)$'
-        match = re.match(pattern, expression)
+        if not row_errors:
+            return values, []
+        if invalid is None:
+            return values, row_errors
+        return np.where(invalid, np.nan, values), row_errors
+    
+    @staticmethod
+    @traced('calculate')
+    def aggregate(values, operations: Sequence[str] = DEFAULT_AGGREGATES, other=None,
+                  quantiles: Sequence[float] = (), ddof: int = 0) -> Dict[str, object]:
+        """Aggregate statistics over a whole array in one call.
         
-        if not match:
-            raise ValueError("Invalid expression format. Expected: 'number operator number'")
+        ``values`` and ``other`` may be lists or float64 columns (for
+        example from :func:`app.aggregate.from_float64_bytes`); see
+        :func:`app.aggregate.aggregate` for the operations and algorithms.
+        """
+        values = as_column(values)
+        if other is not None:
+            other = as_column(other)
+        return aggregate(values, operations, other, quantiles, ddof)
+    
+    @staticmethod
+    @traced('compile')
+    def compile_expression(expression: str) -> CompiledExpression:
+        """Compile ``expression`` (through the cache) for repeated evaluation."""
+        return expression_cache.get(expression)
+    
+    @staticmethod
+    @traced('calculate')
+    def evaluate_expression(expression: str, variables: Dict[str, Union[float, int]] = None,
+                            mode: NumericMode = None) -> float:
+        """Evaluate an arithmetic expression such as ``2 * (3 + sqrt(x))``.
+        
+        Supports ``+ - * /`` with the usual precedence, parentheses, unary
+        minus, calls of the named operations in ``OPERATIONS`` (``sqrt(x)``,
+        ``pow(x, 2)``) and named variables whose values are taken from
+        ``variables``. Compiled expressions are
+        cached, so repeated expressions skip parsing.
+        """
+        with stage('compile'):
+            compiled = expression_cache.get(expression)
+        if mode is not None:
+            return Calculator._evaluate_exact(compiled, variables, mode)
+        if variables:
+            try:
+                variables = {name: float(variables[name])
+                             for name in compiled.variables if name in variables}
+            except (TypeError, ValueError):
+                raise ValueError("Invalid number format")
+        return compiled.evaluate(Calculator.calculate, variables)
+    
+    @staticmethod
+    def _evaluate_exact(compiled: CompiledExpression, variables, mode: NumericMode):
+        if variables:
+            variables = {name: mode.parse(variables[name])
+                         for name in compiled.variables if name in variables}
+        return compiled.evaluate_exact(partial(Calculator.calculate, mode=mode), variables,
+                                       mode.literal, mode.negate)
+    
+    @staticmethod
+    @traced('calculate')
+    def evaluate_bindings(expression: Union[str, CompiledExpression], bindings,
+                          mode: NumericMode = None) -> Tuple[List[Optional[float]], List[Optional[str]]]:
+        """Evaluate one expression against many variable bindings.
+        
+        ``bindings`` is either a list of ``{name: value}`` rows or a dict of
+        ``{name: [values...]}`` columns (a scalar column value applies to every
+        row). The compiled program runs once over whole columns instead of
+        once per row, chunked across the ``executor`` for large inputs; with
+        an exact ``mode`` each row is evaluated on its own.
+        Returns ``(results, errors)`` parallel to the rows.
+        """
+        if not isinstance(expression, CompiledExpression):
+            with stage('compile'):
+                expression = expression_cache.get(expression)
+        
+        if mode is not None:
+            return Calculator._evaluate_exact_rows(expression, bindings, mode)
+        
+        if isinstance(bindings, list):
+            if not all(isinstance(row, dict) for row in bindings):
+                raise ValueError("Invalid bindings format")
+            size = len(bindings)
+            raw_columns = {name: [row.get(name) for row in bindings] for name in expression.variables}
+        elif isinstance(bindings, dict):
+            lengths = {len(column) for column in bindings.values() if isinstance(column, list)}
+            if len(lengths) > 1:
+                raise ValueError("Binding columns must have the same length")
+            size = lengths.pop() if lengths else 1
+            raw_columns = {}
+            for name in expression.variables:
+                column = bindings.get(name)
+                raw_columns[name] = column if isinstance(column, list) else [column] * size
+        else:
+            raise ValueError("Invalid bindings format")
+        
+        errors: List[Optional[str]] = [None] * size
+        columns = {name: Calculator._coerce_column(name, column, errors)
+                   for name, column in raw_columns.items()}
+        
+        if expression.variables:
+            values, row_errors = executor.run(_expression_kernel, columns, size, expression)
+            for i, message in row_errors:
+                if errors[i] is None:
+                    errors[i] = message
+        else:
+            values = expression.evaluate_columns(Calculator.calculate, Calculator.calculate_vector,
+                                                 columns, errors)
+        
+        if isinstance(values, float):
+            results = [values] * size
+        elif np is not None and not isinstance(values, list):
+            results = np.broadcast_to(values, (size,)).tolist()
+        else:
+            results = values
+        return _finite_results(results, errors), errors
+    
+    @staticmethod
+    def _evaluate_exact_rows(expression: CompiledExpression, bindings, mode: NumericMode):
+        if isinstance(bindings, dict):
+            lengths = {len(column) for column in bindings.values() if isinstance(column, list)}
+            if len(lengths) > 1:
+                raise ValueError("Binding columns must have the same length")
+            size = lengths.pop() if lengths else 1
+            bindings = [{name: column[i] if isinstance(column, list) else column
+                         for name, column in bindings.items()} for i in range(size)]
+        elif not isinstance(bindings, list) or not all(isinstance(row, dict) for row in bindings):
+            raise ValueError("Invalid bindings format")
+        
+        results = []
+        errors = []
+        for row in bindings:
+            try:
+                missing = next((name for name in expression.variables if row.get(name) is None), None)
+                if missing is not None:
+                    raise ValueError(f"Missing value for variable '{missing}'")
+                results.append(Calculator._evaluate_exact(expression, row, mode))
+                errors.append(None)
+            except ValueError as e:
+                results.append(None)
+                errors.append(str(e))
+        return results, errors
+    
+    @staticmethod
+    def _coerce_column(name: str, column: list, errors: List[Optional[str]]):
+        """Convert a raw binding column to floats, recording per-row errors."""
+        if np is not None and None not in column:
+            try:
+                return np.asarray(column, dtype=np.float64)
+            except (TypeError, ValueError):
+                pass
         
-        try:
-            a = float(match.group(1))
-            operation = match.group(2)
-            b = float(match.group(3))
-            return Calculator.calculate(operation, a, b)
-        except (ValueError, IndexError) as e:
-            raise ValueError(f"Invalid expression: {str(e)}")
\ No newline at end of file
+        values = [None] * len(column)
+        for i, value in enumerate(column):
+            if value is None:
+                if errors[i] is None:
+                    errors[i] = f"Missing value for variable '{name}'"
+                continue
+            try:
+                values[i] = float(value)
+            except (TypeError, ValueError):
+                if errors[i] is None:
+                    errors[i] = 'Invalid number format'
+        
+        if np is not None:
+            return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+        return values
+
+
+_DISPATCH = operations.dispatch
+
+
+def _batch_kernel(columns, start, end):
+    """Executor kernel for :meth:`Calculator.calculate_batch` rows ``start:end``.
+    
+    ``columns`` holds float64 ``op`` codes (negative for rows that failed
+    validation), ``a`` and ``b``; rows are grouped by operation and each
+    group is evaluated with :meth:`Calculator.calculate_vector`.
+    """
+    codes = column_slice(columns['op'], start, end)
+    a = column_slice(columns['a'], start, end)
+    b = column_slice(columns['b'], start, end)
+    errors = []
+    
+    if np is not None:
+        values = np.full(end - start, np.nan)
+        for code in np.unique(codes):
+            if code < 0:
+                continue
+            operation = operations.names[int(code)]
+            indices = np.flatnonzero(codes == code)
+            group_b = None if operations[operation].arity == 1 else b[indices]
+            group_values, group_errors = Calculator.calculate_vector(operation, a[indices], group_b)
+            values[indices] = group_values
+            errors.extend((start + int(indices[position]), message) for position, message in group_errors)
+        return values, errors
+    
+    groups = {}
+    for i, code in enumerate(codes):
+        if code >= 0:
+            groups.setdefault(int(code), []).append(i)
+    values = [None] * (end - start)
+    for code, indices in groups.items():
+        operation = operations.names[code]
+        group_b = None if operations[operation].arity == 1 else [b[i] for i in indices]
+        group_values, group_errors = Calculator.calculate_vector(
+            operation, [a[i] for i in indices], group_b)
+        for i, value in zip(indices, group_values):
+            values[i] = value
+        errors.extend((start + indices[position], message) for position, message in group_errors)
+    return values, errors
+
+
+def _expression_kernel(columns, start, end, expression):
+    """Executor kernel running a compiled expression over rows ``start:end``."""
+    sliced = {name: column_slice(column, start, end) for name, column in columns.items()}
+    errors = [None] * (end - start)
+    values = expression.evaluate_columns(Calculator.calculate, Calculator.calculate_vector, sliced, errors)
+    return values, [(start + i, error) for i, error in enumerate(errors) if error is not None]
+
+
+expression_limits = ExpressionLimits()
+expression_cache = ExpressionCache(
+    lambda expression: compile_expression(expression, operations.functions, expression_limits)
+)
@@ -1,14 +1,89 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+
+def find_dotenv():
+    """The nearest .env file in this package's directory or above, like ``load_dotenv()``."""
+    path = os.path.dirname(os.path.abspath(__file__))
+    while True:
+        candidate = os.path.join(path, '.env')
+        if os.path.isfile(candidate):
+            return candidate
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+# python-dotenv is only imported when there is a file to load
+_dotenv_path = find_dotenv()
+if _dotenv_path:
+    from dotenv import load_dotenv
+    load_dotenv(_dotenv_path)
 
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'false').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', 256))
+    LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', 0.5))
+    LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+    LOG_SAMPLE_ROUTES = os.environ.get('LOG_SAMPLE_ROUTES', '')
+    LOG_ALWAYS_LOG_ERRORS = os.environ.get('LOG_ALWAYS_LOG_ERRORS', 'true').lower() == 'true'
     METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_FORMAT = os.environ.get('METRICS_FORMAT', 'json')
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+    METRICS_PUBLISH_INTERVAL = float(os.environ.get('METRICS_PUBLISH_INTERVAL', 1.0))
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+    BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 10000))
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 2 * 1024 * 1024)) or None
+    AGGREGATE_MAX_CONTENT_LENGTH = int(os.environ.get('AGGREGATE_MAX_CONTENT_LENGTH', 64 * 1024 * 1024)) or None
+    ASGI_OFFLOAD_MIN_BYTES = int(os.environ.get('ASGI_OFFLOAD_MIN_BYTES', 16384))
+    EXPRESSION_MAX_TOKENS = int(os.environ.get('EXPRESSION_MAX_TOKENS', 1000))
+    EXPRESSION_MAX_NODES = int(os.environ.get('EXPRESSION_MAX_NODES', 1000))
+    EXPRESSION_MAX_DEPTH = int(os.environ.get('EXPRESSION_MAX_DEPTH', 64))
+    REQUEST_CPU_BUDGET = float(os.environ.get('REQUEST_CPU_BUDGET', 2.0))
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+    RATE_LIMIT_RATE = float(os.environ.get('RATE_LIMIT_RATE', 50))
+    RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 100))
+    RATE_LIMIT_CLIENT_HEADER = os.environ.get('RATE_LIMIT_CLIENT_HEADER', '')
+    RATE_LIMIT_MAX_IN_FLIGHT = int(os.environ.get('RATE_LIMIT_MAX_IN_FLIGHT', 0))
+    RATE_LIMIT_SHARED_PATH = os.environ.get('RATE_LIMIT_SHARED_PATH')
+    RATE_LIMIT_SLOTS = int(os.environ.get('RATE_LIMIT_SLOTS', 4096))
+    EXECUTOR_MODE = os.environ.get('EXECUTOR_MODE', 'inline')
+    EXECUTOR_WORKERS = int(os.environ.get('EXECUTOR_WORKERS', 0))
+    EXECUTOR_THRESHOLD = int(os.environ.get('EXECUTOR_THRESHOLD', 50000))
+    EXECUTOR_CHUNK_SIZE = int(os.environ.get('EXECUTOR_CHUNK_SIZE', 25000))
+    STREAM_CHUNK_SIZE = int(os.environ.get('STREAM_CHUNK_SIZE', 1000))
+    STREAM_MAX_LINE_BYTES = int(os.environ.get('STREAM_MAX_LINE_BYTES', 65536))
+    NUMERIC_DEFAULT_PRECISION = int(os.environ.get('NUMERIC_DEFAULT_PRECISION', 28))
+    NUMERIC_MAX_PRECISION = int(os.environ.get('NUMERIC_MAX_PRECISION', 1000))
+    NUMERIC_MAX_DIGITS = int(os.environ.get('NUMERIC_MAX_DIGITS', 1000))
+    NUMERIC_MAX_EXPONENT = int(os.environ.get('NUMERIC_MAX_EXPONENT', 1000))
+    NUMERIC_MAX_BITS = int(os.environ.get('NUMERIC_MAX_BITS', 8192))
+    EXPRESSION_CACHE_SIZE = int(os.environ.get('EXPRESSION_CACHE_SIZE', 1024))
+    RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'false').lower() == 'true'
+    RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 4096))
+    RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 0))
+    RESULT_CACHE_SHARED_PATH = os.environ.get('RESULT_CACHE_SHARED_PATH')
+    RESULT_CACHE_SHARED_SLOTS = int(os.environ.get('RESULT_CACHE_SHARED_SLOTS', 65536))
+    JSON_BACKEND = os.environ.get('JSON_BACKEND', 'auto')
+    ASSETS_MINIFY = os.environ.get('ASSETS_MINIFY', 'true').lower() == 'true'
+    ASSETS_MAX_AGE = int(os.environ.get('ASSETS_MAX_AGE', 31536000))
+    STARTUP_WARMUP = os.environ.get('STARTUP_WARMUP', 'off')
+    STARTUP_BUDGET_MS = float(os.environ.get('STARTUP_BUDGET_MS', 0))
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'true').lower() == 'true'
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0.0))
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none')
+    TRACE_EXPORT_PATH = os.environ.get('TRACE_EXPORT_PATH', 'traces.jsonl')
+    TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'flask-calculator')
+    TRACE_EXPORT_QUEUE_SIZE = int(os.environ.get('TRACE_EXPORT_QUEUE_SIZE', 2048))
+    TRACE_EXPORT_INTERVAL = float(os.environ.get('TRACE_EXPORT_INTERVAL', 1.0))
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+    PROFILER_MAX_SECONDS = float(os.environ.get('PROFILER_MAX_SECONDS', 30))
     
     
 class DevelopmentConfig(Config):
@@ -22,4 +97,5 @@ class ProductionConfig(Config):
 
 class TestingConfig(Config):
     TESTING = True
-    LOG_LEVEL = 'WARNING'
\ No newline at end of file
+    LOG_LEVEL = 'WARNING'
+    ADMIN_TOKEN = 'test-admin-token'
\ No newline at end of file
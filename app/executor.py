@@ -0,0 +1,214 @@
+import math
+import os
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; columns are plain lists then
+    np = None
+
+
+Errors = List[Tuple[int, str]]
+
+
+def column_slice(column, start: int, end: int):
+    """Rows ``start:end`` of a column as an array (NumPy) or a list."""
+    if np is not None and isinstance(column, np.ndarray):
+        return column[start:end]
+    if isinstance(column, list):
+        return column[start:end]
+    return list(column[start:end])
+
+
+def _attach(name: str, size: int, count: int):
+    """Attach to a shared block and return it with ``count`` float64 column views."""
+    from multiprocessing import shared_memory
+    block = shared_memory.SharedMemory(name=name)
+    if np is not None:
+        matrix = np.ndarray((count, size), dtype=np.float64, buffer=block.buf)
+        return block, list(matrix)
+    view = block.buf.cast('d')
+    return block, [view[i * size:(i + 1) * size] for i in range(count)]
+
+
+def _close(block):
+    try:
+        block.close()
+    except BufferError:
+        pass  # a traceback still references a view; the mapping goes with it
+
+
+def _run_shared(kernel: Callable, name: str, names: Sequence[str], size: int,
+                start: int, end: int, args: tuple) -> Errors:
+    """Process-pool task: run ``kernel`` on a slice of the shared columns.
+
+    The last column of the block is the output; values are written into it
+    in place and only the (usually empty) error list travels back.
+    """
+    block, views = _attach(name, size, len(names) + 1)
+    try:
+        values, errors = kernel(dict(zip(names, views)), start, end, *args)
+        if isinstance(values, float):
+            values = [values] * (end - start)
+        if isinstance(values, list):
+            values = array('d', (math.nan if value is None else value for value in values))
+        views[-1][start:end] = values
+        return errors
+    finally:
+        values = views = None
+        _close(block)
+
+
+class BatchExecutor:
+    """Runs column kernels inline, on a thread pool or on a process pool.
+
+    A kernel is a module-level function ``kernel(columns, start, end, *args)``
+    returning ``(values, errors)`` for rows ``start:end``, where ``errors``
+    lists ``(row, message)`` with absolute row numbers. Work smaller than
+    ``threshold`` rows always runs inline. Larger work is split into chunks
+    of ``chunk_size`` rows; in process mode the input columns are copied once
+    into a shared-memory block that the persistent worker processes map
+    directly, and each worker writes its results back into the same block,
+    so operands and results are never pickled.
+    """
+
+    MODES = ('inline', 'thread', 'process')
+
+    def __init__(self):
+        self.mode = 'inline'
+        self.workers = os.cpu_count() or 1
+        self.threshold = 50000
+        self.chunk_size = 25000
+        self.inline_runs = 0
+        self.parallel_runs = 0
+        self.chunks = 0
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+
+    def configure(self, mode='inline', workers=None, threshold=50000, chunk_size=25000):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown executor mode: {mode}")
+        self.shutdown()
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.threshold = threshold
+        self.chunk_size = max(1, chunk_size)
+
+    def run(self, kernel: Callable, columns: Dict[str, Sequence], size: int, *args
+            ) -> Tuple[Sequence[Optional[float]], Errors]:
+        """Evaluate ``kernel`` over all ``size`` rows and reassemble results in order."""
+        if self.mode == 'inline' or size < self.threshold or size <= self.chunk_size:
+            with self._lock:
+                self.inline_runs += 1
+            return kernel(columns, 0, size, *args)
+
+        ranges = [(start, min(start + self.chunk_size, size)) for start in range(0, size, self.chunk_size)]
+        with self._lock:
+            self.parallel_runs += 1
+            self.chunks += len(ranges)
+        if self.mode == 'thread':
+            return self._run_threads(kernel, columns, size, ranges, args)
+        return self._run_processes(kernel, columns, size, ranges, args)
+
+    def _run_threads(self, kernel, columns, size, ranges, args):
+        pool = self._get_pool()
+        futures = [pool.submit(kernel, columns, start, end, *args) for start, end in ranges]
+        values = []
+        errors = []
+        for (start, end), future in zip(ranges, futures):
+            chunk_values, chunk_errors = future.result()
+            if isinstance(chunk_values, float):
+                chunk_values = [chunk_values] * (end - start)
+            values.append(chunk_values)
+            errors.extend(chunk_errors)
+        if np is not None and not any(isinstance(chunk, list) for chunk in values):
+            return np.concatenate(values), errors
+        return [value for chunk in values for value in chunk], errors
+
+    def _run_processes(self, kernel, columns, size, ranges, args):
+        from concurrent.futures.process import BrokenProcessPool
+        from multiprocessing import shared_memory
+        names = list(columns)
+        block = shared_memory.SharedMemory(create=True, size=max(1, (len(names) + 1) * size * 8))
+        views = out = None
+        try:
+            views = self._fill(block, columns, names, size)
+            pool = self._get_pool()
+            futures = [pool.submit(_run_shared, kernel, block.name, names, size, start, end, args)
+                       for start, end in ranges]
+            errors = []
+            try:
+                for future in futures:
+                    errors.extend(future.result())
+            except BrokenProcessPool:
+                self.shutdown()
+                raise RuntimeError("Executor worker process died")
+            out = views[-1]
+            return (np.array(out) if np is not None else out.tolist()), errors
+        finally:
+            views = out = None
+            _close(block)
+            block.unlink()
+
+    @staticmethod
+    def _fill(block, columns, names, size):
+        if np is not None:
+            matrix = np.ndarray((len(names) + 1, size), dtype=np.float64, buffer=block.buf)
+            for row, name in zip(matrix, names):
+                column = columns[name]
+                if isinstance(column, list):
+                    column = [math.nan if value is None else value for value in column]
+                row[:] = column
+            return list(matrix)
+        view = block.buf.cast('d')
+        views = [view[i * size:(i + 1) * size] for i in range(len(names) + 1)]
+        for target, name in zip(views, names):
+            target[:] = array('d', (math.nan if value is None else value for value in columns[name]))
+        return views
+
+    def _get_pool(self):
+        # The pool machinery is imported on first use: it costs several
+        # milliseconds of start-up and inline mode never needs it
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        import multiprocessing
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                if self.mode == 'thread':
+                    self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix='calculator-executor')
+                else:
+                    # spawn: forking a threaded gunicorn worker could copy held locks
+                    self._pool = ProcessPoolExecutor(self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+        if pool is not None and self._pool_pid == os.getpid():
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _after_fork(self):
+        # The parent's pool threads/processes do not exist in a forked child
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'workers': self.workers,
+                'threshold': self.threshold,
+                'chunk_size': self.chunk_size,
+                'inline_runs': self.inline_runs,
+                'parallel_runs': self.parallel_runs,
+                'chunks': self.chunks,
+            }
+
+
+executor = BatchExecutor()
+os.register_at_fork(after_in_child=executor._after_fork)
@@ -0,0 +1,417 @@
+import base64
+import binascii
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+from app.limits import admission
+
+
+# Instruction opcodes for compiled expressions
+PUSH = 0
+NEG = 1
+BINARY = 2
+CALL = 3
+LOAD = 4
+
+_TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<number>(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z_0-9]*)
+      | (?P<op>[-+*/(),])
+    )''', re.VERBOSE)
+
+_BINARY_PRECEDENCE = {
+    '+': 1,
+    '-': 1,
+    '*': 2,
+    '/': 2,
+}
+
+
+class ExpressionLimits:
+    """Admission limits checked while an expression is compiled.
+
+    Each limit stops the tokenizer or parser as soon as it is crossed, so an
+    oversized expression costs no more to reject than the limit itself.
+    ``None`` disables a limit.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None, max_nodes: Optional[int] = None,
+                 max_depth: Optional[int] = None):
+        self.configure(max_tokens, max_nodes, max_depth)
+
+    def configure(self, max_tokens=None, max_nodes=None, max_depth=None):
+        self.max_tokens = max_tokens or None
+        self.max_nodes = max_nodes or None
+        self.max_depth = max_depth or None
+
+
+NO_LIMITS = ExpressionLimits()
+
+
+def tokenize(expression: str, max_tokens: Optional[int] = None) -> List[Tuple[str, str, int]]:
+    """Split an expression into ``(kind, text, position)`` tokens."""
+    tokens = []
+    position = 0
+    length = len(expression.rstrip())
+
+    while position < length:
+        if max_tokens is not None and len(tokens) >= max_tokens:
+            raise admission.reject(f"Expression exceeds {max_tokens} tokens", 'expression_tokens')
+        match = _TOKEN_RE.match(expression, position)
+        if not match:
+            offset = len(expression) - len(expression[position:].lstrip())
+            raise ValueError(f"Invalid expression: unexpected character "
+                             f"'{expression[offset]}' at position {offset}")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind), match.start(kind)))
+        position = match.end()
+
+    return tokens
+
+
+class CompiledExpression:
+    """Expression compiled to a flat postfix program.
+
+    The program is a tuple of ``(opcode, argument)`` pairs evaluated on a
+    small value stack, so evaluation never walks a tree or calls ``eval``.
+    ``variables`` lists the free variable names in order of first use and
+    ``literals`` the source text of each number, in the order it is pushed.
+    """
+
+    __slots__ = ('source', 'code', 'variables', 'node_count', 'depth', 'literals')
+
+    def __init__(self, source: str, code: tuple, variables: tuple, node_count: int, depth: int,
+                 literals: tuple = ()):
+        self.source = source
+        self.code = code
+        self.variables = variables
+        self.node_count = node_count
+        self.depth = depth
+        self.literals = literals
+
+    @property
+    def handle(self) -> str:
+        return expression_handle(self.source)
+
+    def evaluate(self, calculate: Callable, variables: Dict[str, float] = None) -> float:
+        """Run the program using ``calculate(operation, a, b=None)`` for each step."""
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for opcode, argument in self.code:
+            if opcode == PUSH:
+                push(argument)
+            elif opcode == LOAD:
+                if not variables or argument not in variables:
+                    raise ValueError(f"Missing value for variable '{argument}'")
+                push(variables[argument])
+            elif opcode == BINARY:
+                b = pop()
+                stack[-1] = calculate(argument, stack[-1], b)
+            elif opcode == CALL:
+                stack[-1] = calculate(argument, stack[-1])
+            else:
+                stack[-1] = -stack[-1]
+
+        return stack[0]
+
+    def evaluate_exact(self, calculate: Callable, variables: Dict[str, object],
+                       literal: Callable, negate: Callable) -> object:
+        """Like :meth:`evaluate`, for exact number types.
+
+        Constants are rebuilt from their source text with ``literal`` instead
+        of using the float in the program, and negation goes through
+        ``negate`` so it can honor the caller's precision.
+        """
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        literals = iter(self.literals)
+
+        for opcode, argument in self.code:
+            if opcode == PUSH:
+                push(literal(next(literals)))
+            elif opcode == LOAD:
+                if not variables or argument not in variables:
+                    raise ValueError(f"Missing value for variable '{argument}'")
+                push(variables[argument])
+            elif opcode == BINARY:
+                b = pop()
+                stack[-1] = calculate(argument, stack[-1], b)
+            elif opcode == CALL:
+                stack[-1] = calculate(argument, stack[-1])
+            else:
+                stack[-1] = negate(stack[-1])
+
+        return stack[0]
+
+    def evaluate_columns(self, calculate: Callable, calculate_vector: Callable,
+                         columns: Dict[str, object], errors: List) -> object:
+        """Run the program once over whole columns of variable bindings.
+
+        Each instruction is applied to entire columns through
+        ``calculate_vector(operation, a, b=None)``, which returns
+        ``(values, row_errors)`` with ``(index, message)`` pairs; failing rows
+        are recorded in ``errors`` (first error wins). Steps whose operands are all constants
+        fall back to the scalar ``calculate``. Returns the result column, or a
+        scalar when the expression does not depend on any column.
+        """
+        stack = []
+        push = stack.append
+        pop = stack.pop
+
+        for opcode, argument in self.code:
+            if opcode == PUSH:
+                push(argument)
+            elif opcode == LOAD:
+                push(columns[argument])
+            elif opcode == BINARY or opcode == CALL:
+                b = pop() if opcode == BINARY else None
+                a = stack[-1]
+                if isinstance(a, float) and (b is None or isinstance(b, float)):
+                    stack[-1] = calculate(argument, a) if b is None else calculate(argument, a, b)
+                    continue
+                values, row_errors = calculate_vector(argument, a, b)
+                for i, message in row_errors:
+                    if errors[i] is None:
+                        errors[i] = message
+                stack[-1] = values
+            else:
+                value = stack[-1]
+                if isinstance(value, list):
+                    stack[-1] = [-x if x is not None else None for x in value]
+                else:
+                    stack[-1] = -value
+
+        return stack[0]
+
+
+class _Parser:
+    """Precedence-climbing parser that emits postfix code directly."""
+
+    def __init__(self, tokens, functions: Mapping[str, int], limits: ExpressionLimits = NO_LIMITS):
+        self.tokens = tokens
+        self.functions = functions
+        self.max_nodes = limits.max_nodes
+        self.max_depth = limits.max_depth
+        self.index = 0
+        self.code = []
+        self.variables = {}
+        self.literals = []
+        self.node_count = 0
+        self.depth = 0
+        self.deepest = 0
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return None
+
+    def expect(self, value):
+        token = self.peek()
+        if token is None or token[0] != 'op' or token[1] != value:
+            raise self.error(token, f"expected '{value}'")
+        self.index += 1
+
+    def error(self, token, message):
+        if token is None:
+            return ValueError(f"Invalid expression: {message} at end of input")
+        return ValueError(f"Invalid expression: {message} at position {token[2]}")
+
+    def emit(self, opcode, argument=None):
+        self.code.append((opcode, argument))
+        self.node_count += 1
+        if self.max_nodes is not None and self.node_count > self.max_nodes:
+            raise admission.reject(f"Expression exceeds {self.max_nodes} nodes", 'expression_nodes')
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError("Invalid expression: empty expression")
+        self.parse_binary(1)
+        token = self.peek()
+        if token is not None:
+            raise self.error(token, f"unexpected token '{token[1]}'")
+
+    def parse_binary(self, min_precedence):
+        self.parse_unary()
+        while True:
+            token = self.peek()
+            if token is None or token[0] != 'op':
+                return
+            precedence = _BINARY_PRECEDENCE.get(token[1])
+            if precedence is None or precedence < min_precedence:
+                return
+            self.index += 1
+            self.parse_binary(precedence + 1)
+            self.emit(BINARY, token[1])
+
+    def parse_unary(self):
+        token = self.peek()
+        if token is not None and token[0] == 'op' and token[1] in '+-':
+            self.index += 1
+            self.nested(self.parse_unary)
+            if token[1] == '-':
+                self.emit(NEG)
+            return
+        self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            raise self.error(token, "expected a number")
+
+        kind, value, _ = token
+        if kind == 'number':
+            self.index += 1
+            self.emit(PUSH, float(value))
+            self.literals.append(value)
+        elif kind == 'name':
+            self.index += 1
+            arity = self.functions.get(value)
+            if arity is not None:
+                self.expect('(')
+                self.nested(self.parse_arguments, token, arity)
+                self.expect(')')
+                self.emit(CALL if arity == 1 else BINARY, value)
+                return
+            following = self.peek()
+            if following is not None and following[1] == '(':
+                raise self.error(token, f"unknown function '{value}'")
+            self.variables.setdefault(value, None)
+            self.emit(LOAD, value)
+        elif value == '(':
+            self.index += 1
+            self.nested(self.parse_binary, 1)
+            self.expect(')')
+        else:
+            raise self.error(token, f"unexpected token '{value}'")
+
+    def parse_arguments(self, function, arity):
+        self.parse_binary(1)
+        count = 1
+        while True:
+            token = self.peek()
+            if token is None or token[0] != 'op' or token[1] != ',':
+                break
+            self.index += 1
+            self.parse_binary(1)
+            count += 1
+        if count != arity:
+            plural = 'argument' if arity == 1 else 'arguments'
+            raise self.error(function, f"function '{function[1]}' takes {arity} {plural}")
+
+    def nested(self, parse, *args):
+        self.depth += 1
+        if self.depth > self.deepest:
+            self.deepest = self.depth
+            if self.max_depth is not None and self.depth > self.max_depth:
+                raise admission.reject(f"Expression nesting exceeds depth {self.max_depth}",
+                                       'expression_depth')
+        parse(*args)
+        self.depth -= 1
+
+
+def compile_expression(expression: str, functions: Mapping[str, int],
+                       limits: ExpressionLimits = NO_LIMITS) -> CompiledExpression:
+    """Parse ``expression`` into a :class:`CompiledExpression`.
+
+    ``functions`` maps the names callable as ``name(a)`` or ``name(a, b)`` to
+    their number of arguments; any other identifier is a free variable. Crossing one of ``limits`` raises
+    :class:`~app.limits.LimitExceeded`.
+    """
+    parser = _Parser(tokenize(expression, limits.max_tokens), functions, limits)
+    try:
+        parser.parse()
+    except RecursionError:
+        raise ValueError("Invalid expression: too deeply nested")
+    return CompiledExpression(expression, tuple(parser.code), tuple(parser.variables),
+                              parser.node_count, parser.deepest, tuple(parser.literals))
+
+
+def normalize_expression(expression: str) -> str:
+    """Collapse whitespace runs so equivalent spellings share a cache entry."""
+    return ' '.join(expression.split())
+
+
+def expression_handle(expression: str) -> str:
+    """Encode a normalized expression as an opaque, URL-safe handle.
+
+    Handles are self-describing rather than keys into per-process state, so
+    a handle issued by one worker is valid on every worker and across
+    restarts; each worker compiles it at most once through its cache.
+    """
+    encoded = base64.urlsafe_b64encode(normalize_expression(expression).encode('utf-8'))
+    return encoded.decode('ascii').rstrip('=')
+
+
+def expression_from_handle(handle: str) -> str:
+    """Decode a handle produced by :func:`expression_handle`."""
+    try:
+        padded = handle + '=' * (-len(handle) % 4)
+        return base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid expression handle")
+
+
+class ExpressionCache:
+    """Bounded, thread-safe LRU cache of compiled expressions."""
+
+    def __init__(self, compiler: Callable[[str], CompiledExpression], maxsize: int = 1024):
+        self.compiler = compiler
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, expression: str) -> CompiledExpression:
+        """Return the compiled form of ``expression``, compiling it on a miss."""
+        key = normalize_expression(expression)
+
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        # Compile outside the lock; syntax errors propagate and are not cached
+        compiled = self.compiler(key)
+
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return compiled
+
+    def resize(self, maxsize: int):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / lookups if lookups else 0
+            }
@@ -0,0 +1,101 @@
+import json
+import math
+from array import array
+
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is used instead
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; result columns are then arrays
+    np = None
+
+
+def _is_column(value):
+    return isinstance(value, array) or (np is not None and isinstance(value, np.ndarray))
+
+
+def _column_default(value):
+    """``default`` hook: float columns (``array``, NumPy) encode as lists."""
+    if _is_column(value):
+        return value.tolist()
+    return _default(value)
+
+
+def _finite(value):
+    """Copy ``value`` with every non-finite float replaced by None."""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if _is_column(value):
+        return _finite(value.tolist())
+    return value
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes straight to compact bytes.
+
+    Uses orjson when it is installed and ``JSON_BACKEND`` allows it, the
+    stdlib encoder otherwise. Either way ``inf``/``nan`` are emitted as
+    ``null`` (stdlib would write the invalid tokens ``Infinity``/``NaN``),
+    float64 result columns are encoded as arrays (by orjson without an
+    intermediate list), responses skip the debug pretty-print check, and
+    bodies of module-level constants such as the /health payload are
+    encoded once and reused.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        backend = app.config.get('JSON_BACKEND', 'auto')
+        if backend == 'orjson' and orjson is None:
+            raise ValueError("JSON_BACKEND is 'orjson' but orjson is not installed")
+        self.backend = 'orjson' if orjson is not None and backend != 'stdlib' else 'stdlib'
+        self._constants = {}
+
+    def encode(self, obj) -> bytes:
+        """Serialize ``obj`` to compact UTF-8 JSON bytes."""
+        if self.backend == 'orjson':
+            return orjson.dumps(obj, default=_column_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        try:
+            text = json.dumps(obj, default=_column_default, allow_nan=False, ensure_ascii=False,
+                              separators=(',', ':'))
+        except ValueError:
+            # Only non-finite floats get here; rewrite them and retry
+            text = json.dumps(_finite(obj), default=_column_default, allow_nan=False, ensure_ascii=False,
+                              separators=(',', ':'))
+        return text.encode('utf-8')
+
+    def encode_constant(self, obj) -> bytes:
+        """Encoded bytes of a constant ``obj``, cached by identity."""
+        entry = self._constants.get(id(obj))
+        if entry is None or entry[0] is not obj:
+            entry = self._constants[id(obj)] = (obj, self.encode(obj))
+        return entry[1]
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(_finite(obj), **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.backend == 'orjson' and not kwargs:
+            try:
+                return orjson.loads(s)
+            except ValueError:
+                pass  # NaN literals and >64-bit integers: let the stdlib decide
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.encode(obj), mimetype=self.mimetype)
+
+    def constant_response(self, obj):
+        """Response for a constant payload, reusing its pre-encoded body."""
+        return self._app.response_class(self.encode_constant(obj), mimetype=self.mimetype)
@@ -0,0 +1,88 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+
+class LimitExceeded(Exception):
+    """A request exceeded an admission limit.
+
+    Deliberately not a ValueError: per-row error handling must not absorb
+    it, so one limit hit aborts the whole request. ``status`` is the HTTP
+    status to answer with (413 for bodies, 422 for everything else) and
+    ``reason`` the counter it is recorded under in /metrics.
+    """
+
+    def __init__(self, message: str, reason: str, status: int = 422):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+
+
+class AdmissionStats:
+    """Counts of rejected requests by reason, exported under ``admission``."""
+
+    REASONS = ('body_too_large', 'expression_tokens', 'expression_nodes', 'expression_depth', 'cpu_budget')
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.REASONS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, reason: str):
+        with self._lock:
+            self.counts[reason] = self.counts.get(reason, 0) + 1
+
+    def reject(self, message: str, reason: str, status: int = 422) -> LimitExceeded:
+        """Record a rejection and return the exception to raise."""
+        self.record(reason)
+        return LimitExceeded(message, reason, status)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+        stats['rejected'] = sum(stats.values())
+        return stats
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+
+class CPUBudget:
+    """Deadline on the CPU time of the thread evaluating one request."""
+
+    __slots__ = ('seconds', 'deadline')
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.deadline = time.thread_time() + seconds
+
+
+_budget: ContextVar[Optional[CPUBudget]] = ContextVar('cpu_budget', default=None)
+
+
+@contextmanager
+def cpu_budget(seconds: Optional[float]):
+    """Run the block under a CPU time budget; ``None`` or 0 disables it."""
+    token = _budget.set(CPUBudget(seconds) if seconds else None)
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+def check_budget():
+    """Raise :class:`LimitExceeded` once the current budget is spent.
+
+    Called cooperatively between evaluation steps. Work handed to executor
+    pool threads or processes runs outside the request's context and is
+    not checked, so it is bounded by the batch and expression size limits.
+    """
+    budget = _budget.get()
+    if budget is not None and time.thread_time() > budget.deadline:
+        raise admission.reject(f"Evaluation exceeded the CPU time budget ({budget.seconds:g}s)", 'cpu_budget')
+
+
+admission = AdmissionStats()
+os.register_at_fork(after_in_child=admission._after_fork)
@@ -1,8 +1,19 @@
 import structlog
 import logging
+import contextvars
+import os
+import queue
+import random
 import sys
+import threading
 from flask import has_request_context, request
 from datetime import datetime
+from app.metrics import metrics_collector
+from app.tracing import current_trace, stage
+
+
+# Request fields for code running outside a Flask request context (the ASGI app)
+request_info = contextvars.ContextVar('request_info', default=None)
 
 
 def add_request_info(logger, method_name, event_dict):
@@ -11,14 +22,222 @@ def add_request_info(logger, method_name, event_dict):
         event_dict['method'] = request.method
         event_dict['path'] = request.path
         event_dict['remote_addr'] = request.remote_addr
+    else:
+        info = request_info.get()
+        if info is not None:
+            event_dict.update(info)
+    trace = current_trace.get()
+    if trace is not None:
+        event_dict['trace_id'] = trace.trace_id
+        event_dict['span_id'] = trace.span_id
     return event_dict
 
 
+class AsyncBatchingHandler(logging.Handler):
+    """Logging handler that moves formatting and I/O off the request thread.
+    
+    ``emit`` only puts the record on a bounded queue; a background writer
+    thread formats queued records and writes them to ``stream`` in batches
+    of up to ``batch_size`` with one write and flush per batch. When the
+    queue is full the record is dropped and counted instead of blocking.
+    
+    Structlog processors (including ``add_request_info``) still run on the
+    request thread; only the final rendering happens in the writer.
+    """
+    
+    def __init__(self, stream=None, queue_size=10000, batch_size=256, flush_interval=0.5):
+        super().__init__()
+        self.stream = stream or sys.stdout
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self._start()
+    
+    def _start(self):
+        # Guards the counters, updated by request threads, the writer and flush()
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._writer = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._writer.start()
+    
+    def after_fork(self):
+        """Threads do not survive fork; give the child its own queue and writer."""
+        if self._stop.is_set():
+            return
+        self.createLock()
+        self._start()
+    
+    def emit(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+    
+    def _run(self):
+        get = self._queue.get
+        while True:
+            try:
+                batch = [get(timeout=self.flush_interval)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            self._write(batch)
+    
+    def _write(self, batch):
+        lines = []
+        for record in batch:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if not lines:
+            return
+        try:
+            self.stream.write('\n'.join(lines) + '\n')
+            self.stream.flush()
+        except Exception:
+            self.handleError(batch[-1])
+        with self._stats_lock:
+            self.written += len(lines)
+            self.batches += 1
+    
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        batch = []
+        try:
+            while True:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if batch:
+            self._write(batch)
+    
+    def close(self):
+        self._stop.set()
+        self._writer.join(timeout=self.flush_interval * 2)
+        self.flush()
+        super().close()
+    
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'queue_size': self.queue_size,
+                'dropped': self.dropped,
+                'written': self.written,
+                'batches': self.batches
+            }
+
+
+class LogSampler:
+    """Per-route log sampling rates."""
+    
+    def __init__(self):
+        self.default_rate = 1.0
+        self.route_rates = {}
+        self.always_log_errors = True
+    
+    def configure(self, default_rate=1.0, route_rates=None, always_log_errors=True):
+        self.default_rate = default_rate
+        self.route_rates = dict(route_rates or {})
+        self.always_log_errors = always_log_errors
+    
+    def rate(self, route):
+        return self.route_rates.get(route, self.default_rate)
+
+
+log_sampler = LogSampler()
+
+
+def parse_sample_rates(value):
+    """Parse ``"calculate=0.01,evaluate=0.1"`` into ``{route: rate}``."""
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            route, rate = item.split('=', 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+class RouteLogger:
+    """Sampled, level-gated logger for one hot route.
+    
+    Call ``begin()`` once per request to make the sampling decision; it
+    returns a log object whose methods take the event name and an optional
+    zero-argument callable producing the fields. The callable only runs for
+    events that pass the level check and the sampler, so dropped events
+    never build their field dict or format exception messages::
+    
+        log = calculate_log.begin()
+        log.info("Calculating", lambda: {'operation': operation, 'a': a})
+    
+    Events at WARNING and above bypass sampling when the sampler is set to
+    always log errors.
+    """
+    
+    def __init__(self, route, sampler=None):
+        self.route = route
+        self.sampler = sampler or log_sampler
+        self.logger = structlog.get_logger()
+        self._sampled = _RouteLog(self, True)
+        self._unsampled = _RouteLog(self, False)
+    
+    def begin(self):
+        return self._sampled if random.random() < self.sampler.rate(self.route) else self._unsampled
+
+
+class _RouteLog:
+    __slots__ = ('route_logger', 'sampled')
+    
+    def __init__(self, route_logger, sampled):
+        self.route_logger = route_logger
+        self.sampled = sampled
+    
+    def _log(self, level, event, fields, **kwargs):
+        if not self.sampled and not (level >= logging.WARNING and self.route_logger.sampler.always_log_errors):
+            return
+        if not logging.root.isEnabledFor(level):
+            return
+        with stage('log'):
+            if fields is not None:
+                kwargs.update(fields())
+            self.route_logger.logger.log(level, event, **kwargs)
+    
+    def debug(self, event, fields=None, **kwargs):
+        self._log(logging.DEBUG, event, fields, **kwargs)
+    
+    def info(self, event, fields=None, **kwargs):
+        self._log(logging.INFO, event, fields, **kwargs)
+    
+    def warning(self, event, fields=None, **kwargs):
+        self._log(logging.WARNING, event, fields, **kwargs)
+    
+    def error(self, event, fields=None, **kwargs):
+        self._log(logging.ERROR, event, fields, **kwargs)
+
+
 def setup_logging(app):
     log_level = getattr(logging, app.config['LOG_LEVEL'].upper())
     
     timestamper = structlog.processors.TimeStamper(fmt="iso")
     
+    log_sampler.configure(
+        default_rate=app.config.get('LOG_SAMPLE_RATE', 1.0),
+        route_rates=parse_sample_rates(app.config.get('LOG_SAMPLE_ROUTES')),
+        always_log_errors=app.config.get('LOG_ALWAYS_LOG_ERRORS', True),
+    )
+    
     shared_processors = [
         structlog.stdlib.add_log_level,
         add_request_info,
@@ -44,10 +263,26 @@ def setup_logging(app):
         foreign_pre_chain=shared_processors,
     )
     
-    handler = logging.StreamHandler(sys.stdout)
+    if app.config.get('LOG_ASYNC'):
+        handler = AsyncBatchingHandler(
+            sys.stdout,
+            queue_size=app.config.get('LOG_QUEUE_SIZE', 10000),
+            batch_size=app.config.get('LOG_BATCH_SIZE', 256),
+            flush_interval=app.config.get('LOG_FLUSH_INTERVAL', 0.5),
+        )
+        os.register_at_fork(after_in_child=handler.after_fork)
+        metrics_collector.register_stats('logging', handler.stats)
+    else:
+        handler = logging.StreamHandler(sys.stdout)
     handler.setFormatter(formatter)
     
     root_logger = logging.getLogger()
+    # Replace the handler installed by a previous create_app() call
+    for existing in list(root_logger.handlers):
+        if getattr(existing, 'calculator_handler', False):
+            root_logger.removeHandler(existing)
+            existing.close()
+    handler.calculator_handler = True
     root_logger.addHandler(handler)
     root_logger.setLevel(log_level)
     
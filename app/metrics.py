@@ -1,102 +1,775 @@
+import itertools
+import json
+import os
+import threading
 import time
-from flask import request
-from functools import wraps
+from array import array
+from bisect import bisect_right
+from flask import Request, Response, request
+from app.assets import assets
+from app.startup import startup
+from app.calculator import expression_cache
+from app.executor import executor
+from app.limits import admission
+from app.profiler import profiler, render_profile
+from app.rate_limit import rate_limiter
+from app.result_cache import result_cache
+from app.shared_store import SnapshotFile
+from app.tracing import tracer
+
+
+def _latency_bucket_edges():
+    """Lower edges (ns) of log-linear buckets from 1us to 100s.
+    
+    Each decade is split into 90 linear sub-buckets (10..99 x 10^k), which
+    bounds the relative error of any reported percentile to about 10%.
+    """
+    edges = []
+    for exponent in range(2, 10):
+        scale = 10 ** exponent
+        edges.extend(mantissa * scale for mantissa in range(10, 100))
+    edges.append(10 ** 11)
+    return tuple(edges)
+
+
+class LatencyHistogram:
+    """Fixed-size log-linear latency histogram.
+    
+    Recording is a bisect over a constant number of bucket edges plus a
+    counter increment; memory does not depend on how many values are seen.
+    Bucket 0 holds values below 1us and the last bucket values of 100s+.
+    """
+    
+    EDGES = _latency_bucket_edges()
+    
+    __slots__ = ('counts', 'count', 'total_ns', 'max_ns')
+    
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * (len(self.EDGES) + 1)))
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+    
+    def record(self, duration_ns, weight=1):
+        self.counts[bisect_right(self.EDGES, duration_ns)] += weight
+        self.count += weight
+        self.total_ns += duration_ns * weight
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+    
+    def percentile(self, fraction):
+        """Approximate percentile in nanoseconds (bucket midpoint)."""
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        edges = self.EDGES
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                if index == 0:
+                    return min(edges[0], self.max_ns)
+                if index == len(edges):
+                    return self.max_ns
+                return min((edges[index - 1] + edges[index]) / 2, self.max_ns)
+        return self.max_ns
+    
+    def merge(self, other):
+        counts = self.counts
+        for index, bucket_count in enumerate(other.counts):
+            if bucket_count:
+                counts[index] += bucket_count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+    
+    def cumulative_count(self, upper_ns):
+        """Number of values in buckets whose upper edge is <= ``upper_ns``."""
+        return sum(self.counts[:bisect_right(self.EDGES, upper_ns)])
+    
+    def to_dict(self):
+        return {
+            'buckets': [[index, n] for index, n in enumerate(self.counts) if n],
+            'count': self.count,
+            'total_ns': self.total_ns,
+            'max_ns': self.max_ns,
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, bucket_count in data['buckets']:
+            histogram.counts[index] = bucket_count
+        histogram.count = data['count']
+        histogram.total_ns = data['total_ns']
+        histogram.max_ns = data['max_ns']
+        return histogram
+    
+    def summary(self):
+        """Latency summary in milliseconds."""
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ns / self.count / 1e6 if self.count else 0,
+            'max_ms': self.max_ns / 1e6,
+            'p50_ms': self.percentile(0.50) / 1e6,
+            'p90_ms': self.percentile(0.90) / 1e6,
+            'p99_ms': self.percentile(0.99) / 1e6,
+            'p999_ms': self.percentile(0.999) / 1e6,
+        }
+
+
+class SlidingWindowCounter:
+    """Per-second ring buffer of event counts covering the last 15 minutes."""
+    
+    SLOTS = 900
+    WINDOWS = (('1m', 60), ('5m', 300), ('15m', 900))
+    
+    __slots__ = ('counts', 'seconds')
+    
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * self.SLOTS))
+        self.seconds = array('q', bytes(8 * self.SLOTS))
+    
+    def record(self, now, weight=1):
+        second = int(now)
+        slot = second % self.SLOTS
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += weight
+    
+    def rates(self, now):
+        """Average events per second over each window."""
+        current = int(now)
+        totals = dict.fromkeys((name for name, _ in self.WINDOWS), 0)
+        for second, count in zip(self.seconds, self.counts):
+            age = current - second
+            if not count or age < 0:
+                continue
+            for name, window in self.WINDOWS:
+                if age < window:
+                    totals[name] += count
+        return {f'rate_{name}': totals[name] / window for name, window in self.WINDOWS}
+    
+    def merge(self, other):
+        for second, count in zip(other.seconds, other.counts):
+            if count:
+                slot = second % self.SLOTS
+                if self.seconds[slot] == second:
+                    self.counts[slot] += count
+                elif self.seconds[slot] < second:
+                    self.seconds[slot] = second
+                    self.counts[slot] = count
+    
+    def to_dict(self):
+        return [[second, count] for second, count in zip(self.seconds, self.counts) if count]
+    
+    @classmethod
+    def from_dict(cls, data):
+        window = cls()
+        for second, count in data:
+            slot = second % cls.SLOTS
+            window.seconds[slot] = second
+            window.counts[slot] = count
+        return window
+
+
+class RequestStats:
+    """Streaming aggregates for one (method, endpoint, status) label set."""
+    
+    __slots__ = ('histogram', 'window')
+    
+    def __init__(self, histogram=None, window=None):
+        self.histogram = histogram or LatencyHistogram()
+        self.window = window or SlidingWindowCounter()
+    
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        self.window.merge(other.window)
+
+
+PROMETHEUS_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                      0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _sum_stats(total, stats):
+    """Add the numeric leaves of ``stats`` into ``total`` (recursively)."""
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            _sum_stats(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = total.get(key, 0) + value
+        else:
+            total.setdefault(key, value)
+    # Ratios cannot be summed across workers; recompute them from the counters
+    if 'hit_ratio' in total and 'hits' in total and 'misses' in total:
+        lookups = total['hits'] + total['misses']
+        total['hit_ratio'] = total['hits'] / lookups if lookups else 0
+    return total
+
+
+def _prometheus_labels(labels):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in labels
+    )
+
+
+# Counters of exited workers, kept so pod totals never go backwards
+RETIRED_SNAPSHOT = 'retired.metrics'
+_retired_files = {}
+
+
+def _serialize_stats(request_stats, stage_stats):
+    return {
+        'requests': [
+            [list(key), stats.histogram.to_dict(), stats.window.to_dict()]
+            for key, stats in request_stats.items()
+        ],
+        'stages': [[list(key), histogram.to_dict()] for key, histogram in stage_stats.items()],
+    }
+
+
+def _merge_snapshot(snapshot, request_stats, stage_stats):
+    """Merge the request and stage stats of a published snapshot into the two dicts"""
+    for key, histogram, window in snapshot['requests']:
+        stats = RequestStats(LatencyHistogram.from_dict(histogram),
+                             SlidingWindowCounter.from_dict(window))
+        key = tuple(key)
+        if key in request_stats:
+            request_stats[key].merge(stats)
+        else:
+            request_stats[key] = stats
+    for key, histogram in snapshot.get('stages', ()):
+        histogram = LatencyHistogram.from_dict(histogram)
+        key = tuple(key)
+        if key in stage_stats:
+            stage_stats[key].merge(histogram)
+        else:
+            stage_stats[key] = histogram
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def mark_process_dead(multiproc_dir, pid):
+    """Retire the snapshot file of the exited worker ``pid``.
+    
+    Its request and stage counters are folded into the directory's retired
+    snapshot, so pod totals never go backwards; its stats providers (cache
+    sizes and other gauges) are dropped with its file. Call it from the
+    process that reaps the workers (gunicorn's ``child_exit`` hook).
+    """
+    path = os.path.join(multiproc_dir, f'worker-{pid}.metrics')
+    payload = SnapshotFile.read(path)
+    if payload:
+        retired_path = os.path.join(multiproc_dir, RETIRED_SNAPSHOT)
+        request_stats = {}
+        stage_stats = {}
+        snapshot = json.loads(payload)
+        start_time = snapshot['start_time']
+        retired = SnapshotFile.read(retired_path)
+        if retired:
+            retired = json.loads(retired)
+            _merge_snapshot(retired, request_stats, stage_stats)
+            start_time = min(start_time, retired['start_time'])
+        _merge_snapshot(snapshot, request_stats, stage_stats)
+        writer = _retired_files.get(retired_path)
+        if writer is None:
+            writer = _retired_files[retired_path] = SnapshotFile(retired_path)
+        retired = {'start_time': start_time, **_serialize_stats(request_stats, stage_stats)}
+        writer.write(json.dumps(retired, separators=(',', ':')).encode())
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
 
 
-# Basic metrics tracking - candidates should implement their own monitoring solution
 class MetricsCollector:
+    """Fixed-memory request metrics, optionally aggregated across processes.
+    
+    Each thread records into its own shard, so the request path takes no
+    lock; readers merge the shards. Shards of exited threads are folded
+    into per-process retired totals, so memory follows the live threads. When ``multiproc_dir`` is configured,
+    every worker process periodically publishes a snapshot of its merged
+    stats to an mmap file in that directory, and get_stats() aggregates the
+    snapshots of all live workers (plus the retired counters of exited
+    ones, see :func:`mark_process_dead`) so /metrics describes the whole pod.
+    """
+    
     def __init__(self):
-        self.request_count = {}
-        self.request_duration = []
         self.start_time = time.time()
+        self.stats_providers = {}
+        self.multiproc_dir = None
+        self.publish_interval = 1.0
+        self._local = threading.local()
+        self._shards = {}
+        self._stage_shards = {}
+        self._retired = {}
+        self._retired_stages = {}
+        self._shards_lock = threading.Lock()
+        self._snapshot_file = None
+        # Serializes publish(), called by the publisher thread and by /metrics scrapes
+        self._publish_lock = threading.Lock()
+        self._publisher = None
+        self._publisher_stop = threading.Event()
+    
+    def register_stats(self, name, provider):
+        """Include the dict returned by ``provider()`` in get_stats() under ``name``"""
+        self.stats_providers[name] = provider
+    
+    def configure(self, multiproc_dir=None, publish_interval=1.0):
+        """Enable cross-process aggregation through ``multiproc_dir``
+        
+        A process starts publishing with its first request, or when
+        :meth:`start_publisher` is called (gunicorn's ``post_worker_init``
+        hook), so a ``--preload`` master, which builds the app but serves no
+        requests, is never counted as a worker.
+        """
+        self.multiproc_dir = multiproc_dir
+        self.publish_interval = publish_interval
+        if multiproc_dir:
+            os.makedirs(multiproc_dir, exist_ok=True)
+    
+    def start_publisher(self):
+        """Start publishing this process's snapshot, if not already"""
+        with self._shards_lock:
+            self._start_publisher()
+    
+    def _shard(self):
+        shard = self._local.shard = {}
+        with self._shards_lock:
+            self._retire_shards()
+            self._shards[threading.current_thread()] = shard
+            self._start_publisher()
+        return shard
+    
+    def _retire_shards(self):
+        """Fold the shards of exited threads into the retired totals (call with the lock held)"""
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            for endpoint, methods in self._shards.pop(thread).items():
+                for method, statuses in methods.items():
+                    retired = self._retired.setdefault(endpoint, {}).setdefault(method, {})
+                    for status, stats in statuses.items():
+                        if status in retired:
+                            retired[status].merge(stats)
+                        else:
+                            retired[status] = stats
+        for thread in [thread for thread in self._stage_shards if not thread.is_alive()]:
+            for endpoint, histograms in self._stage_shards.pop(thread).items():
+                retired = self._retired_stages.setdefault(endpoint, {})
+                for name, histogram in histograms.items():
+                    if name in retired:
+                        retired[name].merge(histogram)
+                    else:
+                        retired[name] = histogram
+    
+    def record(self, method, endpoint, status, duration_ns, weight=1):
+        """Record one request (``duration_ns`` from perf_counter_ns).
+        
+        Shards are nested ``endpoint -> method -> status`` dicts, so the hot
+        path only does three lookups on already-interned keys and never
+        builds a label string or tuple. ``weight`` > 1 accounts for sampling.
+        """
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._shard()
+        try:
+            stats = shard[endpoint][method][status]
+        except KeyError:
+            stats = shard.setdefault(endpoint, {}).setdefault(method, {}).setdefault(status, RequestStats())
+        stats.histogram.record(duration_ns, weight)
+        stats.window.record(time.time(), weight)
+    
+    def record_stages(self, endpoint, stages, weight=1):
+        """Record one request's ``{stage: self_ns}`` breakdown (see :meth:`app.tracing.Trace.breakdown`)"""
+        try:
+            shard = self._local.stages
+        except AttributeError:
+            shard = self._local.stages = {}
+            with self._shards_lock:
+                self._retire_shards()
+                self._stage_shards[threading.current_thread()] = shard
+        histograms = shard.get(endpoint)
+        if histograms is None:
+            histograms = shard[endpoint] = {}
+        for name, duration_ns in stages.items():
+            histogram = histograms.get(name)
+            if histogram is None:
+                histogram = histograms[name] = LatencyHistogram()
+            histogram.record(duration_ns, weight)
     
     def track_request(self, method, endpoint, status, duration):
-        """Track basic request metrics"""
-        key = f"{method}:{endpoint}:{status}"
-        self.request_count[key] = self.request_count.get(key, 0) + 1
-        self.request_duration.append({
-            'method': method,
-            'endpoint': endpoint,
-            'duration': duration,
-            'timestamp': time.time()
-        })
+        """Track request metrics in fixed-memory aggregates (duration in seconds)"""
+        self.record(method, endpoint, status, int(duration * 1e9))
+    
+    def local_stats(self):
+        """Merge this process's thread shards into one ``{key: RequestStats}``"""
+        merged = {}
+        with self._shards_lock:
+            self._retire_shards()
+            for shard in [self._retired, *self._shards.values()]:
+                for endpoint, methods in list(shard.items()):
+                    for method, statuses in list(methods.items()):
+                        for status, stats in list(statuses.items()):
+                            key = (method, endpoint, status)
+                            total = merged.get(key)
+                            if total is None:
+                                total = merged[key] = RequestStats()
+                            total.merge(stats)
+        return merged
+    
+    def local_stages(self):
+        """Merge this process's stage shards into one ``{(endpoint, stage): LatencyHistogram}``"""
+        merged = {}
+        with self._shards_lock:
+            self._retire_shards()
+            for shard in [self._retired_stages, *self._stage_shards.values()]:
+                for endpoint, histograms in list(shard.items()):
+                    for name, histogram in list(histograms.items()):
+                        total = merged.get((endpoint, name))
+                        if total is None:
+                            total = merged[(endpoint, name)] = LatencyHistogram()
+                        total.merge(histogram)
+        return merged
+    
+    def _snapshot(self):
+        return {
+            'pid': os.getpid(),
+            'start_time': self.start_time,
+            **_serialize_stats(self.local_stats(), self.local_stages()),
+            'providers': {name: provider() for name, provider in self.stats_providers.items()},
+        }
+    
+    def publish(self):
+        """Write this process's snapshot to its mmap file"""
+        with self._publish_lock:
+            if self._snapshot_file is None:
+                path = os.path.join(self.multiproc_dir, f'worker-{os.getpid()}.metrics')
+                self._snapshot_file = SnapshotFile(path)
+            self._snapshot_file.write(json.dumps(self._snapshot(), separators=(',', ':')).encode())
+    
+    def _start_publisher(self):
+        if not self.multiproc_dir or self._publisher is not None:
+            return
+        
+        def run():
+            while not self._publisher_stop.wait(self.publish_interval):
+                try:
+                    self.publish()
+                except Exception:
+                    pass
+        
+        self._publisher_stop.clear()
+        self._publisher = threading.Thread(target=run, name='metrics-publisher', daemon=True)
+        self._publisher.start()
+    
+    def _after_fork(self):
+        """Reset per-process state in a freshly forked worker"""
+        self._local = threading.local()
+        self._shards = {}
+        self._stage_shards = {}
+        self._retired = {}
+        self._retired_stages = {}
+        self._shards_lock = threading.Lock()
+        self._snapshot_file = None
+        self._publish_lock = threading.Lock()
+        self.start_time = time.time()
+        self._publisher = None
+        self._publisher_stop = threading.Event()
+    
+    def aggregate(self):
+        """Return ``(request_stats, stage_stats, providers, start_time, workers)`` for the pod"""
+        if not self.multiproc_dir:
+            providers = {name: provider() for name, provider in self.stats_providers.items()}
+            return self.local_stats(), self.local_stages(), providers, self.start_time, 1
+        
+        self.publish()
+        merged = {}
+        stages = {}
+        providers = {}
+        start_time = self.start_time
+        workers = 0
+        own_pid = os.getpid()
+        for name in os.listdir(self.multiproc_dir):
+            if not name.endswith('.metrics'):
+                continue
+            payload = SnapshotFile.read(os.path.join(self.multiproc_dir, name))
+            if not payload:
+                continue
+            snapshot = json.loads(payload)
+            pid = snapshot.get('pid')
+            if pid is not None:
+                # A worker that exited without being retired (see mark_process_dead)
+                if pid != own_pid and not _pid_alive(pid):
+                    continue
+                workers += 1
+                _sum_stats(providers, snapshot['providers'])
+            start_time = min(start_time, snapshot['start_time'])
+            _merge_snapshot(snapshot, merged, stages)
+        return merged, stages, providers, start_time, workers
     
     def get_stats(self):
-        """Get basic statistics"""
-        uptime = time.time() - self.start_time
-        total_requests = sum(self.request_count.values())
-        avg_duration = sum(d['duration'] for d in self.request_duration) / len(self.request_duration) if self.request_duration else 0
+        """Get request statistics"""
+        request_stats, stage_stats, providers, start_time, workers = self.aggregate()
+        now = time.time()
         
-        return {
-            'uptime_seconds': uptime,
+        request_count = {}
+        endpoints = {}
+        rates = {}
+        total_requests = 0
+        total_ns = 0
+        for (method, endpoint, status), stats in request_stats.items():
+            key = f"{method}:{endpoint}:{status}"
+            summary = stats.histogram.summary()
+            window_rates = stats.window.rates(now)
+            summary.update(window_rates)
+            endpoints[key] = summary
+            request_count[key] = stats.histogram.count
+            total_requests += stats.histogram.count
+            total_ns += stats.histogram.total_ns
+            for name, rate in window_rates.items():
+                rates[name] = rates.get(name, 0) + rate
+        
+        # Per-request self time of each stage, by endpoint
+        stages = {}
+        for (endpoint, name), histogram in sorted(stage_stats.items()):
+            stages.setdefault(endpoint, {})[name] = histogram.summary()
+        
+        stats = {
+            'uptime_seconds': now - start_time,
+            'workers': workers,
             'total_requests': total_requests,
-            'average_duration': avg_duration,
-            'request_counts': self.request_count
+            'average_duration': total_ns / total_requests / 1e9 if total_requests else 0,
+            'request_counts': request_count,
+            'request_rates': rates,
+            'endpoints': endpoints,
+            'stages': stages,
         }
+        stats.update(providers)
+        return stats
+    
+    def to_prometheus(self):
+        """Render pod-wide metrics in the Prometheus text exposition format"""
+        request_stats, stage_stats, providers, start_time, workers = self.aggregate()
+        now = time.time()
+        lines = [
+            '# HELP calculator_uptime_seconds Seconds since the oldest worker started.',
+            '# TYPE calculator_uptime_seconds gauge',
+            f'calculator_uptime_seconds {now - start_time:.3f}',
+            '# HELP calculator_workers Worker processes reporting metrics.',
+            '# TYPE calculator_workers gauge',
+            f'calculator_workers {workers}',
+            '# HELP calculator_requests_total Total HTTP requests.',
+            '# TYPE calculator_requests_total counter',
+        ]
+        items = sorted(request_stats.items(), key=lambda item: tuple(map(str, item[0])))
+        for (method, endpoint, status), stats in items:
+            labels = _prometheus_labels([('method', method), ('endpoint', endpoint), ('status', status)])
+            lines.append(f'calculator_requests_total{{{labels}}} {stats.histogram.count}')
+        
+        lines += [
+            '# HELP calculator_request_duration_seconds HTTP request latency.',
+            '# TYPE calculator_request_duration_seconds histogram',
+        ]
+        for (method, endpoint, status), stats in items:
+            labels = _prometheus_labels([('method', method), ('endpoint', endpoint), ('status', status)])
+            histogram = stats.histogram
+            for bound in PROMETHEUS_BUCKETS:
+                cumulative = histogram.cumulative_count(int(bound * 1e9))
+                lines.append(f'calculator_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'calculator_request_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'calculator_request_duration_seconds_sum{{{labels}}} {histogram.total_ns / 1e9}')
+            lines.append(f'calculator_request_duration_seconds_count{{{labels}}} {histogram.count}')
+        
+        lines += [
+            '# HELP calculator_request_rate Requests per second over a sliding window.',
+            '# TYPE calculator_request_rate gauge',
+        ]
+        for (method, endpoint, status), stats in items:
+            for name, rate in stats.window.rates(now).items():
+                labels = _prometheus_labels([('method', method), ('endpoint', endpoint), ('status', status),
+                                             ('window', name[len('rate_'):])])
+                lines.append(f'calculator_request_rate{{{labels}}} {rate}')
+        
+        lines += [
+            '# HELP calculator_request_stage_seconds Time per request spent in each stage (self time).',
+            '# TYPE calculator_request_stage_seconds histogram',
+        ]
+        for (endpoint, name), histogram in sorted(stage_stats.items()):
+            labels = _prometheus_labels([('endpoint', endpoint), ('stage', name)])
+            for bound in PROMETHEUS_BUCKETS:
+                cumulative = histogram.cumulative_count(int(bound * 1e9))
+                lines.append(f'calculator_request_stage_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'calculator_request_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'calculator_request_stage_seconds_sum{{{labels}}} {histogram.total_ns / 1e9}')
+            lines.append(f'calculator_request_stage_seconds_count{{{labels}}} {histogram.count}')
+        
+        for name, values in sorted(providers.items()):
+            for field, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f'# TYPE calculator_{name}_{field} gauge')
+                    lines.append(f'calculator_{name}_{field} {value}')
+        
+        return '\n'.join(lines) + '\n'
 
 
 # Global metrics collector instance
 metrics_collector = MetricsCollector()
 
+# gunicorn forks workers from the master; give each one fresh shards and its own snapshot file
+os.register_at_fork(after_in_child=metrics_collector._after_fork)
+
+
+PROMETHEUS_MIMETYPE = 'text/plain; version=0.0.4'
+
+
+def render_metrics(requested_format, accept, default_format='json'):
+    """Build the /metrics response shared by the WSGI and ASGI apps.
+    
+    Returns ``(body, mimetype)``: the Prometheus text with its mimetype when
+    ``requested_format`` (or, without one, the Accept header) asks for it,
+    otherwise a JSON-serializable dict and None.
+    """
+    metrics_format = requested_format or default_format
+    if metrics_format == 'prometheus' or (
+            requested_format is None and accept.startswith(('text/plain', 'application/openmetrics-text'))):
+        return metrics_collector.to_prometheus(), PROMETHEUS_MIMETYPE
+    
+    return {
+        'status': 'ok',
+        'metrics': metrics_collector.get_stats(),
+        'note': 'Use /metrics?format=prometheus for the Prometheus text format'
+    }, None
+
+
+class InstrumentedRequest(Request):
+    """Request that mirrors its matched endpoint into the WSGI environ.
+    
+    Flask drops the request object from the environ when the request
+    context is torn down; keeping the endpoint in the environ lets
+    RequestInstrumentation label the request afterwards without a hook.
+    """
+    
+    _url_rule = None
+    
+    @property
+    def url_rule(self):
+        return self._url_rule
+    
+    @url_rule.setter
+    def url_rule(self, rule):
+        self._url_rule = rule
+        if rule is not None:
+            self.environ['calculator.endpoint'] = rule.endpoint
+
 
-def track_metrics(f):
-    """Decorator to track metrics for routes"""
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        start_time = time.time()
+class RequestInstrumentation:
+    """WSGI middleware that records every request's metrics in one place.
+    
+    Timing uses perf_counter_ns around the whole Flask dispatch, and the
+    endpoint is read from the environ (see InstrumentedRequest), so no Flask
+    hooks or context-local proxies run per request. The stage breakdown of
+    the request's trace (see :mod:`app.tracing`) is recorded with it. With
+    ``sample_rate`` < 1 only every Nth request is timed and it is recorded
+    with weight N; the others pay a single counter increment.
+    """
+    
+    def __init__(self, wsgi_app, collector, sample_rate=1.0):
+        self.wsgi_app = wsgi_app
+        self.collector = collector
+        self.sample_every = round(1 / sample_rate) if sample_rate > 0 else 0
+        self._counter = itertools.count()
+        self._statuses = {}
+    
+    def __call__(self, environ, start_response):
+        sample_every = self.sample_every
+        if sample_every != 1 and (not sample_every or next(self._counter) % sample_every):
+            return self.wsgi_app(environ, start_response)
+        
+        status_line = None
         
+        def capture_status(status, headers, exc_info=None):
+            nonlocal status_line
+            status_line = status
+            return start_response(status, headers, exc_info)
+        
+        start = time.perf_counter_ns()
         try:
-            response = f(*args, **kwargs)
-            status = response[1] if isinstance(response, tuple) else 200
-        except Exception as e:
-            status = 500
-            raise
+            return self.wsgi_app(environ, capture_status)
         finally:
-            duration = time.time() - start_time
-            metrics_collector.track_request(
-                method=request.method,
-                endpoint=request.endpoint or 'unknown',
-                status=status,
-                duration=duration
-            )
-        
-        return response
-    
-    return decorated_function
+            duration = time.perf_counter_ns() - start
+            status = self._statuses.get(status_line)
+            if status is None:
+                status = self._statuses.setdefault(status_line, int(status_line[:3]) if status_line else 500)
+            endpoint = environ.get('calculator.endpoint', 'unknown')
+            self.collector.record(environ['REQUEST_METHOD'], endpoint, status, duration, sample_every)
+            trace = environ.get('calculator.trace')
+            if trace is not None and trace.stages:
+                self.collector.record_stages(endpoint, trace.breakdown(duration), sample_every)
 
 
 def setup_metrics(app):
-    """Setup basic metrics collection"""
+    """Setup metrics collection and the /metrics endpoint"""
     if not app.config.get('METRICS_ENABLED', True):
         return
     
-    # Basic metrics endpoint - candidates should implement proper monitoring
+    metrics_collector.register_stats('expression_cache', expression_cache.stats)
+    metrics_collector.register_stats('result_cache', result_cache.stats)
+    metrics_collector.register_stats('executor', executor.stats)
+    metrics_collector.register_stats('admission', admission.stats)
+    metrics_collector.register_stats('rate_limit', rate_limiter.stats)
+    metrics_collector.register_stats('assets', assets.stats)
+    metrics_collector.register_stats('startup', startup.stats)
+    metrics_collector.register_stats('tracing', tracer.stats)
+    metrics_collector.register_stats('profiler', profiler.stats)
+    profiler.configure(app.config.get('PROFILER_MAX_SECONDS', 30.0))
+    if app.config.get('METRICS_MULTIPROC_DIR') and not metrics_collector.multiproc_dir:
+        metrics_collector.configure(app.config['METRICS_MULTIPROC_DIR'],
+                                    app.config.get('METRICS_PUBLISH_INTERVAL', 1.0))
+    default_format = app.config.get('METRICS_FORMAT', 'json')
+    
     @app.route('/metrics')
     def metrics():
         """
-        Basic metrics endpoint placeholder.
-        Candidates should implement proper monitoring (Prometheus, DataDog, etc.)
+        Pod-wide metrics as JSON, or in the Prometheus text format when
+        requested with ?format=prometheus or a text/plain Accept header.
         """
-        stats = metrics_collector.get_stats()
-        return {
-            'status': 'ok',
-            'metrics': stats,
-            'note': 'Implement proper monitoring solution (Prometheus, DataDog, CloudWatch, etc.)'
-        }
+        body, mimetype = render_metrics(request.args.get('format'),
+                                        request.headers.get('Accept', ''), default_format)
+        if mimetype is None:
+            return body
+        return Response(body, mimetype=mimetype)
+    
+    admin_token = app.config.get('ADMIN_TOKEN')
+    
+    @app.route('/debug/profile')
+    def debug_profile():
+        """
+        Sample the stacks of every thread in this worker for ?seconds=N and
+        return them as collapsed stacks (or JSON with ?format=json).
+        """
+        body, status, mimetype = render_profile('profile', request.args, request.headers.get('Authorization'),
+                                                admin_token)
+        if mimetype is None:
+            return body, status
+        return Response(body, status=status, mimetype=mimetype)
+    
+    @app.route('/debug/allocations')
+    def debug_allocations():
+        """Top tracemalloc allocation growths in this worker over ?seconds=N."""
+        body, status, _ = render_profile('allocations', request.args, request.headers.get('Authorization'),
+                                         admin_token)
+        return body, status
     
-    @app.before_request
-    def before_request():
-        request._start_time = time.time()
-    
-    @app.after_request
-    def after_request(response):
-        if hasattr(request, '_start_time'):
-            duration = time.time() - request._start_time
-            metrics_collector.track_request(
-                method=request.method,
-                endpoint=request.endpoint or 'unknown',
-                status=response.status_code,
-                duration=duration
-            )
-        
-        return response
\ No newline at end of file
+    app.request_class = InstrumentedRequest
+    app.wsgi_app = RequestInstrumentation(app.wsgi_app, metrics_collector,
+                                          app.config.get('METRICS_SAMPLE_RATE', 1.0))
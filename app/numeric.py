@@ -0,0 +1,207 @@
+import decimal
+import math
+import operator
+from fractions import Fraction
+from typing import Callable, Dict, Optional
+
+
+class NumericLimits:
+    """Guardrails bounding the cost of a single exact operation.
+
+    ``max_digits`` and ``max_exponent`` bound every operand (and decimal
+    results, through the context's Emax/Emin); ``max_precision`` caps the
+    requested decimal precision; ``max_bits`` caps numerator and denominator
+    of every rational operand and result. Together they keep each step to
+    roughly microseconds, whatever the request asks for.
+    """
+
+    def __init__(self, max_digits=1000, max_exponent=1000, max_precision=1000, max_bits=8192):
+        self.max_digits = max_digits
+        self.max_exponent = max_exponent
+        self.max_precision = max_precision
+        self.max_bits = max_bits
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            max_digits=config.get('NUMERIC_MAX_DIGITS', 1000),
+            max_exponent=config.get('NUMERIC_MAX_EXPONENT', 1000),
+            max_precision=config.get('NUMERIC_MAX_PRECISION', 1000),
+            max_bits=config.get('NUMERIC_MAX_BITS', 8192),
+        )
+
+
+class NumericMode:
+    """Number type used by :meth:`Calculator.calculate` for one request.
+
+    ``operations`` maps the supported operation names to functions;
+    ``parse`` converts request values (JSON numbers or strings) and
+    ``literal`` expression constants; ``apply`` runs one operation and
+    ``negate`` a unary minus with the mode's error handling and limits;
+    ``serialize`` converts a result for the JSON response.
+    """
+
+    name = 'float'
+    operations: Dict[str, Callable] = {}
+
+    def parse(self, value):
+        if isinstance(value, bool):
+            raise ValueError("Invalid number format")
+        try:
+            number = float(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid number format")
+        if not math.isfinite(number):
+            raise ValueError("Invalid number format")
+        return number
+
+    def literal(self, text: str):
+        return self.parse(text)
+
+    def apply(self, func: Callable, *args):
+        return func(*args)
+
+    def negate(self, value):
+        return -value
+
+    def serialize(self, value):
+        return value
+
+
+class DecimalMode(NumericMode):
+    """Correctly rounded ``Decimal`` arithmetic at a per-request precision."""
+
+    name = 'decimal'
+
+    def __init__(self, precision: int, limits: NumericLimits):
+        if isinstance(precision, bool) or not isinstance(precision, int) \
+                or not 1 <= precision <= limits.max_precision:
+            raise ValueError(f"Precision must be an integer between 1 and {limits.max_precision}")
+        self.limits = limits
+        self.context = decimal.Context(
+            prec=precision,
+            rounding=decimal.ROUND_HALF_EVEN,
+            Emax=limits.max_exponent,
+            Emin=-limits.max_exponent,
+            traps=[decimal.InvalidOperation, decimal.DivisionByZero, decimal.Overflow],
+        )
+        context = self.context
+        self.operations = {
+            '+': context.add,
+            '-': context.subtract,
+            '*': context.multiply,
+            '/': context.divide,
+            'sqrt': context.sqrt,
+            'log': context.log10,
+            'ln': context.ln,
+        }
+
+    def parse(self, value):
+        if isinstance(value, bool):
+            raise ValueError("Invalid number format")
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise ValueError("Invalid number format")
+            value = repr(value)
+        try:
+            number = decimal.Decimal(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError, decimal.InvalidOperation):
+            raise ValueError("Invalid number format")
+        if not number.is_finite():
+            raise ValueError("Invalid number format")
+        return self._check_operand(number)
+
+    def _check_operand(self, number):
+        limits = self.limits
+        if len(number.as_tuple().digits) > limits.max_digits:
+            raise ValueError(f"Operand exceeds {limits.max_digits} digits")
+        if number and abs(number.adjusted()) > limits.max_exponent:
+            raise ValueError(f"Operand exponent exceeds {limits.max_exponent}")
+        return number
+
+    def apply(self, func, *args):
+        try:
+            return func(*args)
+        except decimal.Overflow:
+            raise ValueError(f"Result exponent exceeds {self.limits.max_exponent}")
+        except decimal.DivisionByZero:
+            raise ValueError("Division by zero")
+        except decimal.InvalidOperation:
+            raise ValueError("Invalid decimal operation")
+
+    def negate(self, value):
+        return self.context.minus(value)
+
+    def serialize(self, value):
+        return str(value)
+
+
+class RationalMode(NumericMode):
+    """Exact ``Fraction`` arithmetic for ``+ - * /``."""
+
+    name = 'rational'
+    operations = {
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.truediv,
+    }
+
+    def __init__(self, limits: NumericLimits):
+        self.limits = limits
+        self._decimal = DecimalMode(1, limits)
+
+    def parse(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return self._check(Fraction(value), "Operand")
+        if isinstance(value, str) and '/' in value:
+            numerator, _, denominator = value.partition('/')
+            numerator = self._parse_integer(numerator)
+            denominator = self._parse_integer(denominator)
+            if denominator == 0:
+                raise ValueError("Division by zero")
+            return self._check(Fraction(numerator, denominator), "Operand")
+        # Decimal parsing bounds digits and exponent before the exact conversion
+        return self._check(Fraction(self._decimal.parse(value)), "Operand")
+
+    def _parse_integer(self, text):
+        text = text.strip()
+        digits = text.lstrip('+-')
+        if not digits.isdigit() or len(text) - len(digits) > 1:
+            raise ValueError("Invalid number format")
+        if len(digits) > self.limits.max_digits:
+            raise ValueError(f"Operand exceeds {self.limits.max_digits} digits")
+        return int(text)
+
+    def _check(self, value, what):
+        max_bits = self.limits.max_bits
+        if value.numerator.bit_length() > max_bits or value.denominator.bit_length() > max_bits:
+            raise ValueError(f"{what} exceeds the rational size limit ({max_bits} bits)")
+        return value
+
+    def apply(self, func, *args):
+        try:
+            result = func(*args)
+        except ZeroDivisionError:
+            raise ValueError("Division by zero")
+        return self._check(result, "Result")
+
+    def serialize(self, value):
+        return str(value)
+
+
+MODES = ('float', 'decimal', 'rational')
+
+
+def numeric_mode(name: Optional[str], precision, config) -> Optional[NumericMode]:
+    """Build the mode a request asked for; None selects the float fast path."""
+    if name is None or name == 'float':
+        return None
+    limits = NumericLimits.from_config(config)
+    if name == 'decimal':
+        if precision is None:
+            precision = config.get('NUMERIC_DEFAULT_PRECISION', 28)
+        return DecimalMode(precision, limits)
+    if name == 'rational':
+        return RationalMode(limits)
+    raise ValueError(f"Unknown numeric mode: {name} (expected one of {', '.join(MODES)})")
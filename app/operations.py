@@ -0,0 +1,212 @@
+import math
+import operator
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; columns fall back to pure Python
+    np = None
+
+
+# Largest n whose factorial is a finite float64
+MAX_FACTORIAL = 170
+FACTORIALS = tuple(float(math.factorial(n)) for n in range(MAX_FACTORIAL + 1))
+
+
+class Operation:
+    """Descriptor of one calculator operation.
+
+    ``func`` computes one float result and ``vector`` (optional) whole NumPy
+    columns. ``domain`` is a sequence of ``(invalid, message)`` pairs whose
+    predicates ``invalid(a, b)`` are written with plain operators, so the
+    same predicate checks floats, exact numbers and NumPy arrays. ``fast``
+    is ``func`` pre-bound with its arity and domain checks, called as
+    ``fast(a, b=None)`` by :meth:`Calculator.calculate`.
+    """
+
+    __slots__ = ('name', 'arity', 'func', 'vector', 'domain', 'code', 'fast')
+
+    def __init__(self, name: str, arity: int, func: Callable, vector: Optional[Callable] = None,
+                 domain: Sequence[Tuple[Callable, str]] = (), code: int = 0):
+        if arity not in (1, 2):
+            raise ValueError(f"Operation {name} must take one or two operands")
+        self.name = name
+        self.arity = arity
+        self.func = func
+        self.vector = vector
+        self.domain = tuple(domain)
+        self.code = code
+        self.fast = self._bind()
+
+    def _bind(self) -> Callable:
+        # One closure per shape, so the common cases skip the domain loop
+        func = self.func
+        domain = self.domain
+        if len(domain) == 1:
+            (invalid, message), = domain
+        if self.arity == 1:
+            if not domain:
+                def fast(a, b=None):
+                    return func(a)
+            elif len(domain) == 1:
+                def fast(a, b=None):
+                    if invalid(a, b):
+                        raise ValueError(message)
+                    return func(a)
+            else:
+                def fast(a, b=None):
+                    for check, error in domain:
+                        if check(a, b):
+                            raise ValueError(error)
+                    return func(a)
+            return fast
+
+        missing = f"Operation {self.name} requires two operands"
+        if not domain:
+            def fast(a, b=None):
+                if b is None:
+                    raise ValueError(missing)
+                return func(a, b)
+        elif len(domain) == 1:
+            def fast(a, b=None):
+                if b is None:
+                    raise ValueError(missing)
+                if invalid(a, b):
+                    raise ValueError(message)
+                return func(a, b)
+        else:
+            def fast(a, b=None):
+                if b is None:
+                    raise ValueError(missing)
+                for check, error in domain:
+                    if check(a, b):
+                        raise ValueError(error)
+                return func(a, b)
+        return fast
+
+    def domain_error(self, a, b=None) -> Optional[str]:
+        """Message for the first domain check ``(a, b)`` fails, or None."""
+        for invalid, message in self.domain:
+            if invalid(a, b):
+                return message
+        return None
+
+    def check(self, a, b=None):
+        """Raise ValueError unless ``(a, b)`` are valid operands."""
+        if self.arity == 2 and b is None:
+            raise ValueError(f"Operation {self.name} requires two operands")
+        message = self.domain_error(a, b)
+        if message is not None:
+            raise ValueError(message)
+
+
+class OperationRegistry:
+    """Operations by name, with the lookup tables derived from them.
+
+    ``dispatch`` maps each name straight to its descriptor's ``fast`` path,
+    so a float calculation is a single dict lookup and call. ``functions``
+    maps the operations usable as expression functions (those named by an
+    identifier) to their arity. Codes are assigned in registration order and
+    are stable, since batch op columns refer to them; register operations at
+    import time so process-pool workers see the same table.
+    """
+
+    def __init__(self):
+        self.operations: Dict[str, Operation] = {}
+        self.dispatch: Dict[str, Callable] = {}
+        self.functions: Dict[str, int] = {}
+        self.names = []
+
+    def register(self, name: str, arity: int, func: Callable, vector: Optional[Callable] = None,
+                 domain: Sequence[Tuple[Callable, str]] = ()) -> Operation:
+        """Add (or replace) the operation ``name``."""
+        existing = self.operations.get(name)
+        code = existing.code if existing is not None else len(self.names)
+        operation = Operation(name, arity, func, vector, domain, code)
+        if existing is None:
+            self.names.append(name)
+        self.operations[name] = operation
+        self.dispatch[name] = operation.fast
+        if name.isidentifier():
+            self.functions[name] = arity
+        return operation
+
+    def get(self, name: str) -> Optional[Operation]:
+        return self.operations.get(name)
+
+    def __getitem__(self, name: str) -> Operation:
+        return self.operations[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self.operations
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.names)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+
+def _numpy(name: str) -> Optional[Callable]:
+    return getattr(np, name) if np is not None else None
+
+
+def _exp(a):
+    try:
+        return math.exp(a)
+    except OverflowError:
+        return math.inf
+
+
+def _pow(a, b):
+    try:
+        return math.pow(a, b)
+    except OverflowError:
+        if a < 0 and b % 2 == 1:
+            return -math.inf
+        return math.inf
+
+
+def _factorial(a):
+    return math.inf if a > MAX_FACTORIAL else FACTORIALS[int(a)]
+
+
+def _factorial_vector(a):
+    table = np.asarray(FACTORIALS)
+    index = np.clip(np.nan_to_num(a, nan=0.0), 0, MAX_FACTORIAL).astype(np.int64)
+    return np.where(a > MAX_FACTORIAL, np.inf, table[index])
+
+
+NEGATIVE = (lambda a, b: a < 0, "Cannot calculate square root of negative number")
+NON_POSITIVE = (lambda a, b: a <= 0, "Cannot calculate logarithm of non-positive number")
+ZERO_DIVISOR = (lambda a, b: b == 0, "Division by zero")
+
+
+def _finite_angle(name):
+    return (lambda a, b: abs(a) == math.inf), f"Cannot calculate {name} of infinity"
+
+
+operations = OperationRegistry()
+register = operations.register
+
+register('+', 2, operator.add, _numpy('add'))
+register('-', 2, operator.sub, _numpy('subtract'))
+register('*', 2, operator.mul, _numpy('multiply'))
+register('/', 2, operator.truediv, _numpy('true_divide'), [ZERO_DIVISOR])
+register('sqrt', 1, math.sqrt, _numpy('sqrt'), [NEGATIVE])
+register('sin', 1, math.sin, _numpy('sin'), [_finite_angle('sin')])
+register('cos', 1, math.cos, _numpy('cos'), [_finite_angle('cos')])
+register('tan', 1, math.tan, _numpy('tan'), [_finite_angle('tan')])
+register('log', 1, math.log10, _numpy('log10'), [NON_POSITIVE])
+register('ln', 1, math.log, _numpy('log'), [NON_POSITIVE])
+register('pow', 2, _pow, _numpy('power'), [
+    ((lambda a, b: (a == 0) & (b < 0)), "Division by zero"),
+    ((lambda a, b: (a < 0) & (b % 1 != 0)), "Cannot raise negative number to a fractional power"),
+])
+register('mod', 2, operator.mod, _numpy('mod'), [ZERO_DIVISOR])
+register('exp', 1, _exp, _numpy('exp'))
+register('atan2', 2, math.atan2, _numpy('arctan2'))
+register('hypot', 2, math.hypot, _numpy('hypot'))
+register('factorial', 1, _factorial, _factorial_vector if np is not None else None, [
+    ((lambda a, b: (a < 0) | (a % 1 != 0)), "Factorial requires a non-negative integer"),
+])
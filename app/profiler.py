@@ -0,0 +1,265 @@
+"""
+On-demand profiling of a live worker process.
+
+:meth:`Profiler.sample` is a statistical CPU profiler: for the requested
+number of seconds it reads the current frame of every thread in the process
+(``sys._current_frames``) at a fixed interval and counts each distinct
+stack. The result is in the collapsed-stack format (``thread;outer;inner
+count`` per line) that flamegraph.pl, speedscope and inferno read. The
+sampled threads run undisturbed; the cost is one stack walk per thread per
+interval, on the profiling request's own thread.
+
+:meth:`Profiler.allocations` compares two tracemalloc snapshots taken the
+requested number of seconds apart and reports the source lines (or
+tracebacks) whose live allocations grew the most, which is how unbounded
+caches and lists show up. Tracing is only switched on for the duration of
+the request unless it was already on (``PYTHONTRACEMALLOC``).
+
+One profile runs at a time per process; a second request gets
+:class:`ProfilerBusy`.
+"""
+
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Leaf frames of threads blocked waiting for work (locks, queues, sockets, sleeps)
+IDLE_FRAMES = frozenset([
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('socket.py', 'readinto'),
+    ('socketserver.py', 'serve_forever'),
+    ('queue.py', 'get'),
+    ('thread.py', '_worker'),
+    ('base_events.py', '_run_once'),
+])
+
+ALLOCATION_KEYS = ('lineno', 'traceback', 'filename')
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another one is running."""
+
+
+class Profiler:
+    """Stack sampling and allocation diffs for this process."""
+
+    def __init__(self, max_seconds=30.0):
+        self.max_seconds = max_seconds
+        self.runs = 0
+        self.samples = 0
+        self.busy = 0
+        self._lock = threading.Lock()
+        # Guards ``busy``, counted by requests that could not take ``_lock``
+        self._stats_lock = threading.Lock()
+        self._labels = {}
+
+    def configure(self, max_seconds=30.0):
+        self.max_seconds = max_seconds
+
+    def _check_seconds(self, seconds):
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"seconds must be greater than 0 and at most {self.max_seconds:g}")
+
+    def _run(self, func, *args):
+        if not self._lock.acquire(blocking=False):
+            with self._stats_lock:
+                self.busy += 1
+            raise ProfilerBusy("A profile is already running in this worker")
+        try:
+            self.runs += 1
+            return func(*args)
+        finally:
+            self._lock.release()
+
+    def sample(self, seconds, interval=0.01, idle=False):
+        """Sample every thread's stack for ``seconds``; returns the profile as a dict."""
+        self._check_seconds(seconds)
+        if not 0.001 <= interval <= 1:
+            raise ValueError("interval must be between 0.001 and 1 seconds")
+        return self._run(self._sample, seconds, interval, idle)
+
+    def _sample(self, seconds, interval, idle):
+        stacks = Counter()
+        own = threading.get_ident()
+        samples = 0
+        start = time.perf_counter()
+        deadline = start + seconds
+        next_sample = start
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if not idle and self._is_idle(frame):
+                    continue
+                stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+            samples += 1
+            next_sample += interval
+            now = time.perf_counter()
+            if next_sample >= deadline:
+                break
+            if next_sample > now:
+                time.sleep(next_sample - now)
+        self.samples += samples
+        return {
+            'pid': os.getpid(),
+            'seconds': round(time.perf_counter() - start, 3),
+            'interval': interval,
+            'samples': samples,
+            'stacks': stacks,
+        }
+
+    @staticmethod
+    def _is_idle(frame):
+        code = frame.f_code
+        return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+    def _collapse(self, thread_name, frame):
+        labels = self._labels
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+            if label is None:
+                label = labels[code] = _frame_label(code)
+            frames.append(label)
+            frame = frame.f_back
+        frames.append(thread_name.replace(';', ':'))
+        frames.reverse()
+        return ';'.join(frames)
+
+    def allocations(self, seconds, top=25, key_type='lineno', frames=1):
+        """Top ``top`` allocation growths over ``seconds``, grouped by ``key_type``."""
+        self._check_seconds(seconds)
+        if key_type not in ALLOCATION_KEYS:
+            raise ValueError(f"key must be one of: {', '.join(ALLOCATION_KEYS)}")
+        if not 1 <= top <= 1000:
+            raise ValueError("top must be between 1 and 1000")
+        if not 1 <= frames <= 64:
+            raise ValueError("frames must be between 1 and 64")
+        return self._run(self._allocations, seconds, top, key_type, frames)
+
+    def _allocations(self, seconds, top, key_type, frames):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(frames)
+        try:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+            before = tracemalloc.take_snapshot().filter_traces(ignore)
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started:
+                tracemalloc.stop()
+        differences = after.compare_to(before, key_type)[:top]
+        return {
+            'pid': os.getpid(),
+            'seconds': seconds,
+            'key': key_type,
+            'traced_bytes': current,
+            'peak_traced_bytes': peak,
+            'already_tracing': not started,
+            'top': [{
+                'location': [f'{_relative(frame.filename)}:{frame.lineno}' for frame in difference.traceback],
+                'size_diff': difference.size_diff,
+                'size': difference.size,
+                'count_diff': difference.count_diff,
+                'count': difference.count,
+            } for difference in differences],
+        }
+
+    def _after_fork(self):
+        # The profiling thread, if any, did not survive the fork
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+
+    def stats(self):
+        with self._stats_lock:
+            busy = self.busy
+        return {
+            'running': self._lock.locked(),
+            'runs': self.runs,
+            'samples': self.samples,
+            'busy': busy,
+        }
+
+
+def _relative(filename):
+    """``filename`` relative to the longest ``sys.path`` entry containing it."""
+    for path in sorted(sys.path, key=len, reverse=True):
+        if path and filename.startswith(path + os.sep):
+            return filename[len(path) + 1:]
+    return filename
+
+
+def _frame_label(code):
+    """``function (package/module.py)`` for a code object."""
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f'{name} ({_relative(code.co_filename)})'.replace(';', ':')
+
+
+def collapsed(profile):
+    """Render a :meth:`Profiler.sample` result as collapsed stacks, most frequent first."""
+    return ''.join(f'{stack} {count}\n' for stack, count in profile['stacks'].most_common())
+
+
+profiler = Profiler()
+os.register_at_fork(after_in_child=profiler._after_fork)
+
+NOT_FOUND = {'error': 'Not found'}
+UNAUTHORIZED = {'error': 'Unauthorized'}
+COLLAPSED_MIMETYPE = 'text/plain; charset=utf-8'
+
+
+def authorized(admin_token, authorization):
+    """Whether an ``Authorization`` header carries ``Bearer <admin_token>``."""
+    scheme, _, credentials = (authorization or '').partition(' ')
+    return scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), admin_token.encode())
+
+
+def _number(args, name, default, convert=float):
+    value = args.get(name)
+    if value is None:
+        return default
+    try:
+        return convert(value)
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {value}")
+
+
+def render_profile(kind, args, authorization, admin_token):
+    """Build a /debug/profile or /debug/allocations response for both apps.
+
+    Returns ``(body, status, mimetype)``: collapsed stacks as text with
+    their mimetype, or a JSON-serializable dict and None. Without an
+    ``admin_token`` configured the endpoints do not exist.
+    """
+    if not admin_token:
+        return NOT_FOUND, 404, None
+    if not authorized(admin_token, authorization):
+        return UNAUTHORIZED, 401, None
+    try:
+        if kind == 'profile':
+            output = args.get('format', 'collapsed')
+            if output not in ('collapsed', 'json'):
+                raise ValueError("format must be collapsed or json")
+            result = profiler.sample(_number(args, 'seconds', 5.0), _number(args, 'interval', 0.01),
+                                     args.get('idle', 'false').lower() == 'true')
+            if output == 'collapsed':
+                return collapsed(result), 200, COLLAPSED_MIMETYPE
+            result['stacks'] = dict(result['stacks'].most_common())
+            return result, 200, None
+        return profiler.allocations(_number(args, 'seconds', 5.0), _number(args, 'top', 25, int),
+                                    args.get('key', 'lineno'), _number(args, 'frames', 1, int)), 200, None
+    except ProfilerBusy as e:
+        return {'error': str(e)}, 409, None
+    except ValueError as e:
+        return {'error': str(e)}, 400, None
@@ -0,0 +1,219 @@
+import fcntl
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional, Tuple
+
+from werkzeug.wsgi import ClosingIterator
+
+
+class BucketTable:
+    """Fixed-size, 4-way set-associative table of token buckets.
+
+    With a ``path`` the table lives in an mmap file that every gunicorn
+    worker maps, so a client's budget is shared by the whole pod; without
+    one it is an anonymous private map, so even a table built before a
+    ``--preload`` fork is copied on write and stays per worker. Each update
+    is a short read-modify-write of one set under a process-local lock
+    plus, for the shared file, an ``fcntl`` lock on that set's byte range.
+    A client whose set is full evicts the least recently updated bucket,
+    which at worst hands that client a fresh burst.
+    """
+
+    SLOT = struct.Struct('=16sdd')  # key digest, tokens, updated
+    WAYS = 4
+
+    def __init__(self, path: Optional[str] = None, slots: int = 4096):
+        self.path = path
+        self.sets = max(1, slots // self.WAYS)
+        self.set_size = self.WAYS * self.SLOT.size
+        size = self.sets * self.set_size
+        self._fd = None
+        if path:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self._fd).st_size != size:
+                os.ftruncate(self._fd, size)
+            self._map = mmap.mmap(self._fd, size)
+        else:
+            self._map = mmap.mmap(-1, size, flags=mmap.MAP_PRIVATE)
+        self._lock = threading.Lock()
+
+    def take(self, client: str, rate: float, burst: float, now: float) -> float:
+        """Take one token from ``client``'s bucket.
+
+        Returns 0 when a token was available, otherwise the seconds until
+        the next one is.
+        """
+        key = hashlib.blake2b(client.encode('utf-8', 'replace'), digest_size=16).digest()
+        offset = (int.from_bytes(key[:8], 'little') % self.sets) * self.set_size
+        slot = self.SLOT
+        with self._lock:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, self.set_size, offset)
+            try:
+                target = None
+                oldest = None
+                for way in range(self.WAYS):
+                    start = offset + way * slot.size
+                    stored_key, tokens, updated = slot.unpack_from(self._map, start)
+                    if stored_key == key:
+                        target = start
+                        tokens = min(burst, tokens + max(0.0, now - updated) * rate)
+                        break
+                    if oldest is None or updated < oldest[0]:
+                        oldest = (updated, start)
+                if target is None:
+                    target = oldest[1]
+                    tokens = burst
+
+                if tokens >= 1:
+                    slot.pack_into(self._map, target, key, tokens - 1, now)
+                    return 0.0
+                slot.pack_into(self._map, target, key, tokens, now)
+                return (1 - tokens) / rate
+            finally:
+                if self._fd is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, self.set_size, offset)
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+
+
+class RateLimiter:
+    """Per-client token buckets plus an in-flight concurrency limit.
+
+    ``acquire`` is called before a request is parsed. It sheds the request
+    with 503 when this worker already has ``max_in_flight`` requests in
+    progress, and rejects it with 429 when the client's bucket (``rate``
+    tokens per second, up to ``burst``) is empty. An admitted request must
+    be paired with ``release``.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.rate = 50.0
+        self.burst = 100.0
+        self.max_in_flight = 0
+        self.table = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.admitted = 0
+        self.limited = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=False, rate=50.0, burst=100.0, max_in_flight=0, shared_path=None, slots=4096):
+        self.enabled = enabled
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.max_in_flight = max_in_flight
+        self.table = BucketTable(shared_path, slots) if enabled else None
+
+    def acquire(self, client: str) -> Optional[Tuple[int, int]]:
+        """Admit one request; returns None or ``(status, retry_after_seconds)``."""
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return 503, 1
+            self.in_flight += 1
+        wait = self.table.take(client, self.rate, self.burst, time.time())
+        with self._lock:
+            if wait:
+                self.in_flight -= 1
+                self.limited += 1
+                return 429, max(1, math.ceil(wait))
+            self.admitted += 1
+            if self.in_flight > self.peak_in_flight:
+                self.peak_in_flight = self.in_flight
+        return None
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def after_fork(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        if self.table is not None:
+            self.table.after_fork()
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'admitted': self.admitted,
+            'limited': self.limited,
+            'shed': self.shed,
+        }
+
+
+REJECTIONS = {
+    429: ('429 Too Many Requests', json.dumps({'error': 'Rate limit exceeded'}).encode()),
+    503: ('503 Service Unavailable', json.dumps({'error': 'Server over capacity'}).encode()),
+}
+
+
+def is_limited_path(path: str) -> bool:
+    """Only API calls are limited; probes, metrics and assets never are."""
+    return path.startswith('/api/')
+
+
+class RateLimitMiddleware:
+    """WSGI middleware applying the :class:`RateLimiter` before Flask runs.
+
+    Rejected requests are answered here, so their bodies are never read or
+    parsed. Admitted requests are released when the server closes the
+    response iterable, which for streamed responses is after the last chunk.
+    """
+
+    def __init__(self, wsgi_app, limiter, client_header=''):
+        self.wsgi_app = wsgi_app
+        self.limiter = limiter
+        self.client_key = 'HTTP_' + client_header.upper().replace('-', '_') if client_header else None
+
+    def __call__(self, environ, start_response):
+        if not is_limited_path(environ.get('PATH_INFO', '')):
+            return self.wsgi_app(environ, start_response)
+
+        client = (self.client_key and environ.get(self.client_key)) or environ.get('REMOTE_ADDR') or 'unknown'
+        rejection = self.limiter.acquire(client)
+        if rejection is not None:
+            status, retry_after = rejection
+            status_line, body = REJECTIONS[status]
+            environ['calculator.endpoint'] = 'rate_limit'
+            start_response(status_line, [
+                ('Content-Type', 'application/json'),
+                ('Content-Length', str(len(body))),
+                ('Retry-After', str(retry_after)),
+            ])
+            return [body]
+
+        try:
+            return ClosingIterator(self.wsgi_app(environ, start_response), self.limiter.release)
+        except BaseException:
+            self.limiter.release()
+            raise
+
+
+rate_limiter = RateLimiter()
+os.register_at_fork(after_in_child=rate_limiter.after_fork)
+
+
+def setup_rate_limit(app):
+    """Configure the global limiter and wrap the WSGI app with it"""
+    rate_limiter.configure(
+        enabled=app.config['RATE_LIMIT_ENABLED'],
+        rate=app.config['RATE_LIMIT_RATE'],
+        burst=app.config['RATE_LIMIT_BURST'],
+        max_in_flight=app.config['RATE_LIMIT_MAX_IN_FLIGHT'],
+        shared_path=app.config['RATE_LIMIT_SHARED_PATH'],
+        slots=app.config['RATE_LIMIT_SLOTS'],
+    )
+    if rate_limiter.enabled:
+        app.wsgi_app = RateLimitMiddleware(app.wsgi_app, rate_limiter, app.config['RATE_LIMIT_CLIENT_HEADER'])
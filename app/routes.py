@@ -1,91 +1,103 @@
-from flask import Blueprint, render_template, jsonify, request, current_app
-from app.calculator import Calculator
-import structlog
+from flask import Blueprint, Response, jsonify, request, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import get_input_stream
+from app import api
+from app.assets import asset_response, assets
+from app.limits import admission
+from app.logging_config import RouteLogger
+from app.startup import startup
+from app.tracing import stage
 
 main = Blueprint('main', __name__)
-logger = structlog.get_logger()
+index_log = RouteLogger('index')
 
 
 @main.route('/')
 def index():
-    logger.info("Serving calculator homepage")
-    return render_template('calculator.html')
+    index_log.begin().info("Serving calculator homepage")
+    return asset_response(assets.index)
 
 
 @main.route('/health')
 def health():
-    return jsonify({
-        'status': 'healthy',
-        'service': 'flask-calculator',
-        'version': '1.0.0'
-    })
+    return current_app.json.constant_response(api.HEALTH)
+
+
+@main.route('/livez')
+def livez():
+    return current_app.json.constant_response(api.LIVE)
+
+
+@main.route('/readyz')
+def readyz():
+    if startup.ready:
+        return current_app.json.constant_response(api.READY)
+    return current_app.json.constant_response(api.NOT_READY), 503
+
+
+def handle_json(handler):
+    """Run an :mod:`app.api` handler on the JSON body, timing each stage."""
+    with stage('parse'):
+        data = request.get_json(force=True, silent=True)
+    with stage('validate'):
+        payload, status = handler(data, current_app.config)
+    with stage('serialize'):
+        response = jsonify(payload)
+    return response, status
 
 
 @main.route('/api/calculate', methods=['POST'])
 def calculate():
+    return handle_json(api.calculate)
+
+
+@main.route('/api/calculate/batch', methods=['POST'])
+def calculate_batch():
+    return handle_json(api.calculate_batch)
+
+
+@main.route('/api/calculate/stream', methods=['POST'])
+def calculate_stream():
+    calculation = api.CalculationStream(current_app.config, current_app.json.loads, current_app.json.encode)
+    # The generator outlives the request context, so hand it the raw stream;
+    # its memory is bounded per line, so MAX_CONTENT_LENGTH does not apply
+    stream = get_input_stream(request.environ, max_content_length=None)
+    return Response(calculation.run(stream.read), mimetype='application/x-ndjson')
+
+
+@main.route('/api/aggregate', methods=['POST'])
+def aggregate():
+    if request.mimetype != 'application/octet-stream':
+        return handle_json(api.aggregate)
+    # Packed float64 bodies have their own, larger size limit
+    limit = current_app.config['AGGREGATE_MAX_CONTENT_LENGTH']
     try:
-        data = request.get_json(force=True, silent=True)
-        
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-        
-        operation = data.get('operation')
-        a = data.get('a')
-        b = data.get('b')
-        
-        if operation is None or a is None:
-            return jsonify({'error': 'Missing required parameters'}), 400
-        
-        try:
-            a = float(a)
-            b = float(b) if b is not None else None
-        except (TypeError, ValueError):
-            return jsonify({'error': 'Invalid number format'}), 400
-        
-        logger.info("Calculating", operation=operation, a=a, b=b)
-        
-        result = Calculator.calculate(operation, a, b)
-        
-        logger.info("Calculation successful", result=result)
-        
-        return jsonify({
-            'result': result,
-            'operation': operation,
-            'a': a,
-            'b': b
-        })
-        
-    except ValueError as e:
-        logger.warning("Calculation error", error=str(e))
-        return jsonify({'error': str(e)}), 400
-    except Exception as e:
-        logger.error("Unexpected error", error=str(e), exc_info=True)
-        return jsonify({'error': 'Internal server error'}), 500
+        with stage('parse'):
+            stream = get_input_stream(request.environ, max_content_length=limit)
+            body = stream.read()
+            if request.content_length is None and len(body) == limit:
+                # A chunked body is cut off at the limit; reading on raises if it was longer
+                stream.read(1)
+    except RequestEntityTooLarge:
+        admission.record('body_too_large')
+        return jsonify(api.body_too_large(current_app.config, 'AGGREGATE_MAX_CONTENT_LENGTH')), 413
+    with stage('validate'):
+        payload, status = api.aggregate_binary(body, request.args, current_app.config)
+    with stage('serialize'):
+        return jsonify(payload), status
 
 
 @main.route('/api/evaluate', methods=['POST'])
 def evaluate():
-    try:
-        data = request.get_json(force=True, silent=True)
-        
-        if not data or 'expression' not in data:
-            return jsonify({'error': 'No expression provided'}), 400
-        
-        expression = data['expression']
-        logger.info("Evaluating expression", expression=expression)
-        
-        result = Calculator.evaluate_expression(expression)
-        
-        logger.info("Evaluation successful", result=result)
-        
-        return jsonify({
-            'result': result,
-            'expression': expression
-        })
-        
-    except ValueError as e:
-        logger.warning("Evaluation error", error=str(e))
-        return jsonify({'error': str(e)}), 400
-    except Exception as e:
-        logger.error("Unexpected error", error=str(e), exc_info=True)
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+    return handle_json(api.evaluate)
+
+
+@main.route('/api/evaluate/compile', methods=['POST'])
+def compile_expression():
+    return handle_json(api.compile_expression)
+
+
+@main.app_errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    admission.record('body_too_large')
+    return jsonify(api.body_too_large(current_app.config)), 413
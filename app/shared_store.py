@@ -0,0 +1,73 @@
+import mmap
+import os
+import struct
+from typing import Optional
+
+
+class SnapshotFile:
+    """mmap-backed file holding one variable-size blob, written by one process.
+
+    Readers in other processes see either the previous or the new payload,
+    never a torn one: the writer bumps a generation counter to an odd value
+    before copying and to an even value afterwards (a seqlock), and readers
+    retry when the generation is odd or changes underneath them.
+    """
+
+    HEADER = struct.Struct('=QQ')  # generation, payload length
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self.generation = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        self._size = self.INITIAL_SIZE
+        os.ftruncate(self._fd, self._size)
+        self._map = mmap.mmap(self._fd, self._size)
+
+    def write(self, payload: bytes):
+        needed = self.HEADER.size + len(payload)
+        if needed > self._size:
+            self._grow(needed)
+
+        self.generation += 1
+        self.HEADER.pack_into(self._map, 0, self.generation, 0)
+        self._map[self.HEADER.size:needed] = payload
+        self.generation += 1
+        self.HEADER.pack_into(self._map, 0, self.generation, len(payload))
+
+    def _grow(self, needed: int):
+        size = self._size
+        while size < needed:
+            size *= 2
+        self._map.close()
+        os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(self._fd, size)
+        self._size = size
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+    @classmethod
+    def read(cls, path: str, attempts: int = 5) -> Optional[bytes]:
+        """Return the current payload at ``path``, or None if unavailable."""
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+
+        try:
+            for _ in range(attempts):
+                size = os.fstat(fd).st_size
+                if size < cls.HEADER.size:
+                    return None
+                with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as view:
+                    generation, length = cls.HEADER.unpack_from(view, 0)
+                    if generation % 2 or cls.HEADER.size + length > size:
+                        continue
+                    payload = view[cls.HEADER.size:cls.HEADER.size + length]
+                    if cls.HEADER.unpack_from(view, 0)[0] == generation:
+                        return payload
+            return None
+        finally:
+            os.close(fd)
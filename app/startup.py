@@ -0,0 +1,130 @@
+"""
+Start-up phases, warm-up and readiness.
+
+``create_app`` times each of its phases here; the time from the first import
+of the ``app`` package to ``create_app`` is recorded as ``import``. A process
+is live as soon as it can answer ``/livez``, and ready for traffic
+(``/readyz`` returns 200) once start-up, including the optional warm-up, has
+finished. The warm-up runs each request path once, so one-off costs (first
+NumPy ufunc calls, expression compilation, encoder set-up) are paid before
+the first request rather than by it. Under ``gunicorn --preload`` it runs in
+the master and every forked worker inherits the warmed state.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+WARMUP_MODES = ('off', 'sync', 'background')
+
+
+class Startup:
+    """Phase timings and the readiness flag of this process."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.budget_ms: Optional[float] = None
+        self.ready_after_ms: Optional[float] = None
+        self.warmup_mode = 'off'
+        self._ready = threading.Event()
+        self._app = None
+        self._begun = self.started
+
+    def begin(self, budget_ms: Optional[float] = None):
+        """Start timing a ``create_app`` call; readiness is reset."""
+        self._ready.clear()
+        self.ready_after_ms = None
+        self.budget_ms = budget_ms or None
+        if 'import' not in self.phases:
+            self.phases['import'] = self._elapsed_ms(self.started)
+        self.phases = {'import': self.phases['import']}
+        self._begun = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self._elapsed_ms(start)
+
+    def finish(self, app, warmup: str = 'off'):
+        """End of ``create_app``: warm up as configured, then become ready."""
+        if warmup not in WARMUP_MODES:
+            raise ValueError(f"Unknown warm-up mode: {warmup}")
+        self.phases['create_app'] = self._elapsed_ms(self._begun)
+        self.warmup_mode = warmup
+        self._app = app
+        if warmup == 'sync':
+            self._warm()
+        elif warmup == 'background':
+            self._start_warmup()
+        else:
+            self.mark_ready()
+
+    def mark_ready(self):
+        self.ready_after_ms = self._elapsed_ms(self.started)
+        self._ready.set()
+        if self.budget_ms is not None and self.ready_after_ms > self.budget_ms and self._app is not None:
+            self._app.logger.warning("Start-up over budget", ready_after_ms=self.ready_after_ms,
+                                     budget_ms=self.budget_ms, phases_ms=self.phases)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _warm(self):
+        with self.phase('warmup'):
+            warm_up(self._app)
+        self.mark_ready()
+
+    def _start_warmup(self):
+        threading.Thread(target=self._warm, name='startup-warmup', daemon=True).start()
+
+    def _after_fork(self):
+        # Locks and threads do not survive fork: give the child a fresh flag
+        # and restart a background warm-up that had not finished
+        ready = self._ready.is_set()
+        self._ready = threading.Event()
+        if ready:
+            self._ready.set()
+        elif self.warmup_mode == 'background' and self._app is not None:
+            self._start_warmup()
+
+    def stats(self) -> Dict[str, object]:
+        over = self.budget_ms is not None and self.ready_after_ms is not None \
+            and self.ready_after_ms > self.budget_ms
+        return {
+            'ready': self.ready,
+            'ready_after_ms': self.ready_after_ms,
+            'phases_ms': dict(self.phases),
+            'warmup': self.warmup_mode,
+            'budget_ms': self.budget_ms,
+            'over_budget': over,
+        }
+
+    @staticmethod
+    def _elapsed_ms(start: float) -> float:
+        return round((time.perf_counter() - start) * 1000, 3)
+
+
+def warm_up(app):
+    """Run every calculation path and the JSON encoder once, without logging or metrics."""
+    from app.calculator import Calculator
+    from app.operations import operations
+
+    names = list(operations)
+    for name in names:
+        Calculator.calculate(name, 2.0, 1.0)
+    Calculator.calculate_batch(names, [2.0] * len(names), [1.0] * len(names))
+    Calculator.evaluate_expression('sqrt(x * x + 1) / (1 + ln(x))', {'x': 2.0})
+    Calculator.aggregate([1.0, 2.0, 3.0], quantiles=(0.5,),
+                         operations=('sum', 'mean', 'variance', 'quantiles', 'cumsum'))
+    app.json.loads(app.json.encode({'results': [1.0, None], 'count': 2}))
+
+
+startup = Startup()
+os.register_at_fork(after_in_child=startup._after_fork)
@@ -0,0 +1,482 @@
+"""
+Request tracing: W3C trace context, per-stage timings and span export.
+
+Every request gets a :class:`Trace` that continues the caller's trace from
+its ``traceparent`` header (or starts a new one) and is the current trace
+for the code handling the request. Code marks the stages of a request with
+``with stage('parse'):`` or the ``@traced('calculate')`` decorator; stages
+nest, and each records its duration and its self time (excluding nested
+stages). Outside a request both are a single context variable lookup.
+
+Sampling is decided once, at the head of the trace: a caller's sampled flag
+is honoured, otherwise a new trace is sampled when its trace ID falls under
+``sample_rate``. Sampled traces are exported as OTLP/JSON spans (one server
+span per request, one internal span per stage) to a file or an OTLP/HTTP
+collector from a background thread. Stage timings of every request,
+sampled or not, are aggregated into /metrics (see
+:meth:`app.metrics.MetricsCollector.record_stages`).
+"""
+
+import atexit
+import functools
+import json
+import os
+import queue
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+EXPORTERS = ('none', 'file', 'otlp')
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+_TRACEPARENT = re.compile(r'([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?$')
+_INVALID_TRACE_ID = '0' * 32
+_INVALID_SPAN_ID = '0' * 16
+
+current_trace = ContextVar('current_trace', default=None)
+
+
+def parse_traceparent(value):
+    """Return ``(trace_id, parent_id, sampled)`` from a ``traceparent`` header, or None if invalid."""
+    match = _TRACEPARENT.match(value.strip())
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    # Version 00 has exactly four fields; later versions may append more
+    if version == 'ff' or (version == '00' and rest):
+        return None
+    if trace_id == _INVALID_TRACE_ID or parent_id == _INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 1)
+
+
+def format_traceparent(trace_id, span_id, sampled):
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def _span_id():
+    return '%016x' % (random.getrandbits(64) or 1)
+
+
+class Trace:
+    """The trace of one request: its IDs, sampling decision and stages.
+
+    IDs that are not given are generated on first use, so a request whose
+    trace is neither sampled nor logged never pays for them. ``stages``
+    holds ``(name, id, parent_id, start_ns, duration_ns, self_ns, failed)``
+    tuples in the order the stages finished; ``parent_id`` 0 is the request
+    itself.
+    """
+
+    __slots__ = ('_trace_id', '_span_id', 'parent_id', 'sampled', 'tracestate', 'start_time_ns', 'start_ns',
+                 'stages', 'current', 'next_id')
+
+    def __init__(self, trace_id=None, parent_id=None, sampled=False, tracestate=None):
+        self._trace_id = trace_id
+        self._span_id = None
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.tracestate = tracestate
+        self.stages = []
+        self.current = None
+        self.next_id = 1
+        self.start_time_ns = time.time_ns()
+        self.start_ns = time.perf_counter_ns()
+
+    @property
+    def trace_id(self):
+        if self._trace_id is None:
+            self._trace_id = '%032x' % (random.getrandbits(128) or 1)
+        return self._trace_id
+
+    @property
+    def span_id(self):
+        if self._span_id is None:
+            self._span_id = _span_id()
+        return self._span_id
+
+    @property
+    def traceparent(self):
+        """``traceparent`` header value for calls made on behalf of this request."""
+        return format_traceparent(self.trace_id, self.span_id, self.sampled)
+
+    def breakdown(self, total_ns):
+        """Per-stage self time in ns, summed by name, plus ``other`` for the untraced rest."""
+        times = {}
+        for name, _, _, _, _, self_ns, _ in self.stages:
+            times[name] = times.get(name, 0) + self_ns
+        times['other'] = max(total_ns - sum(times.values()), 0)
+        return times
+
+    def to_spans(self, name, duration_ns, attributes, error=False):
+        """OTLP/JSON spans for the request and each finished stage."""
+        root = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': name,
+            'kind': SPAN_KIND_SERVER,
+            'startTimeUnixNano': str(self.start_time_ns),
+            'endTimeUnixNano': str(self.start_time_ns + duration_ns),
+            'attributes': _attributes(attributes),
+            'status': {'code': STATUS_ERROR} if error else {},
+        }
+        if self.parent_id:
+            root['parentSpanId'] = self.parent_id
+        if self.tracestate:
+            root['traceState'] = self.tracestate
+        span_ids = {0: self.span_id}
+        for record in self.stages:
+            span_ids[record[1]] = _span_id()
+        spans = [root]
+        for stage_name, stage_id, parent, start_ns, stage_ns, self_ns, failed in self.stages:
+            start = self.start_time_ns + start_ns - self.start_ns
+            spans.append({
+                'traceId': self.trace_id,
+                'spanId': span_ids[stage_id],
+                'parentSpanId': span_ids.get(parent, self.span_id),
+                'name': stage_name,
+                'kind': SPAN_KIND_INTERNAL,
+                'startTimeUnixNano': str(start),
+                'endTimeUnixNano': str(start + stage_ns),
+                'attributes': _attributes({'calculator.self_ns': self_ns}),
+                'status': {'code': STATUS_ERROR} if failed else {},
+            })
+        return spans
+
+
+def _attributes(values):
+    attributes = []
+    for key, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            encoded = {'boolValue': value}
+        elif isinstance(value, int):
+            encoded = {'intValue': str(value)}
+        elif isinstance(value, float):
+            encoded = {'doubleValue': value}
+        else:
+            encoded = {'stringValue': str(value)}
+        attributes.append({'key': key, 'value': encoded})
+    return attributes
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'id', 'parent', 'start', 'child_ns')
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        trace = self.trace
+        self.id = trace.next_id
+        trace.next_id += 1
+        self.parent = trace.current
+        trace.current = self
+        self.child_ns = 0
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter_ns() - self.start
+        parent = self.parent
+        self.trace.current = parent
+        if parent is not None:
+            parent.child_ns += duration
+        self.trace.stages.append((self.name, self.id, parent.id if parent is not None else 0, self.start,
+                                  duration, duration - self.child_ns, exc_type is not None))
+        return False
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name):
+    """Context manager timing one stage of the current request (a no-op outside one)."""
+    trace = current_trace.get()
+    if trace is None:
+        return _NO_STAGE
+    return _Stage(trace, name)
+
+
+def traced(name):
+    """Decorator timing every call of the function as stage ``name``."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _Stage(trace, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class SpanExporter:
+    """Batches finished spans and sends them from a background thread.
+
+    ``send`` receives one OTLP/JSON ``ExportTraceServiceRequest`` body per
+    batch. ``export`` never blocks: when the queue is full the spans are
+    dropped and counted.
+    """
+
+    def __init__(self, send, resource, queue_size=2048, batch_size=512, interval=1.0):
+        self.send = send
+        self.resource = resource
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self._start()
+
+    def _start(self):
+        # Guards the counters, updated by request threads, the exporter and flush()
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def after_fork(self):
+        if not self._stop.is_set():
+            self._start()
+
+    def export(self, spans):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += len(spans)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
+
+    def flush(self):
+        """Send everything queued so far from the calling thread."""
+        while True:
+            spans = []
+            try:
+                while len(spans) < self.batch_size:
+                    spans.extend(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not spans:
+                return
+            body = {
+                'resourceSpans': [{
+                    'resource': {'attributes': _attributes(self.resource)},
+                    'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+                }]
+            }
+            try:
+                self.send(json.dumps(body, separators=(',', ':')).encode())
+            except Exception:
+                with self._stats_lock:
+                    self.failed += len(spans)
+            else:
+                with self._stats_lock:
+                    self.exported += len(spans)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.interval * 2)
+        self.flush()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queued': self._queue.qsize(),
+                'exported': self.exported,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
+
+
+def file_sender(path):
+    """Append each batch as one line, like the OTel collector's file exporter."""
+    lock = threading.Lock()
+
+    def send(body):
+        with lock, open(path, 'ab') as f:
+            f.write(body + b'\n')
+    return send
+
+
+def otlp_sender(endpoint, timeout=5.0):
+    """POST each batch to an OTLP/HTTP collector (``/v1/traces``) as JSON."""
+    import urllib.request
+
+    def send(body):
+        request = urllib.request.Request(endpoint, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    return send
+
+
+class Tracer:
+    """Starts and finishes request traces and exports the sampled ones."""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.exporter = None
+        self.started = 0
+        self.sampled = 0
+        self._threshold = 0
+        self._lock = threading.Lock()
+
+    def configure(self, enabled=True, sample_rate=0.0, exporter=None):
+        self.enabled = enabled
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        # Trace-ID ratio sampling: the same trace ID gets the same decision everywhere
+        self._threshold = int(self.sample_rate * (1 << 64))
+        if self.exporter is not None and self.exporter is not exporter:
+            self.exporter.close()
+        self.exporter = exporter
+
+    def start(self, traceparent=None, tracestate=None):
+        """Begin a request's trace and make it current; returns ``(trace, token)``."""
+        parent = parse_traceparent(traceparent) if traceparent else None
+        if parent is None:
+            if self._threshold:
+                trace_id = random.getrandbits(128) or 1
+                trace = Trace('%032x' % trace_id, sampled=(trace_id & 0xFFFFFFFFFFFFFFFF) < self._threshold)
+            else:
+                trace = Trace()
+        else:
+            trace_id, parent_id, sampled = parent
+            trace = Trace(trace_id, parent_id, sampled, tracestate)
+        with self._lock:
+            self.started += 1
+        return trace, current_trace.set(trace)
+
+    def finish(self, trace, token):
+        """End the request's trace; returns its duration in ns."""
+        current_trace.reset(token)
+        return time.perf_counter_ns() - trace.start_ns
+
+    def export(self, trace, duration_ns, name, attributes, error=False):
+        """Queue a finished, sampled trace for export."""
+        with self._lock:
+            self.sampled += 1
+        if self.exporter is not None:
+            self.exporter.export(trace.to_spans(name, duration_ns, attributes, error))
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if self.exporter is not None:
+            self.exporter.after_fork()
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'sample_rate': self.sample_rate,
+                'started': self.started,
+                'sampled': self.sampled,
+            }
+        if self.exporter is not None:
+            stats.update(self.exporter.stats())
+        return stats
+
+
+class TracingMiddleware:
+    """WSGI middleware giving every request a trace.
+
+    The trace is also put in the environ as ``calculator.trace``, where
+    :class:`app.metrics.RequestInstrumentation` reads its stage timings.
+    """
+
+    def __init__(self, wsgi_app, tracer):
+        self.wsgi_app = wsgi_app
+        self.tracer = tracer
+
+    def __call__(self, environ, start_response):
+        trace, token = self.tracer.start(environ.get('HTTP_TRACEPARENT'), environ.get('HTTP_TRACESTATE'))
+        environ['calculator.trace'] = trace
+        if not trace.sampled:
+            try:
+                return self.wsgi_app(environ, start_response)
+            finally:
+                self.tracer.finish(trace, token)
+
+        status_line = None
+
+        def capture_status(status, headers, exc_info=None):
+            nonlocal status_line
+            status_line = status
+            return start_response(status, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, capture_status)
+        finally:
+            duration_ns = self.tracer.finish(trace, token)
+            status = int(status_line[:3]) if status_line else 500
+            method = environ['REQUEST_METHOD']
+            path = environ.get('PATH_INFO', '')
+            endpoint = environ.get('calculator.endpoint')
+            self.tracer.export(trace, duration_ns, f"{method} {endpoint or path}",
+                               request_attributes(method, path, endpoint, status), status >= 500)
+
+
+def request_attributes(method, path, endpoint, status):
+    """Server span attributes (OpenTelemetry HTTP semantic conventions)."""
+    return {
+        'http.request.method': method,
+        'url.path': path,
+        'http.route': endpoint,
+        'http.response.status_code': status,
+    }
+
+
+tracer = Tracer()
+os.register_at_fork(after_in_child=tracer._after_fork)
+atexit.register(tracer.shutdown)
+
+
+def setup_tracing(app):
+    """Configure the global tracer from the app config and trace every request."""
+    exporter_name = app.config.get('TRACE_EXPORTER', 'none')
+    if exporter_name not in EXPORTERS:
+        raise ValueError(f"Unknown trace exporter: {exporter_name}")
+    exporter = None
+    if exporter_name != 'none':
+        if exporter_name == 'file':
+            send = file_sender(app.config.get('TRACE_EXPORT_PATH', 'traces.jsonl'))
+        else:
+            send = otlp_sender(app.config.get('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'))
+        exporter = SpanExporter(
+            send,
+            {'service.name': app.config.get('TRACE_SERVICE_NAME', 'flask-calculator')},
+            queue_size=app.config.get('TRACE_EXPORT_QUEUE_SIZE', 2048),
+            interval=app.config.get('TRACE_EXPORT_INTERVAL', 1.0),
+        )
+    enabled = app.config.get('TRACING_ENABLED', True)
+    tracer.configure(enabled, app.config.get('TRACE_SAMPLE_RATE', 0.0), exporter)
+    if enabled:
+        app.wsgi_app = TracingMiddleware(app.wsgi_app, tracer)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: gunicorn sync workers (the Dockerfile config) vs the ASGI app.
+
+Starts both servers locally with the same number of worker processes,
+the WSGI one exactly as the Dockerfile runs it (``--workers 4 --threads 2``)
+and the ASGI one under uvicorn workers, then drives POST /api/calculate
+with benchmarks/loadgen.py in two scenarios: fast clients only, and fast
+clients plus slow clients that trickle their requests in. Prints a table,
+or JSON with --json.
+
+Usage: python benchmarks/bench_asgi_vs_wsgi.py [--duration 10] [--concurrency 32] [--slow-clients 8]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import run_load, start_server, stop_server  # noqa: E402
+
+BODY = '{"operation": "*", "a": 6, "b": 7}'
+
+
+def server_commands(workers, threads):
+    common = ['--workers', str(workers), '--timeout', '60', '--error-logfile', '-']
+    return {
+        'wsgi (gunicorn sync)': ['gunicorn', '--threads', str(threads)] + common + ['run:app'],
+        'asgi (uvicorn workers)': ['gunicorn', '-k', 'uvicorn.workers.UvicornWorker'] + common + ['run_asgi:app'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--slow-clients', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for name, command in server_commands(args.workers, args.threads).items():
+        process = start_server(command + ['--bind', f'127.0.0.1:{args.port}'], args.port)
+        try:
+            url = f'http://127.0.0.1:{args.port}/api/calculate'
+            for slow_clients in (0, args.slow_clients):
+                summary = asyncio.run(run_load(url, BODY, args.concurrency, args.duration, slow_clients))
+                summary['server'] = name
+                results.append(summary)
+        finally:
+            stop_server(process)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'server':<24} {'slow':>5} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for r in results:
+        latency = r['latency_ms']
+        print(f"{r['server']:<24} {r['slow_clients']:>5} {r['requests_per_second']:>10.1f} "
+              f"{latency['p50'] or 0:>9.2f} {latency['p99'] or 0:>9.2f} {latency['max'] or 0:>9.2f} "
+              f"{r['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch and expression throughput per executor mode.
+
+Runs Calculator.calculate_batch and Calculator.evaluate_bindings over
+synthetic inputs of several sizes with the inline, thread and process
+executors (pools are warmed up first) and prints the best wall time of
+--repeat runs. Results are checked to be identical across modes.
+
+Usage: python benchmarks/bench_executor.py [--sizes 10000,100000,1000000] [--workers 4]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.calculator import Calculator  # noqa: E402
+from app.executor import executor  # noqa: E402
+
+EXPRESSION = 'sqrt(x * x + y * y) / (ln(x + 10) + 1) - sin(y) * cos(x)'
+
+
+def best_time(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=25000)
+    parser.add_argument('--threshold', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    operations = ['+', '-', '*', '/', 'sqrt', 'sin', 'ln']
+    print(f"{'workload':<12} {'rows':>10} {'mode':>8} {'seconds':>9} {'rows/s':>12}")
+
+    for size in (int(value) for value in args.sizes.split(',')):
+        ops = [operations[i % len(operations)] for i in range(size)]
+        a_values = [rng.uniform(-100, 100) for _ in range(size)]
+        b_values = [rng.uniform(-100, 100) for _ in range(size)]
+        bindings = {'x': [rng.uniform(0, 100) for _ in range(size)],
+                    'y': [rng.uniform(-100, 100) for _ in range(size)]}
+        workloads = {
+            'batch': lambda: Calculator.calculate_batch(ops, a_values, b_values),
+            'expression': lambda: Calculator.evaluate_bindings(EXPRESSION, bindings),
+        }
+
+        for name, workload in workloads.items():
+            reference = None
+            for mode in ('inline', 'thread', 'process'):
+                executor.configure(mode=mode, workers=args.workers, threshold=args.threshold,
+                                   chunk_size=args.chunk_size)
+                workload()  # warm up the pool
+                seconds, result = best_time(workload, args.repeat)
+                if reference is None:
+                    reference = result
+                elif result[1] != reference[1]:
+                    raise SystemExit(f'{mode} errors differ from inline for {name}')
+                print(f"{name:<12} {size:>10,} {mode:>8} {seconds:>9.3f} {size / seconds:>12,.0f}")
+    executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
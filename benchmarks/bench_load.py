@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: a repeatable request mix against a locally started server.
+
+Starts the app (the Flask dev server, gunicorn as in the Dockerfile, or the
+ASGI app under uvicorn) on a spare port, or targets --url, then drives a
+weighted mix of API requests with benchmarks/loadgen.py for --duration
+seconds after a --warmup period. Prints a JSON report with RPS, p50/p99/max
+latency and error counts, overall and per request type, tagged with the git
+commit so reports from two commits can be diffed with benchmarks/compare.py.
+
+Usage: python benchmarks/bench_load.py [--server gunicorn] [--mix calculate=8,evaluate=1,batch=1] \\
+           [--concurrency 32] [--duration 10] [--output load.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadgen import ROOT, run_mix, start_server, stop_server  # noqa: E402
+
+SERVERS = {
+    'dev': lambda port, workers, threads: [sys.executable, 'run.py'],
+    'gunicorn': lambda port, workers, threads: [
+        'gunicorn', '--workers', str(workers), '--threads', str(threads), '--timeout', '60',
+        '--bind', f'127.0.0.1:{port}', 'run:app'],
+    'asgi': lambda port, workers, threads: [
+        'gunicorn', '-k', 'uvicorn.workers.UvicornWorker', '--workers', str(workers), '--timeout', '60',
+        '--bind', f'127.0.0.1:{port}', 'run_asgi:app'],
+}
+
+DEFAULT_MIX = 'calculate=8,evaluate=1,batch=1'
+
+
+def request_pool(name, rng, size=64):
+    """``size`` varied ``(path, body)`` requests of one type, so caches see realistic keys."""
+    operations = ['+', '-', '*', '/', 'sqrt', 'sin', 'ln']
+    requests = []
+    for _ in range(size):
+        a = round(rng.uniform(1, 1000), 3)
+        b = round(rng.uniform(1, 1000), 3)
+        if name == 'calculate':
+            body = {'operation': rng.choice(operations), 'a': a, 'b': b}
+            requests.append(('/api/calculate', json.dumps(body)))
+        elif name == 'evaluate':
+            body = {'expression': 'sqrt(x * x + y * y) / (1 + ln(x))', 'variables': {'x': a, 'y': b}}
+            requests.append(('/api/evaluate', json.dumps(body)))
+        elif name == 'batch':
+            rows = [{'operation': rng.choice(operations), 'a': rng.uniform(1, 1000), 'b': rng.uniform(1, 1000)}
+                    for _ in range(100)]
+            requests.append(('/api/calculate/batch', json.dumps({'calculations': rows})))
+        elif name == 'decimal':
+            body = {'operation': '/', 'a': str(a), 'b': str(b), 'mode': 'decimal', 'precision': 50}
+            requests.append(('/api/calculate', json.dumps(body)))
+        elif name == 'health':
+            requests.append(('/health', None))
+        elif name == 'index':
+            requests.append(('/', None))
+        else:
+            raise ValueError(f'unknown request type: {name}')
+    return requests
+
+
+def parse_mix(spec, seed):
+    rng = random.Random(seed)
+    mix = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = (int(weight or 1), request_pool(name.strip(), rng))
+    return mix
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--server', choices=sorted(SERVERS), default='gunicorn')
+    parser.add_argument('--url', help='benchmark an already running server instead of starting one')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help='comma-separated name=weight from calculate, evaluate, batch, decimal, health, index')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra environment for the started server (repeatable)')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix, args.seed)
+    process = None
+    url = args.url
+    if url is None:
+        env = dict(item.split('=', 1) for item in args.env)
+        env['PORT'] = str(args.port)
+        process = start_server(SERVERS[args.server](args.port, args.workers, args.threads), args.port, env)
+        url = f'http://127.0.0.1:{args.port}'
+    try:
+        summary = asyncio.run(run_mix(url, mix, args.concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        if process is not None:
+            stop_server(process)
+
+    report = {
+        'benchmark': 'load',
+        'environment': environment(),
+        'parameters': {
+            'server': 'external' if args.url else args.server,
+            'mix': args.mix,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'workers': args.workers,
+            'threads': args.threads,
+            'seed': args.seed,
+            'env': args.env,
+        },
+        'results': summary,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
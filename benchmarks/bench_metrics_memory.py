@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MetricsCollector memory stays flat as requests are recorded.
+
+Records N synthetic requests (default 10M) spread over a realistic set of
+endpoint/method/status label sets and prints resident memory, record cost
+and get_stats() cost at checkpoints.
+
+Usage: python benchmarks/bench_metrics_memory.py [--requests 10000000]
+"""
+
+import argparse
+import gc
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.metrics import MetricsCollector  # noqa: E402
+
+
+LABELS = [
+    ('POST', 'main.calculate', 200),
+    ('POST', 'main.calculate', 400),
+    ('POST', 'main.evaluate', 200),
+    ('POST', 'main.evaluate', 400),
+    ('POST', 'main.calculate_batch', 200),
+    ('GET', 'main.health', 200),
+    ('GET', 'main.index', 200),
+    ('GET', 'metrics', 200),
+    ('GET', 'unknown', 404),
+]
+
+
+def rss_mb():
+    """Current resident set size in MB (falls back to peak RSS)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=10_000_000)
+    parser.add_argument('--checkpoints', type=int, default=10)
+    args = parser.parse_args()
+
+    collector = MetricsCollector()
+    rng = random.Random(42)
+    labels = [rng.choice(LABELS) for _ in range(4096)]
+    durations = [rng.lognormvariate(-7, 1.2) for _ in range(4096)]
+    step = max(1, args.requests // args.checkpoints)
+
+    gc.collect()
+    baseline = rss_mb()
+    print(f"{'recorded':>12} {'rss_mb':>9} {'delta_mb':>9} {'record_us':>10} {'get_stats_ms':>13}")
+
+    recorded = 0
+    while recorded < args.requests:
+        batch = min(step, args.requests - recorded)
+        start = time.perf_counter()
+        for i in range(recorded, recorded + batch):
+            method, endpoint, status = labels[i & 4095]
+            collector.track_request(method, endpoint, status, durations[i & 4095])
+        elapsed = time.perf_counter() - start
+        recorded += batch
+
+        start = time.perf_counter()
+        collector.get_stats()
+        stats_ms = (time.perf_counter() - start) * 1000
+
+        gc.collect()
+        current = rss_mb()
+        print(f"{recorded:>12,} {current:>9.1f} {current - baseline:>9.1f} "
+              f"{elapsed / batch * 1e6:>10.2f} {stats_ms:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-request cost of the metrics instrumentation.
+
+Measures MetricsCollector.record on its own, the RequestInstrumentation
+middleware around a trivial WSGI app (with and without sampling), and the
+end-to-end difference for GET /health through the Flask test client with
+metrics enabled vs disabled.
+
+Usage: python benchmarks/bench_metrics_overhead.py [--iterations 200000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from app.config import TestingConfig  # noqa: E402
+from app.metrics import MetricsCollector, RequestInstrumentation  # noqa: E402
+
+
+def _trivial_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ok']
+
+
+def per_call_ns(func, iterations):
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200_000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    collector = MetricsCollector()
+    record_ns = per_call_ns(lambda: collector.record('GET', 'main.health', 200, 125_000), n)
+
+    environ = {'REQUEST_METHOD': 'GET', 'calculator.endpoint': 'main.health'}
+
+    def noop_start_response(status, headers, exc_info=None):
+        pass
+
+    baseline_ns = per_call_ns(lambda: _trivial_app(environ, noop_start_response), n)
+    results = {'collector.record': record_ns}
+    for rate in (1.0, 0.1, 0.01):
+        wrapped = RequestInstrumentation(_trivial_app, MetricsCollector(), sample_rate=rate)
+        wrapped_ns = per_call_ns(lambda: wrapped(environ, noop_start_response), n)
+        results[f'middleware (sample_rate={rate})'] = wrapped_ns - baseline_ns
+
+    class NoMetricsConfig(TestingConfig):
+        METRICS_ENABLED = False
+
+    flask_n = max(1, n // 20)
+    for label, config in (('with metrics', TestingConfig), ('without metrics', NoMetricsConfig)):
+        client = create_app(config).test_client()
+        client.get('/health')
+        results[f'GET /health end-to-end ({label})'] = per_call_ns(lambda: client.get('/health'), flask_n)
+
+    print(f"{'measurement':<45} {'ns/request':>12}")
+    for name, value in results.items():
+        print(f"{name:<45} {value:>12.0f}")
+    overhead = results['GET /health end-to-end (with metrics)'] - results['GET /health end-to-end (without metrics)']
+    print(f"{'end-to-end instrumentation overhead':<45} {overhead:>12.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the request hot path, as comparable JSON.
+
+Times Calculator.calculate and aggregate, expression compilation and evaluation,
+MetricsCollector.record and structured log rendering in-process. Each case
+reports the best of --repeat rounds in nanoseconds per operation, so that
+reports from two commits can be diffed with benchmarks/compare.py.
+
+Usage: python benchmarks/bench_micro.py [--filter calculate] [--output micro.json]
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from app.aggregate import as_column  # noqa: E402
+from app.calculator import Calculator  # noqa: E402
+from app.config import TestingConfig  # noqa: E402
+from app.expression import compile_expression  # noqa: E402
+from app.logging_config import RouteLogger  # noqa: E402
+from app.metrics import MetricsCollector  # noqa: E402
+from app.operations import operations  # noqa: E402
+from bench_load import environment  # noqa: E402
+
+EXPRESSION = 'sqrt(x * x + y * y) / (1 + ln(x)) - sin(y)'
+VARIABLES = {'x': 3.5, 'y': 1.25}
+AGGREGATE_VALUES = [((i * 7919) % 10007) / 101 for i in range(65536)]
+
+
+def cases():
+    collector = MetricsCollector()
+    route_log = RouteLogger('bench')
+    app_logger = logging.getLogger('flask_calculator')
+    Calculator.compile_expression(EXPRESSION)
+    column = as_column(AGGREGATE_VALUES)
+    return {
+        'calculate.add': lambda: Calculator.calculate('+', 6.0, 7.0),
+        'calculate.divide': lambda: Calculator.calculate('/', 6.0, 7.0),
+        'calculate.sqrt': lambda: Calculator.calculate('sqrt', 42.0),
+        'calculate.tan': lambda: Calculator.calculate('tan', 0.5),
+        'calculate.ln': lambda: Calculator.calculate('ln', 42.0),
+        'calculate.pow': lambda: Calculator.calculate('pow', 1.5, 3.0),
+        'calculate.factorial': lambda: Calculator.calculate('factorial', 20.0),
+        'calculate.divide_by_zero': lambda: _expect_error(Calculator.calculate, '/', 1.0, 0.0),
+        'calculate.unknown': lambda: _expect_error(Calculator.calculate, 'cbrt', 8.0),
+        'expression.compile': lambda: compile_expression(EXPRESSION, operations.functions),
+        'aggregate.moments_64k': lambda: Calculator.aggregate(column, ['sum', 'mean', 'variance']),
+        'aggregate.dot_64k': lambda: Calculator.aggregate(column, ['dot'], column),
+        'expression.evaluate_cached': lambda: Calculator.evaluate_expression(EXPRESSION, VARIABLES),
+        'metrics.record': lambda: collector.record('POST', 'main.calculate', 200, 125_000),
+        'logging.render': lambda: route_log.begin().info("Calculation successful",
+                                                         lambda: {'result': 42.0}),
+        'logging.filtered': lambda: app_logger.debug("Calculation successful"),
+    }
+
+
+def _expect_error(func, *args):
+    try:
+        func(*args)
+    except ValueError:
+        pass
+
+
+def ns_per_op(func, iterations, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(iterations):
+            func()
+        elapsed = (time.perf_counter_ns() - start) / iterations
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this text')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    class BenchConfig(TestingConfig):
+        LOG_LEVEL = 'INFO'
+
+    create_app(BenchConfig)
+    # Render log lines fully, but into memory rather than the terminal
+    for handler in logging.getLogger().handlers:
+        if getattr(handler, 'calculator_handler', False):
+            handler.setStream(io.StringIO())
+            sink = handler
+
+    results = {}
+    for name, func in cases().items():
+        if args.filter not in name:
+            continue
+        func()
+        nanoseconds = ns_per_op(func, args.iterations, args.repeat)
+        results[name] = {'ns_per_op': round(nanoseconds, 1), 'ops_per_second': round(1e9 / nanoseconds)}
+        sink.stream.seek(0)
+        sink.stream.truncate()
+
+    report = {
+        'benchmark': 'micro',
+        'environment': environment(),
+        'parameters': {'iterations': args.iterations, 'repeat': args.repeat},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
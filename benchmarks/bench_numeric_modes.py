@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput of the float, decimal and rational calculation modes.
+
+Times Calculator.calculate over a mix of operations and
+Calculator.evaluate_bindings over a small expression in each numeric mode,
+including decimal at a high precision, and prints operations per second.
+The worst case allowed by the configured limits is timed separately to
+show the per-operation cost ceiling.
+
+Usage: python benchmarks/bench_numeric_modes.py [--operations 100000] [--rows 10000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.calculator import Calculator  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.numeric import numeric_mode  # noqa: E402
+
+EXPRESSION = 'x * x + y / 3 - (x - y) / 7'
+
+
+def config():
+    return {key: getattr(Config, key) for key in dir(Config) if key.isupper()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--operations', type=int, default=100000)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--precision', type=int, default=200)
+    args = parser.parse_args()
+
+    settings = config()
+    rng = random.Random(42)
+    operands = [(f'{rng.uniform(-1000, 1000):.6f}', f'{rng.uniform(1, 1000):.6f}')
+                for _ in range(args.operations)]
+    operations = ['+', '-', '*', '/']
+    bindings = {'x': [a for a, _ in operands[:args.rows]], 'y': [b for _, b in operands[:args.rows]]}
+    modes = [
+        ('float', numeric_mode('float', None, settings)),
+        ('decimal/28', numeric_mode('decimal', None, settings)),
+        (f'decimal/{args.precision}', numeric_mode('decimal', args.precision, settings)),
+        ('rational', numeric_mode('rational', None, settings)),
+    ]
+
+    print(f"{'mode':<14} {'calculate/s':>12} {'rows/s':>12}")
+    for name, mode in modes:
+        parse = float if mode is None else mode.parse
+        values = [(parse(a), parse(b)) for a, b in operands]
+        start = time.perf_counter()
+        for i, (a, b) in enumerate(values):
+            Calculator.calculate(operations[i & 3], a, b, mode)
+        calculate_rate = len(values) / (time.perf_counter() - start)
+
+        rows = bindings if mode is not None else {key: [float(v) for v in column]
+                                                  for key, column in bindings.items()}
+        start = time.perf_counter()
+        Calculator.evaluate_bindings(EXPRESSION, rows, mode)
+        rows_rate = args.rows / (time.perf_counter() - start)
+        print(f"{name:<14} {calculate_rate:>12,.0f} {rows_rate:>12,.0f}")
+
+    # Cost ceiling: the largest operands and precision the limits admit
+    digits = settings['NUMERIC_MAX_DIGITS']
+    decimal = numeric_mode('decimal', settings['NUMERIC_MAX_PRECISION'], settings)
+    rational = numeric_mode('rational', None, settings)
+    worst = [
+        ('decimal / max', decimal, '/', decimal.parse('7' * digits), decimal.parse('3' * (digits - 1))),
+        ('decimal ln max', decimal, 'ln', decimal.parse('7' * digits), None),
+        ('rational * max', rational, '*',
+         rational.parse(f"{'7' * (digits // 4)}/{'3' * (digits // 4)}"),
+         rational.parse(f"{'5' * (digits // 4)}/{'9' * (digits // 4)}")),
+    ]
+    for name, mode, operation, a, b in worst:
+        start = time.perf_counter()
+        Calculator.calculate(operation, a, b, mode)
+        print(f"{name:<14} {(time.perf_counter() - start) * 1000:>11.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Start-up benchmark: time from process spawn to the first answered request.
+
+Starts each server configuration --runs times on a spare port and measures
+``ready_ms``, from spawn until ``/readyz`` first answers 200 (polled every
+millisecond), and ``first_request_ms``, the latency of the first batch
+calculation after that. The ``create_app`` phase timings reported under
+``startup`` in /metrics are included for the last run. The import profile
+of the ``app`` package (``python -X importtime``, which adds some overhead
+of its own) is reported with its most expensive modules by self time.
+
+Prints a JSON report tagged with the git commit; reports from two commits
+can be diffed with benchmarks/compare.py.
+
+Usage: python benchmarks/bench_startup.py [--configs dev,gunicorn,gunicorn-preload,gunicorn-preload-warm] \\
+           [--runs 5] [--output startup.json]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_load import environment  # noqa: E402
+from loadgen import ROOT, stop_server  # noqa: E402
+
+
+def gunicorn(port, *extra):
+    return ['gunicorn', '--workers', '2', '--threads', '2', '--bind', f'127.0.0.1:{port}', *extra, 'run:app']
+
+
+# name -> (command for a port, extra environment)
+CONFIGS = {
+    'dev': (lambda port: [sys.executable, 'run.py'], {}),
+    'asgi': (lambda port: [sys.executable, '-m', 'uvicorn', '--port', str(port), '--log-level', 'warning',
+                           'run_asgi:app'], {}),
+    'gunicorn': (lambda port: gunicorn(port), {}),
+    'gunicorn-preload': (lambda port: gunicorn(port, '--preload'), {}),
+    'gunicorn-preload-warm': (lambda port: gunicorn(port, '--preload'), {'STARTUP_WARMUP': 'sync'}),
+}
+
+DEFAULT_CONFIGS = 'dev,gunicorn,gunicorn-preload,gunicorn-preload-warm'
+
+FIRST_REQUEST = json.dumps({
+    'calculations': [{'operation': operation, 'a': 2.5, 'b': 1.5}
+                     for operation in ('+', '-', '*', '/', 'sqrt', 'sin', 'ln', 'pow')]
+})
+
+
+def request(port, method, path, body=None, timeout=5.0):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def measure(name, port, timeout=30.0):
+    """Spawn one configuration; return ``(ready_ms, first_request_ms, phases_ms)``."""
+    command, extra_env = CONFIGS[name]
+    env = dict(os.environ, FLASK_ENV='production', LOG_LEVEL='WARNING', PORT=str(port))
+    env.update(extra_env)
+    start = time.perf_counter()
+    process = subprocess.Popen(command(port), cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        deadline = start + timeout
+        probe = '/readyz'
+        while True:
+            try:
+                status = request(port, 'GET', probe, timeout=1.0)[0]
+                if status == 200:
+                    break
+                if status == 404:
+                    probe = '/health'  # a commit from before /readyz
+                    continue
+            except OSError:
+                pass
+            if process.poll() is not None:
+                raise RuntimeError(f'{name} exited early')
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f'{name} did not become ready')
+            time.sleep(0.001)
+        ready_ms = (time.perf_counter() - start) * 1000
+
+        begin = time.perf_counter()
+        status, _ = request(port, 'POST', '/api/calculate/batch', FIRST_REQUEST)
+        first_request_ms = (time.perf_counter() - begin) * 1000
+        if status != 200:
+            raise RuntimeError(f'{name}: first request failed with {status}')
+
+        status, body = request(port, 'GET', '/metrics')
+        phases = json.loads(body)['metrics'].get('startup', {}).get('phases_ms') if status == 200 else None
+        return ready_ms, first_request_ms, phases
+    finally:
+        stop_server(process)
+
+
+def summarize(values):
+    return {
+        'p50': round(statistics.median(values), 3),
+        'min': round(min(values), 3),
+        'max': round(max(values), 3),
+    }
+
+
+def import_profile(top=15):
+    """Total import time of ``app`` and its most expensive modules (self time, ms)."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    modules = []
+    total = None
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((int(self_us) / 1000, name.strip()))
+        if name.strip() == 'app':
+            total = int(cumulative_us) / 1000
+    modules.sort(reverse=True)
+    return {
+        'app_ms': total,
+        'top_self_ms': {name: round(ms, 3) for ms, name in modules[:top]},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS,
+                        help=f'comma-separated from {", ".join(CONFIGS)}')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--port', type=int, default=18180)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.configs.split(',') if name.strip()]
+    for name in names:
+        if name not in CONFIGS:
+            parser.error(f'unknown configuration: {name}')
+
+    results = {}
+    for name in names:
+        ready = []
+        first = []
+        phases = None
+        for run in range(args.runs):
+            ready_ms, first_request_ms, phases = measure(name, args.port)
+            ready.append(ready_ms)
+            first.append(first_request_ms)
+        results[name] = {
+            'ready_ms': summarize(ready),
+            'first_request_ms': summarize(first),
+            'phases_ms': phases,
+        }
+    results['imports'] = import_profile()
+
+    report = {
+        'benchmark': 'startup',
+        'environment': environment(),
+        'parameters': {'configs': args.configs, 'runs': args.runs},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/calculate/stream memory stays flat as the input grows.
+
+Feeds N synthetic NDJSON lines (default 10M, with a sprinkling of malformed
+ones) through CalculationStream in 64 KiB blocks, the way the Flask and
+ASGI apps drive it, discards the output, and prints resident memory and
+throughput at checkpoints.
+
+Usage: python benchmarks/bench_stream_memory.py [--lines 10000000] [--chunk-size 1000]
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app import create_app  # noqa: E402
+from app.api import CalculationStream  # noqa: E402
+from app.config import TestingConfig  # noqa: E402
+from bench_metrics_memory import rss_mb  # noqa: E402
+
+OPERATIONS = [b'+', b'-', b'*', b'/', b'sqrt']
+
+
+def ndjson_body(lines, block_size=65536):
+    """Yield NDJSON input in ``block_size`` blocks without materializing it."""
+    block = []
+    size = 0
+    for i in range(lines):
+        if i % 997 == 0:
+            line = b'{"operation": "+", "a": \n'  # malformed
+        else:
+            operation = OPERATIONS[i % len(OPERATIONS)]
+            line = b'{"operation": "%s", "a": %d, "b": %d}\n' % (operation, i, i % 7)
+        block.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield b''.join(block)
+            block = []
+            size = 0
+    if block:
+        yield b''.join(block)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lines', type=int, default=10_000_000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--checkpoints', type=int, default=10)
+    args = parser.parse_args()
+
+    class BenchConfig(TestingConfig):
+        STREAM_CHUNK_SIZE = args.chunk_size
+
+    app = create_app(BenchConfig)
+    calculation = CalculationStream(app.config, app.json.loads, app.json.encode)
+    step = max(1, args.lines // args.checkpoints)
+
+    gc.collect()
+    baseline = rss_mb()
+    print(f"{'lines':>12} {'rss_mb':>9} {'delta_mb':>9} {'lines/s':>11} {'output_mb':>10}")
+
+    output_bytes = 0
+    next_checkpoint = step
+    start = time.perf_counter()
+    for block in ndjson_body(args.lines):
+        output_bytes += len(calculation.feed(block))
+        if calculation.line >= next_checkpoint:
+            next_checkpoint += step
+            current = rss_mb()
+            rate = calculation.line / (time.perf_counter() - start)
+            print(f"{calculation.line:>12,} {current:>9.1f} {current - baseline:>9.1f} "
+                  f"{rate:>11,.0f} {output_bytes / 2 ** 20:>10.1f}")
+    output_bytes += len(calculation.finish())
+    print(f"done: {calculation.count:,} lines, {calculation.error_count:,} errors, "
+          f"{output_bytes / 2 ** 20:.1f} MB of output")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark reports from bench_micro.py, bench_load.py or bench_startup.py.
+
+Prints each metric from the baseline and candidate reports with its
+relative change, flagging changes worse than --threshold percent. Exits 1
+when any metric regressed, so it can gate a CI job.
+
+Usage: python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+"""
+
+import argparse
+import json
+import sys
+
+
+def metrics(report):
+    """Flatten a report into ``{name: (value, higher_is_better)}``."""
+    results = report['results']
+    if report.get('benchmark') == 'micro':
+        return {name: (result['ns_per_op'], False) for name, result in results.items()}
+    if report.get('benchmark') == 'startup':
+        flat = {}
+        for name, result in results.items():
+            if name == 'imports':
+                flat['imports.app_ms'] = (result['app_ms'], False)
+                continue
+            flat[f'{name}.ready_ms'] = (result['ready_ms']['p50'], False)
+            flat[f'{name}.first_request_ms'] = (result['first_request_ms']['p50'], False)
+        return flat
+
+    flat = {}
+    sections = [('all', results)] + sorted(results.get('by_request', {}).items())
+    for prefix, summary in sections:
+        flat[f'{prefix}.requests_per_second'] = (summary['requests_per_second'], True)
+        for quantile in ('p50', 'p99', 'max'):
+            value = summary['latency_ms'][quantile]
+            if value is not None:
+                flat[f'{prefix}.latency_{quantile}_ms'] = (value, False)
+        flat[f'{prefix}.errors'] = (summary['errors'], False)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='percent change counted as a regression')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get('benchmark') != candidate.get('benchmark'):
+        raise SystemExit('reports are from different benchmarks')
+
+    before = metrics(baseline)
+    after = metrics(candidate)
+    print(f"baseline {baseline['environment'].get('commit')}  candidate {candidate['environment'].get('commit')}")
+    differing = sorted(key for key in set(baseline['parameters']) | set(candidate['parameters'])
+                       if baseline['parameters'].get(key) != candidate['parameters'].get(key))
+    if differing:
+        print(f"warning: runs used different parameters: {', '.join(differing)}")
+    print(f"{'metric':<40} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    regressions = 0
+    for name, (old, higher_is_better) in before.items():
+        if name not in after:
+            continue
+        new = after[name][0]
+        if old:
+            change = (new - old) / old * 100
+        else:
+            change = 0.0 if new == old else float('inf')
+        worse = change < -args.threshold if higher_is_better else change > args.threshold
+        # Error counts regress on any increase, whatever the threshold
+        if name.endswith('.errors'):
+            worse = new > old
+        regressions += worse
+        print(f"{name:<40} {old:>12,.3f} {new:>12,.3f} {change:>+8.1f}%{'  REGRESSION' if worse else ''}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Closed-loop HTTP/1.1 load generator built on asyncio streams.
+
+Each of ``--concurrency`` clients sends one request at a time over a
+keep-alive connection (reconnecting when the server answers with
+``Connection: close``, as gunicorn's sync workers do) and records the
+latency of every response. ``--slow-clients`` extra connections trickle
+their request out one byte at a time to occupy server slots the way a slow
+mobile client does. Prints a JSON summary.
+
+Also importable: :func:`run_load` drives one URL, :func:`run_mix` a
+weighted mix of requests, and :func:`start_server`/:func:`stop_server`
+manage a local server process for benchmarks.
+
+Usage: python benchmarks/loadgen.py --url http://localhost:8080/api/calculate \\
+           --body '{"operation": "+", "a": 1, "b": 2}' [--concurrency 32] [--duration 10]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def build_request(host, port, path, body=None, keep_alive=True):
+    method = 'POST' if body is not None else 'GET'
+    lines = [
+        f'{method} {path} HTTP/1.1',
+        f'Host: {host}:{port}',
+        f'Connection: {"keep-alive" if keep_alive else "close"}',
+    ]
+    payload = b''
+    if body is not None:
+        payload = body.encode('utf-8') if isinstance(body, str) else body
+        lines.append('Content-Type: application/json')
+        lines.append(f'Content-Length: {len(payload)}')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('ascii') + payload
+
+
+async def read_response(reader):
+    """Read one response; returns ``(status, body, keep_alive)``."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split(' ', 2)[1])
+    length = 0
+    keep_alive = True
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'connection' and value.strip().lower() == 'close':
+            keep_alive = False
+    body = await reader.readexactly(length) if length else b''
+    return status, body, keep_alive
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))
+    return sorted_values[index]
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies_ns = []
+        self.statuses = {}
+        self.errors = 0
+        self.connections = 0
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies_ns)
+        ms = 1e-6
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'connections': self.connections,
+            'elapsed_seconds': round(elapsed, 3),
+            'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0,
+            'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) * ms, 3) if latencies else None,
+                'p50': round(percentile(latencies, 50) * ms, 3) if latencies else None,
+                'p90': round(percentile(latencies, 90) * ms, 3) if latencies else None,
+                'p99': round(percentile(latencies, 99) * ms, 3) if latencies else None,
+                'max': round(latencies[-1] * ms, 3) if latencies else None,
+            },
+        }
+
+
+async def _client(host, port, next_request, deadline, result, breakdown=None, record_after=0.0):
+    """Send requests from ``next_request()`` (``(name, bytes)``) until ``deadline``.
+
+    Responses that complete before ``record_after`` (a warm-up period) are
+    not recorded. With ``breakdown`` each response is also recorded in the
+    :class:`LoadResult` for its request name.
+    """
+    reader = writer = None
+    while time.monotonic() < deadline:
+        name, request = next_request()
+        target = breakdown.get(name) if breakdown is not None else None
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+                result.connections += 1
+            start = time.perf_counter_ns()
+            writer.write(request)
+            status, _, keep_alive = await read_response(reader)
+            latency = time.perf_counter_ns() - start
+            if time.monotonic() >= record_after:
+                for stats in (result, target) if target is not None else (result,):
+                    stats.latencies_ns.append(latency)
+                    stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            result.errors += 1
+            if target is not None:
+                target.errors += 1
+            keep_alive = False
+            await asyncio.sleep(0.01)
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _slow_client(host, port, request, deadline, byte_interval):
+    """Hold a connection open by sending ``request`` one byte at a time."""
+    while time.monotonic() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            for i in range(len(request)):
+                if time.monotonic() >= deadline:
+                    break
+                writer.write(request[i:i + 1])
+                await writer.drain()
+                await asyncio.sleep(byte_interval)
+            else:
+                await read_response(reader)
+            writer.close()
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            await asyncio.sleep(0.01)
+
+
+async def run_load(url, body=None, concurrency=32, duration=10.0, slow_clients=0,
+                   slow_byte_interval=0.05):
+    """Drive ``url`` for ``duration`` seconds and return the summary dict."""
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    request = build_request(host, port, path, body)
+
+    result = LoadResult()
+    deadline = time.monotonic() + duration
+    slow = [asyncio.create_task(_slow_client(host, port, request, deadline, slow_byte_interval))
+            for _ in range(slow_clients)]
+    start = time.monotonic()
+    await asyncio.gather(*(_client(host, port, lambda: (None, request), deadline, result)
+                           for _ in range(concurrency)))
+    elapsed = time.monotonic() - start
+    for task in slow:
+        task.cancel()
+    await asyncio.gather(*slow, return_exceptions=True)
+
+    summary = result.summary(elapsed)
+    summary.update({'url': url, 'concurrency': concurrency, 'slow_clients': slow_clients})
+    return summary
+
+
+async def run_mix(base_url, mix, concurrency=32, duration=10.0, warmup=0.0, seed=42):
+    """Drive a weighted request mix against ``base_url``.
+
+    ``mix`` maps a request name to ``(weight, requests)``, where each
+    request is ``(path, body-or-None)``. Clients walk a shuffled schedule in
+    which every name appears ``weight`` times, cycling through that name's
+    requests, so runs are repeatable for a given ``seed``. The first
+    ``warmup`` seconds are not recorded. Returns the overall summary with a
+    ``by_request`` breakdown.
+    """
+    parts = urlsplit(base_url)
+    host, port = parts.hostname, parts.port or 80
+    prefix = parts.path.rstrip('/')
+
+    schedule = []
+    encoded = {}
+    for name, (weight, requests) in mix.items():
+        if weight > 0:
+            encoded[name] = [build_request(host, port, prefix + path, body) for path, body in requests]
+            schedule.extend([name] * weight)
+    if not schedule:
+        raise ValueError('request mix has no positive weights')
+    rng = random.Random(seed)
+    rng.shuffle(schedule)
+
+    def picker(offset):
+        counters = dict.fromkeys(encoded, offset)
+        position = offset
+
+        def next_request():
+            nonlocal position
+            name = schedule[position % len(schedule)]
+            position += 1
+            requests = encoded[name]
+            counters[name] += 1
+            return name, requests[counters[name] % len(requests)]
+        return next_request
+
+    result = LoadResult()
+    breakdown = {name: LoadResult() for name in encoded}
+    record_after = time.monotonic() + warmup
+    deadline = record_after + duration
+    await asyncio.gather(*(_client(host, port, picker(i * 7919), deadline, result, breakdown, record_after)
+                           for i in range(concurrency)))
+    elapsed = max(time.monotonic() - record_after, 1e-9)
+
+    summary = result.summary(elapsed)
+    summary.update({'url': base_url, 'concurrency': concurrency, 'warmup_seconds': warmup})
+    summary['by_request'] = {name: stats.summary(elapsed) for name, stats in breakdown.items()}
+    return summary
+
+
+def start_server(command, port, env=None, timeout=30):
+    """Start ``command`` bound to ``port`` and wait until /health answers."""
+    env = {**os.environ, 'FLASK_ENV': 'production', 'LOG_LEVEL': 'WARNING', **(env or {})}
+    process = subprocess.Popen(command, cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1).read()
+            return process
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError(f'server exited early: {" ".join(command)}')
+            time.sleep(0.2)
+    stop_server(process)
+    raise RuntimeError(f'server did not become healthy: {" ".join(command)}')
+
+
+def stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:8080/health')
+    parser.add_argument('--body', help='JSON request body; sends POST when given')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--slow-clients', type=int, default=0)
+    parser.add_argument('--slow-byte-interval', type=float, default=0.05,
+                        help='seconds between bytes sent by each slow client')
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args.url, args.body, args.concurrency, args.duration,
+                                   args.slow_clients, args.slow_byte_interval))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings, read automatically from the working directory.
+
+With ``--preload`` (or ``GUNICORN_PRELOAD=true``) the app is imported and
+built once in the master, including any ``STARTUP_WARMUP``, and each worker
+is forked with it already in memory: workers start in milliseconds and
+share the imported modules and built assets through copy-on-write pages.
+Freezing the garbage collector before forking keeps collections in the
+workers from touching, and so copying, those pages.
+
+Each worker starts publishing its metrics snapshot (``METRICS_MULTIPROC_DIR``)
+once it has loaded the app; the master never does, even when it built the
+app. When a worker exits, its snapshot is retired: its request counters stay
+in the pod totals and its gauges go.
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'false').lower() == 'true'
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    from app.metrics import metrics_collector
+    metrics_collector.start_publisher()
+
+
+def child_exit(server, worker):
+    multiproc_dir = os.environ.get('METRICS_MULTIPROC_DIR')
+    if multiproc_dir:
+        from app.metrics import mark_process_dead
+        mark_process_dead(multiproc_dir, worker.pid)
@@ -10,7 +10,9 @@ config_mapping = {
 config_name = os.environ.get('FLASK_ENV', 'development')
 config_class = config_mapping.get(config_name, DevelopmentConfig)
 
-app = create_app(config_class)
+# Executor pool processes re-import the main module as __mp_main__; they need no app
+if __name__ != '__mp_main__':
+    app = create_app(config_class)
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
@@ -25,6 +25,7 @@ def run_tests():
     cmd = [
         sys.executable, '-m', 'pytest',
         'tests/test_routes.py',
+        '--live-server',
         '-v',
         '--tb=short',
         '--json-report',
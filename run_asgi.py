@@ -0,0 +1,20 @@
+import os
+from app.asgi import create_asgi_app
+from app.config import DevelopmentConfig, ProductionConfig
+
+config_mapping = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+}
+
+config_name = os.environ.get('FLASK_ENV', 'development')
+config_class = config_mapping.get(config_name, DevelopmentConfig)
+
+# Executor pool processes re-import the main module as __mp_main__; they need no app
+if __name__ != '__mp_main__':
+    app = create_asgi_app(config_class)
+
+if __name__ == '__main__':
+    import uvicorn
+    port = int(os.environ.get('PORT', 8080))
+    uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning')
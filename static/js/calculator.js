@@ -7,6 +7,202 @@ let history = [];
 const display = document.getElementById('display');
 const historyList = document.getElementById('history-list');
 
+// How results computed in the browser are checked against the server:
+// 'none', 'approximate' (operations that go through the platform's libm and
+// may differ from the server in the last bit) or 'all'
+const VERIFY_MODE = 'approximate';
+
+// Largest n whose factorial is a finite float64; Number(BigInt) rounds
+// correctly, so the table matches float(math.factorial(n)) on the server
+const MAX_FACTORIAL = 170;
+const FACTORIALS = (() => {
+    const table = [1];
+    let factorial = 1n;
+    for (let n = 1; n <= MAX_FACTORIAL; n++) {
+        factorial *= BigInt(n);
+        table.push(Number(factorial));
+    }
+    return table;
+})();
+
+const NEGATIVE = [(a, b) => a < 0, 'Cannot calculate square root of negative number'];
+const NON_POSITIVE = [(a, b) => a <= 0, 'Cannot calculate logarithm of non-positive number'];
+const ZERO_DIVISOR = [(a, b) => b === 0, 'Division by zero'];
+const finiteAngle = name => [(a, b) => Math.abs(a) === Infinity, `Cannot calculate ${name} of infinity`];
+
+// Python's float modulo: the result takes the sign of the divisor
+function floatMod(a, b) {
+    const mod = a % b;
+    if (mod === 0) {
+        return b < 0 ? -0 : 0;
+    }
+    return (b < 0) !== (mod < 0) ? mod + b : mod;
+}
+
+// Mirrors app/operations.py: the same arity, domain checks and messages.
+// `exact` operations are correctly rounded IEEE 754 arithmetic (or a table
+// lookup), so the browser and the server always agree on them
+const OPERATIONS = {
+    '+': { arity: 2, exact: true, func: (a, b) => a + b },
+    '-': { arity: 2, exact: true, func: (a, b) => a - b },
+    '*': { arity: 2, exact: true, func: (a, b) => a * b },
+    '/': { arity: 2, exact: true, func: (a, b) => a / b, domain: [ZERO_DIVISOR] },
+    'sqrt': { arity: 1, exact: true, func: Math.sqrt, domain: [NEGATIVE] },
+    'sin': { arity: 1, func: Math.sin, domain: [finiteAngle('sin')] },
+    'cos': { arity: 1, func: Math.cos, domain: [finiteAngle('cos')] },
+    'tan': { arity: 1, func: Math.tan, domain: [finiteAngle('tan')] },
+    'log': { arity: 1, func: Math.log10, domain: [NON_POSITIVE] },
+    'ln': { arity: 1, func: Math.log, domain: [NON_POSITIVE] },
+    'pow': { arity: 2, func: Math.pow, domain: [
+        [(a, b) => a === 0 && b < 0, 'Division by zero'],
+        [(a, b) => a < 0 && b % 1 !== 0, 'Cannot raise negative number to a fractional power'],
+    ] },
+    'mod': { arity: 2, exact: true, func: floatMod, domain: [ZERO_DIVISOR] },
+    'exp': { arity: 1, func: Math.exp },
+    'atan2': { arity: 2, func: Math.atan2 },
+    'hypot': { arity: 2, func: Math.hypot },
+    'factorial': { arity: 1, exact: true, func: a => a > MAX_FACTORIAL ? Infinity : FACTORIALS[a], domain: [
+        [(a, b) => a < 0 || a % 1 !== 0, 'Factorial requires a non-negative integer'],
+    ] },
+};
+
+// Thrown for a calculation the server (or its mirror) rejects, as opposed
+// to a request that failed
+class CalculationError extends Error {}
+
+// Evaluate one operation in the browser. Returns the result, throws a
+// CalculationError for invalid operands, and returns null when the server
+// must decide: unknown operations and non-finite operands or results
+function evaluateLocally(operation, a, b) {
+    const descriptor = Object.prototype.hasOwnProperty.call(OPERATIONS, operation) ? OPERATIONS[operation] : null;
+    if (descriptor === null || !Number.isFinite(a)) {
+        return null;
+    }
+    if (descriptor.arity === 2 && !Number.isFinite(b)) {
+        return null;
+    }
+    for (const [invalid, message] of descriptor.domain || []) {
+        if (invalid(a, b)) {
+            throw new CalculationError(message);
+        }
+    }
+    const result = descriptor.arity === 1 ? descriptor.func(a) : descriptor.func(a, b);
+    return Number.isFinite(result) ? result : null;
+}
+
+function needsVerification(operation) {
+    return VERIFY_MODE === 'all' || (VERIFY_MODE === 'approximate' && !OPERATIONS[operation].exact);
+}
+
+// Sends calculations to /api/calculate/batch. Calls made within `delay` ms
+// of each other share one request (at most `maxBatch` rows), an identical
+// call that is already in flight shares its promise, and recent outcomes
+// are kept in a small LRU cache. Resolves with the result or rejects with
+// a CalculationError carrying the server's message
+class BatchClient {
+    constructor(url, { delay = 10, maxBatch = 100, cacheSize = 256 } = {}) {
+        this.url = url;
+        this.delay = delay;
+        this.maxBatch = maxBatch;
+        this.cacheSize = cacheSize;
+        this.cache = new Map();
+        this.inFlight = new Map();
+        this.queue = [];
+        this.timer = null;
+    }
+
+    static key(operation, a, b) {
+        return JSON.stringify([operation, a, b === undefined ? null : b]);
+    }
+
+    // The cached outcome of a call, or undefined
+    lookup(operation, a, b) {
+        const key = BatchClient.key(operation, a, b);
+        const entry = this.cache.get(key);
+        if (entry !== undefined) {
+            this.cache.delete(key);
+            this.cache.set(key, entry);
+        }
+        return entry;
+    }
+
+    calculate(operation, a, b) {
+        const key = BatchClient.key(operation, a, b);
+        const entry = this.lookup(operation, a, b);
+        if (entry !== undefined) {
+            return entry.error !== undefined ? Promise.reject(new CalculationError(entry.error))
+                : Promise.resolve(entry.result);
+        }
+        const pending = this.inFlight.get(key);
+        if (pending !== undefined) {
+            return pending;
+        }
+        const promise = new Promise((resolve, reject) => {
+            const row = { operation, a };
+            if (b !== undefined) {
+                row.b = b;
+            }
+            this.queue.push({ key, row, resolve, reject });
+        });
+        this.inFlight.set(key, promise);
+        if (this.queue.length >= this.maxBatch) {
+            this.flush();
+        } else if (this.timer === null) {
+            this.timer = setTimeout(() => this.flush(), this.delay);
+        }
+        return promise;
+    }
+
+    flush() {
+        clearTimeout(this.timer);
+        this.timer = null;
+        while (this.queue.length) {
+            this.send(this.queue.splice(0, this.maxBatch));
+        }
+    }
+
+    send(calls) {
+        fetch(this.url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify({ calculations: calls.map(call => call.row) })
+        })
+        .then(response => response.json().then(data => {
+            if (!response.ok || !Array.isArray(data.results)) {
+                throw new Error(data.error || `HTTP ${response.status}`);
+            }
+            calls.forEach((call, i) => {
+                const error = data.errors[i];
+                this.remember(call.key, error !== null ? { error } : { result: data.results[i] });
+                if (error !== null) {
+                    call.reject(new CalculationError(error));
+                } else {
+                    call.resolve(data.results[i]);
+                }
+            });
+        }))
+        .catch(error => {
+            // Transport failures are not cached, so the next call retries
+            calls.forEach(call => call.reject(error));
+        })
+        .finally(() => {
+            calls.forEach(call => this.inFlight.delete(call.key));
+        });
+    }
+
+    remember(key, entry) {
+        this.cache.delete(key);
+        this.cache.set(key, entry);
+        if (this.cache.size > this.cacheSize) {
+            this.cache.delete(this.cache.keys().next().value);
+        }
+    }
+}
+
+const client = new BatchClient('/api/calculate/batch');
+
 function updateDisplay() {
     display.textContent = currentNumber;
 }
@@ -56,32 +252,7 @@ function appendOperator(operator) {
 
 function appendFunction(func) {
     const num = parseFloat(currentNumber);
-    
-    fetch('/api/calculate', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            operation: func,
-            a: num
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            alert('Error: ' + data.error);
-        } else {
-            currentNumber = data.result.toString();
-            updateDisplay();
-            addToHistory(`${func}(${num}) = ${data.result}`);
-            shouldResetDisplay = true;
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        alert('Calculation error');
-    });
+    compute(func, num, undefined, `${func}(${num})`);
 }
 
 function calculate() {
@@ -92,45 +263,91 @@ function calculate() {
     const a = parseFloat(previousNumber);
     const b = parseFloat(currentNumber);
     
-    let operation = currentOperation;
-    
-    fetch('/api/calculate', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-            operation: operation,
-            a: a,
-            b: b
-        })
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            alert('Error: ' + data.error);
+    compute(currentOperation, a, b, `${a} ${currentOperation} ${b}`, () => {
+        currentOperation = null;
+        previousNumber = '';
+    });
+}
+
+// Run one calculation: in the browser when the result is certain to match
+// the server (checked in the background otherwise), through the batching
+// client when only the server can answer
+function compute(operation, a, b, label, onSuccess) {
+    let result;
+    try {
+        const cached = client.lookup(operation, a, b);
+        if (cached !== undefined && cached.error === undefined) {
+            result = cached.result;
         } else {
-            const operatorSymbol = currentOperation;
-            addToHistory(`${a} ${operatorSymbol} ${b} = ${data.result}`);
-            currentNumber = data.result.toString();
-            updateDisplay();
-            currentOperation = null;
-            previousNumber = '';
-            shouldResetDisplay = true;
+            result = evaluateLocally(operation, a, b);
         }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        alert('Calculation error');
-    });
+    } catch (error) {
+        alert('Error: ' + error.message);
+        return;
+    }
+    
+    if (result !== null) {
+        const entry = showResult(label, result, onSuccess);
+        if (needsVerification(operation)) {
+            client.calculate(operation, a, b)
+                .then(verified => {
+                    if (verified !== null && verified !== result) {
+                        correctResult(entry, verified);
+                    }
+                })
+                .catch(error => console.error('Verification failed:', error));
+        }
+        return;
+    }
+    
+    client.calculate(operation, a, b)
+        .then(result => {
+            if (result === null) {
+                alert('Calculation error');
+            } else {
+                showResult(label, result, onSuccess);
+            }
+        })
+        .catch(error => {
+            if (error instanceof CalculationError) {
+                alert('Error: ' + error.message);
+            } else {
+                console.error('Error:', error);
+                alert('Calculation error');
+            }
+        });
+}
+
+function showResult(label, result, onSuccess) {
+    const entry = addToHistory(label, result);
+    currentNumber = result.toString();
+    updateDisplay();
+    if (onSuccess) {
+        onSuccess();
+    }
+    shouldResetDisplay = true;
+    return entry;
+}
+
+// Replace a locally computed result the server disagrees with, on the
+// display too while it still shows that result
+function correctResult(entry, result) {
+    if (shouldResetDisplay && currentNumber === entry.result.toString()) {
+        currentNumber = result.toString();
+        updateDisplay();
+    }
+    entry.result = result;
+    updateHistory();
 }
 
-function addToHistory(calculation) {
-    history.unshift(calculation);
+function addToHistory(label, result) {
+    const entry = { label, result };
+    history.unshift(entry);
     if (history.length > 10) {
         history.pop();
     }
     updateHistory();
+    return entry;
 }
 
 function updateHistory() {
@@ -138,7 +355,7 @@ function updateHistory() {
     history.forEach(item => {
         const div = document.createElement('div');
         div.className = 'history-item';
-        div.textContent = item;
+        div.textContent = `${item.label} = ${item.result}`;
         historyList.appendChild(div);
     });
 }
@@ -0,0 +1,200 @@
+"""
+Shared fixtures for the API tests.
+
+By default the tests run in-process: the app is built with
+``create_app(TestingConfig)`` and driven through Flask's test client, so no
+server is needed. ``--live-server`` runs the same tests with ``requests``
+against a running server at ``--base-url`` instead.
+
+``--perf`` records the latency of every request by endpoint and, in
+process, the bytes and memory blocks it allocated (via tracemalloc). A
+per-endpoint summary is printed at the end of the run, and ``--perf-report``
+writes it as JSON in the format benchmarks/compare.py diffs.
+"""
+
+import gzip
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pytest
+import requests
+
+from app import create_app
+from app.config import TestingConfig
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('calculator')
+    group.addoption('--live-server', action='store_true',
+                    help='run the API tests against a running server instead of in-process')
+    group.addoption('--base-url', default=os.environ.get('API_BASE_URL', 'http://localhost:8080'),
+                    help='server URL for --live-server (default: $API_BASE_URL or http://localhost:8080)')
+    group.addoption('--perf', action='store_true',
+                    help='capture per-endpoint timing and allocations')
+    group.addoption('--perf-report', metavar='PATH',
+                    help='write the --perf summary as JSON (implies --perf)')
+
+
+class InProcessResponse:
+    """The subset of ``requests.Response`` the tests use, over a test client response."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        body = response.get_data()
+        if response.headers.get('Content-Encoding') == 'gzip':
+            # requests decodes compressed bodies transparently; so does this
+            body = gzip.decompress(body)
+        self.text = body.decode('utf-8')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class EndpointStats:
+    __slots__ = ('durations_ns', 'allocated_bytes', 'allocated_blocks')
+
+    def __init__(self):
+        self.durations_ns = []
+        self.allocated_bytes = []
+        self.allocated_blocks = []
+
+    def summary(self):
+        durations = sorted(self.durations_ns)
+        calls = len(durations)
+        median = durations[calls // 2]
+        summary = {
+            'calls': calls,
+            'ns_per_op': median,
+            'p95_ns': durations[min(calls - 1, int(calls * 0.95))],
+            'max_ns': durations[-1],
+        }
+        if self.allocated_bytes:
+            summary['peak_allocated_bytes'] = max(self.allocated_bytes)
+            summary['mean_allocated_blocks'] = round(sum(self.allocated_blocks) / calls, 1)
+        return summary
+
+
+class PerfRecorder:
+    """Per-endpoint timing and allocation samples collected by :class:`ApiClient`."""
+
+    def __init__(self, allocations):
+        self.allocations = allocations
+        self.endpoints = {}
+
+    def measure(self, key, send):
+        stats = self.endpoints.get(key)
+        if stats is None:
+            stats = self.endpoints[key] = EndpointStats()
+        if self.allocations:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+            start_blocks = sys.getallocatedblocks()
+        start = time.perf_counter_ns()
+        response = send()
+        stats.durations_ns.append(time.perf_counter_ns() - start)
+        if self.allocations:
+            stats.allocated_bytes.append(tracemalloc.get_traced_memory()[1] - start_bytes)
+            stats.allocated_blocks.append(sys.getallocatedblocks() - start_blocks)
+        return response
+
+    def report(self, mode):
+        return {
+            'benchmark': 'micro',
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'commit': os.environ.get('GIT_COMMIT')},
+            'parameters': {'source': 'pytest', 'mode': mode},
+            'results': {key: stats.summary() for key, stats in sorted(self.endpoints.items())},
+        }
+
+
+class ApiClient:
+    """``get``/``post`` with a ``requests``-style signature for either mode.
+
+    Paths are relative (``"/api/calculate"``); ``timeout`` is ignored in
+    process.
+    """
+
+    def __init__(self, test_client=None, base_url=None, perf=None):
+        self.test_client = test_client
+        self.base_url = base_url
+        self.perf = perf
+        self.session = requests.Session() if test_client is None else None
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def request(self, method, path, timeout=None, **kwargs):
+        if self.test_client is not None:
+            def send():
+                return InProcessResponse(self.test_client.open(path, method=method, **kwargs))
+        else:
+            def send():
+                return self.session.request(method, self.base_url + path, timeout=timeout or 10, **kwargs)
+        if self.perf is None:
+            return send()
+        return self.perf.measure(f"{method} {path.split('?')[0]}", send)
+
+
+@pytest.fixture(scope='session')
+def perf_recorder(pytestconfig):
+    if not (pytestconfig.getoption('perf') or pytestconfig.getoption('perf_report')):
+        yield None
+        return
+    live = pytestconfig.getoption('live_server')
+    if not live:
+        tracemalloc.start()
+    recorder = PerfRecorder(allocations=not live)
+    pytestconfig._calculator_perf = recorder
+    yield recorder
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='session')
+def api_client(pytestconfig, perf_recorder):
+    """Client for the API under test; in-process unless ``--live-server``."""
+    if not pytestconfig.getoption('live_server'):
+        app = create_app(TestingConfig)
+        return ApiClient(test_client=app.test_client(), perf=perf_recorder)
+
+    base_url = pytestconfig.getoption('base_url').rstrip('/')
+    try:
+        response = requests.get(f"{base_url}/health", timeout=5)
+    except requests.RequestException as e:
+        pytest.exit(f"Cannot connect to server at {base_url} ({e}). Start it with ./docker-start.sh "
+                    f"or python run.py, or run without --live-server.")
+    if response.status_code != 200:
+        pytest.exit(f"Server at {base_url} responded to /health with status {response.status_code}.")
+    return ApiClient(base_url=base_url, perf=perf_recorder)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    recorder = getattr(config, '_calculator_perf', None)
+    if recorder is None or not recorder.endpoints:
+        return
+    mode = 'live' if config.getoption('live_server') else 'in-process'
+    report = recorder.report(mode)
+    terminalreporter.section(f'per-endpoint performance ({mode})')
+    header = f"{'endpoint':<32} {'calls':>6} {'median ms':>10} {'p95 ms':>8} {'max ms':>8}"
+    if recorder.allocations:
+        header += f" {'peak KiB':>9} {'blocks':>8}"
+    terminalreporter.write_line(header)
+    for key, summary in report['results'].items():
+        line = (f"{key:<32} {summary['calls']:>6} {summary['ns_per_op'] / 1e6:>10.3f} "
+                f"{summary['p95_ns'] / 1e6:>8.3f} {summary['max_ns'] / 1e6:>8.3f}")
+        if recorder.allocations:
+            line += f" {summary['peak_allocated_bytes'] / 1024:>9.1f} {summary['mean_allocated_blocks']:>8.1f}"
+        terminalreporter.write_line(line)
+    path = config.getoption('perf_report')
+    if path:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        terminalreporter.write_line(f'perf report written to {path}')
@@ -0,0 +1,22 @@
+import importlib
+import math
+
+from app.aggregate import BLOCK, _PythonKernel
+
+aggregate_module = importlib.import_module('app.aggregate')
+
+
+class TestPythonKernel:
+    """In-process tests of the pure-Python aggregate kernel."""
+
+    def test_dot_streams_and_checks_budget_per_block(self, monkeypatch):
+        """Test dot sums exactly in one pass, checking the CPU budget once per block"""
+        checks = []
+        monkeypatch.setattr(aggregate_module, 'check_budget', lambda: checks.append(1))
+        size = 2 * BLOCK + 1
+        assert _PythonKernel.dot([0.1] * size, [1.0] * size) == math.fsum([0.1] * size)
+        assert _PythonKernel.dot([0.1] * 10, [3.0] * 10) == 3.0000000000000004
+        assert len(checks) == 3 + 1
+
+        # Overflowing partial sums are re-read and halved, keeping the exact total
+        assert _PythonKernel.dot([1e308, 1e308, -1e308], [1.0, 1.0, 1.0]) == 1e308
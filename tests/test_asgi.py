@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app import asgi
+from app.asgi import create_asgi_app
+from app.config import TestingConfig
+
+
+def call(app, method, path, body=b'', headers=(), query=b'', chunks=None):
+    """Run one HTTP request through an ASGI app; returns ``(status, headers, body)``.
+
+    ``chunks`` sends the body as several ``http.request`` messages.
+    """
+    return asyncio.run(request(app, method, path, body, headers, query, chunks))
+
+
+async def request(app, method, path, body=b'', headers=(), query=b'', chunks=None):
+    """:func:`call` on the running event loop, for concurrent requests."""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks or [body]]
+    messages[-1]['more_body'] = False
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': query,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+        'client': ('127.0.0.1', 50000),
+    }
+    await app(scope, receive, send)
+    start = sent[0]
+    assert start['type'] == 'http.response.start'
+    response_headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def post_json(app, path, payload):
+    return call(app, 'POST', path, json.dumps(payload).encode(), [('Content-Type', 'application/json')])
+
+
+class TestASGI:
+    """In-process tests of the native ASGI app against the Flask app it wraps."""
+
+    @pytest.fixture(autouse=True, scope='class')
+    def _apps(self, request):
+        request.cls.app = create_asgi_app(TestingConfig)
+        request.cls.wsgi = request.cls.app.flask_app.test_client()
+
+    def test_calculate_matches_wsgi(self):
+        """Test API responses are byte-for-byte the same as the WSGI app's"""
+        for path, payload in (('/api/calculate', {'operation': '+', 'a': 2, 'b': 3}),
+                              ('/api/calculate', {'operation': '/', 'a': 1, 'b': 0}),
+                              ('/api/calculate/batch', [{'operation': '*', 'a': 2, 'b': 4},
+                                                        {'operation': 'sqrt', 'a': -1}]),
+                              ('/api/evaluate', {'expression': '2 * (3 + x)', 'variables': {'x': 1}}),
+                              ('/api/aggregate', {'values': [1, 2, 3, 4]})):
+            status, headers, body = post_json(self.app, path, payload)
+            expected = self.wsgi.post(path, json=payload)
+            assert status == expected.status_code
+            assert headers['content-type'] == 'application/json'
+            assert body == expected.get_data()
+        status, _, body = post_json(self.app, '/api/evaluate', {'expression': '2 * (3 + 4)'})
+        assert status == 200 and json.loads(body)['result'] == 14
+
+    def test_stream(self):
+        """Test NDJSON streaming across body chunks, with per-line errors"""
+        status, headers, body = call(self.app, 'POST', '/api/calculate/stream',
+                                     chunks=[b'{"operation": "+", "a": 2, "b": 3, "id": 1}\nnot js',
+                                             b'on\n{"operation": "/", "a": 1, "b": 0}\n'])
+        assert status == 200
+        assert headers['content-type'] == 'application/x-ndjson'
+        lines = [json.loads(line) for line in body.decode().splitlines()]
+        assert lines[0]['result'] == 5 and lines[0]['id'] == 1
+        assert 'error' in lines[1]
+        assert lines[2]['error'] == 'Division by zero'
+
+    def test_error_statuses(self):
+        """Test 400, 405, 404 and 413 responses"""
+        status, _, body = call(self.app, 'POST', '/api/calculate', b'not json',
+                               [('Content-Type', 'application/json')])
+        assert status == 400 and 'error' in json.loads(body)
+
+        status, headers, _ = call(self.app, 'GET', '/api/calculate')
+        assert status == 405 and headers['allow'] == 'POST'
+        status, _, _ = call(self.app, 'GET', '/api/calculate/stream')
+        assert status == 405
+
+        status, _, body = call(self.app, 'GET', '/no/such/path')
+        assert status == 404 and json.loads(body) == {'error': 'Not found'}
+
+        size = TestingConfig.MAX_CONTENT_LENGTH + 1
+        status, _, body = call(self.app, 'POST', '/api/calculate/batch', headers=[('Content-Length', str(size))])
+        assert status == 413 and 'too large' in json.loads(body)['error']
+        status, _, _ = call(self.app, 'POST', '/api/calculate/batch', chunks=[b'[' * (size // 2)] * 3)
+        assert status == 413
+
+    def test_admin_endpoints_require_token(self):
+        """Test the profiling endpoints reject missing or wrong bearer tokens"""
+        for headers in ((), [('Authorization', 'Bearer wrong-token')], [('Authorization', 'Basic abc')]):
+            status, _, body = call(self.app, 'GET', '/debug/profile', headers=headers, query=b'seconds=0.05')
+            assert status == 401 and json.loads(body) == {'error': 'Unauthorized'}
+        status, _, _ = call(self.app, 'GET', '/debug/allocations')
+        assert status == 401
+
+        token = [('Authorization', f'Bearer {TestingConfig.ADMIN_TOKEN}')]
+        status, headers, body = call(self.app, 'GET', '/debug/profile', headers=token,
+                                     query=b'seconds=0.05&format=json')
+        assert status == 200 and json.loads(body)['samples'] > 0
+
+    def test_metrics_matches_wsgi(self):
+        """Test /metrics has the same shape and formats as the WSGI app's"""
+        post_json(self.app, '/api/calculate', {'operation': '+', 'a': 1, 'b': 1})
+        status, headers, body = call(self.app, 'GET', '/metrics')
+        expected = self.wsgi.get('/metrics')
+        assert status == expected.status_code == 200
+        data, expected_data = json.loads(body), expected.get_json()
+        assert data.keys() == expected_data.keys()
+        assert data['metrics'].keys() == expected_data['metrics'].keys()
+        assert data['metrics']['endpoints'].keys() <= expected_data['metrics']['endpoints'].keys()
+        assert any(key.startswith('POST:main.calculate:') for key in data['metrics']['endpoints'])
+
+        status, headers, body = call(self.app, 'GET', '/metrics', query=b'format=prometheus')
+        expected = self.wsgi.get('/metrics?format=prometheus')
+        assert status == 200
+        assert headers['content-type'] == expected.headers['Content-Type']
+        assert b'calculator_requests_total' in body
+        assert {line.split(b' ')[2] for line in body.splitlines() if line.startswith(b'# TYPE')} == \
+            {line.split(b' ')[2] for line in expected.get_data().splitlines() if line.startswith(b'# TYPE')}
+
+    def test_large_request_does_not_block_the_event_loop(self, monkeypatch):
+        """Test a small request is answered while a large batch is still being calculated"""
+        endpoint, calculate_batch = asgi.API_ROUTES['/api/calculate/batch']
+        release = threading.Event()
+        seen = {}
+
+        def blocking_batch(data, config):
+            seen['thread'] = threading.current_thread()
+            seen['released'] = release.wait(5)
+            return calculate_batch(data, config)
+
+        monkeypatch.setitem(asgi.API_ROUTES, '/api/calculate/batch', (endpoint, blocking_batch))
+        size = 2000
+        large = json.dumps({'operation': '+', 'a': list(range(size)), 'b': [1] * size}).encode()
+        assert len(large) >= TestingConfig.ASGI_OFFLOAD_MIN_BYTES
+        headers = [('Content-Type', 'application/json')]
+
+        async def scenario():
+            batch = asyncio.create_task(request(self.app, 'POST', '/api/calculate/batch', large, headers))
+            while 'thread' not in seen:
+                await asyncio.sleep(0.01)
+            small = await request(self.app, 'POST', '/api/calculate',
+                                  json.dumps({'operation': '+', 'a': 2, 'b': 3}).encode(), headers)
+            release.set()
+            return small, await batch
+
+        (status, _, body), (batch_status, _, batch_body) = asyncio.run(scenario())
+        assert status == 200 and json.loads(body)['result'] == 5
+        assert batch_status == 200 and json.loads(batch_body)['results'] == [i + 1 for i in range(size)]
+        assert seen['released'] and seen['thread'] is not threading.main_thread()
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.executor import executor
+
+
+def executor_config(mode):
+    class ExecutorConfig(TestingConfig):
+        EXECUTOR_MODE = mode
+        EXECUTOR_WORKERS = 2
+        EXECUTOR_THRESHOLD = 100
+        EXECUTOR_CHUNK_SIZE = 30
+    return ExecutorConfig
+
+
+class TestExecutor:
+    """In-process tests of batches split across the thread and process pools."""
+
+    SIZE = 250
+
+    @pytest.fixture(autouse=True)
+    def _restore(self):
+        yield
+        # The executor is global; leave it as the other tests expect
+        executor.configure(mode=TestingConfig.EXECUTOR_MODE, workers=TestingConfig.EXECUTOR_WORKERS,
+                           threshold=TestingConfig.EXECUTOR_THRESHOLD, chunk_size=TestingConfig.EXECUTOR_CHUNK_SIZE)
+
+    @pytest.mark.parametrize('mode', ['thread', 'process'])
+    def test_chunked_batch_keeps_row_order_and_errors(self, mode):
+        """Test a batch above the threshold is chunked, reassembled in row order, with per-row errors"""
+        client = create_app(executor_config(mode)).test_client()
+        before = executor.stats()
+
+        divisors = [0 if i % 37 == 0 else i for i in range(self.SIZE)]
+        response = client.post('/api/calculate/batch', json={'operation': '/', 'a': list(range(self.SIZE)),
+                                                              'b': divisors})
+        assert response.status_code == 200
+        data = response.get_json()
+        failing = [i for i in range(self.SIZE) if i % 37 == 0]
+        assert [i for i, error in enumerate(data['errors']) if error] == failing
+        assert all(data['errors'][i] == 'Division by zero' and data['results'][i] is None for i in failing)
+        assert [result for i, result in enumerate(data['results']) if i not in failing] == \
+            [1.0] * (self.SIZE - len(failing))
+
+        response = client.post('/api/evaluate', json={'expression': 'sqrt(x) + 1',
+                                                      'bindings': {'x': [i - 10 for i in range(self.SIZE)]}})
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['errors'][:10] == ['Cannot calculate square root of negative number'] * 10
+        assert data['results'][10:] == [i ** 0.5 + 1 for i in range(self.SIZE - 10)]
+
+        stats = executor.stats()
+        assert stats['mode'] == mode
+        assert stats['parallel_runs'] - before['parallel_runs'] == 2
+        assert stats['chunks'] - before['chunks'] == 2 * 9
+
+        # Below the threshold stays inline
+        client.post('/api/calculate/batch', json={'operation': '+', 'a': [1, 2], 'b': [3, 4]})
+        assert executor.stats()['inline_runs'] == stats['inline_runs'] + 1
+
+    def test_counters_are_exact_under_contention(self):
+        """Test concurrent runs lose no counter updates"""
+        create_app(executor_config('thread'))
+        before = executor.stats()
+
+        def kernel(columns, start, end):
+            return [0.0] * (end - start), []
+
+        def run_many():
+            for _ in range(2000):
+                executor.run(kernel, {}, 10)
+
+        threads = [threading.Thread(target=run_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert executor.stats()['inline_runs'] - before['inline_runs'] == 16000
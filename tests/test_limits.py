@@ -0,0 +1,23 @@
+import threading
+
+from app.limits import AdmissionStats
+
+
+class TestAdmissionStats:
+    """In-process tests of the admission rejection counters."""
+
+    def test_counts_are_exact_under_contention(self):
+        """Test concurrent rejections lose no counter updates"""
+        stats = AdmissionStats()
+
+        def reject_many():
+            for _ in range(5000):
+                stats.reject('Request body too large', 'body_too_large', 413)
+
+        threads = [threading.Thread(target=reject_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        snapshot = stats.stats()
+        assert snapshot['body_too_large'] == snapshot['rejected'] == 40000
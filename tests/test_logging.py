@@ -0,0 +1,141 @@
+import io
+import logging
+import threading
+
+import pytest
+from structlog.testing import capture_logs
+
+from app.logging_config import AsyncBatchingHandler, LogSampler, RouteLogger
+
+
+class BlockingStream(io.StringIO):
+    """A stream whose writes wait for ``release``, so the writer thread can be held mid-batch."""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        self.writes = 0
+
+    def write(self, text):
+        self.writing.set()
+        self.release.wait(5)
+        self.writes += 1
+        return super().write(text)
+
+
+def record(message):
+    return logging.LogRecord('test', logging.INFO, __file__, 0, message, None, None)
+
+
+class TestAsyncBatchingHandler:
+    """In-process tests of the queued, batching log handler."""
+
+    def test_batches_and_drops_when_full(self):
+        """Test queued records are written in batches and records beyond a full queue are counted"""
+        stream = BlockingStream()
+        handler = AsyncBatchingHandler(stream, queue_size=10, batch_size=4, flush_interval=0.05)
+        try:
+            handler.emit(record('first'))
+            assert stream.writing.wait(5)
+            # The writer is stuck writing 'first'; the queue takes 10 more and drops the rest
+            for i in range(13):
+                handler.emit(record(f'line {i}'))
+            assert handler.stats()['dropped'] == 3
+            assert handler.stats()['queued'] == 10
+            stream.release.set()
+        finally:
+            handler.close()
+
+        assert stream.getvalue().splitlines() == ['first'] + [f'line {i}' for i in range(10)]
+        stats = handler.stats()
+        assert (stats['written'], stats['dropped'], stats['queued']) == (11, 3, 0)
+        # 'first' alone, then the ten queued records in batches of at most 4
+        assert stats['batches'] == stream.writes == 4
+
+    def test_drop_count_is_exact_under_contention(self):
+        """Test concurrent emits into a full queue lose no drop counts"""
+        stream = BlockingStream()
+        handler = AsyncBatchingHandler(stream, queue_size=1, batch_size=1, flush_interval=0.05)
+        try:
+            handler.emit(record('first'))
+            assert stream.writing.wait(5)
+            handler.emit(record('queued'))
+
+            def emit_many():
+                for _ in range(5000):
+                    handler.emit(record('dropped'))
+
+            threads = [threading.Thread(target=emit_many) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            assert handler.stats()['dropped'] == 40000
+            stream.release.set()
+        finally:
+            handler.close()
+        assert stream.getvalue().splitlines() == ['first', 'queued']
+
+    def test_close_flushes_queued_records(self):
+        """Test records still queued when the handler is closed are written"""
+        stream = io.StringIO()
+        handler = AsyncBatchingHandler(stream, queue_size=1000, batch_size=256, flush_interval=0.05)
+        for i in range(500):
+            handler.emit(record(f'line {i}'))
+        handler.close()
+        assert stream.getvalue().splitlines() == [f'line {i}' for i in range(500)]
+        assert handler.stats()['written'] == 500
+
+
+class TestRouteLogger:
+    """In-process tests of per-route log sampling."""
+
+    @pytest.fixture(autouse=True)
+    def _debug_level(self):
+        # Sampling is only visible for events that pass the level check
+        level = logging.root.level
+        logging.root.setLevel(logging.DEBUG)
+        yield
+        logging.root.setLevel(level)
+
+    def sampler(self, always_log_errors=True):
+        sampler = LogSampler()
+        sampler.configure(default_rate=0.5, route_rates={'quiet': 0.0, 'loud': 1.0},
+                          always_log_errors=always_log_errors)
+        return sampler
+
+    def test_rate_zero_logs_only_errors(self):
+        """Test a route sampled at 0 logs no successes, without building their fields, but every error"""
+        route_logger = RouteLogger('quiet', self.sampler())
+        with capture_logs() as logs:
+            for _ in range(100):
+                log = route_logger.begin()
+                log.info("Calculation successful", lambda: pytest.fail("fields built for a dropped event"))
+                log.debug("Calculating")
+        assert logs == []
+
+        with capture_logs() as logs:
+            for i in range(100):
+                log = route_logger.begin()
+                log.warning("Calculation error", lambda i=i: {'error': 'Division by zero', 'row': i})
+                log.error("Unexpected error")
+        assert [entry['event'] for entry in logs] == ["Calculation error", "Unexpected error"] * 100
+        assert [entry['row'] for entry in logs[::2]] == list(range(100))
+
+    def test_errors_are_sampled_when_not_always_logged(self):
+        """Test LOG_ALWAYS_LOG_ERRORS=false samples errors like everything else"""
+        route_logger = RouteLogger('quiet', self.sampler(always_log_errors=False))
+        with capture_logs() as logs:
+            for _ in range(100):
+                route_logger.begin().error("Unexpected error")
+        assert logs == []
+
+    def test_rate_one_always_logs(self):
+        """Test a route sampled at 1.0 logs every event with its fields"""
+        route_logger = RouteLogger('loud', self.sampler())
+        with capture_logs() as logs:
+            for i in range(100):
+                route_logger.begin().info("Calculation successful", lambda i=i: {'result': i})
+        assert [entry['result'] for entry in logs] == list(range(100))
+        assert all(entry['log_level'] == 'info' for entry in logs)
@@ -0,0 +1,128 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from app.metrics import MetricsCollector, mark_process_dead
+from app.shared_store import SnapshotFile
+
+
+def _exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class TestMetricsCollector:
+    """In-process tests of the metrics collector's shards and worker snapshots."""
+
+    def test_exited_thread_shards_are_retired(self):
+        """Test shards of exited threads are folded into totals instead of kept"""
+        collector = MetricsCollector()
+
+        def handle():
+            collector.record('POST', 'calculate', 200, 1000)
+            collector.record_stages('calculate', {'parse': 100})
+
+        for _ in range(50):
+            thread = threading.Thread(target=handle)
+            thread.start()
+            thread.join()
+
+        assert collector.local_stats()[('POST', 'calculate', 200)].histogram.count == 50
+        assert collector.local_stages()[('calculate', 'parse')].count == 50
+        assert not collector._shards and not collector._stage_shards
+
+        collector.record('POST', 'calculate', 200, 1000)
+        assert len(collector._shards) == 1
+        assert collector.local_stats()[('POST', 'calculate', 200)].histogram.count == 51
+
+    def _worker_snapshot(self, multiproc_dir, pid, requests):
+        """Publish a snapshot of ``requests`` calculations as worker ``pid``"""
+        worker = MetricsCollector()
+        worker.stats_providers['result_cache'] = lambda: {'size': 7}
+        for _ in range(requests):
+            worker.record('POST', 'calculate', 200, 1000)
+        snapshot = worker._snapshot()
+        snapshot['pid'] = pid
+        SnapshotFile(os.path.join(multiproc_dir, f'worker-{pid}.metrics')).write(json.dumps(snapshot).encode())
+
+    def test_exited_worker_snapshots(self, tmp_path):
+        """Test exited workers keep their counters only once retired, and never their gauges"""
+        collector = MetricsCollector()
+        collector.stats_providers['result_cache'] = lambda: {'size': 1}
+        collector.record('POST', 'calculate', 200, 1000)
+        collector.multiproc_dir = str(tmp_path)
+
+        retired, unretired = _exited_pid(), _exited_pid()
+        self._worker_snapshot(tmp_path, retired, 3)
+        self._worker_snapshot(tmp_path, unretired, 5)
+        mark_process_dead(str(tmp_path), retired)
+        assert not (tmp_path / f'worker-{retired}.metrics').exists()
+
+        request_stats, _, providers, _, workers = collector.aggregate()
+        assert workers == 1
+        assert providers['result_cache']['size'] == 1
+        # The retired worker's requests are kept; the one that was never retired is skipped
+        assert request_stats[('POST', 'calculate', 200)].histogram.count == 4
+
+        retired = _exited_pid()
+        self._worker_snapshot(tmp_path, retired, 2)
+        mark_process_dead(str(tmp_path), retired)
+        request_stats, _, _, _, workers = collector.aggregate()
+        assert workers == 1
+        assert request_stats[('POST', 'calculate', 200)].histogram.count == 6
+
+    def test_publisher_starts_with_first_request(self, tmp_path):
+        """Test a process that builds the app but serves nothing (a preload master) never publishes"""
+        collector = MetricsCollector()
+        collector.configure(str(tmp_path), publish_interval=0.01)
+        assert collector._publisher is None
+
+        thread = threading.Thread(target=collector.record, args=('POST', 'calculate', 200, 1000))
+        thread.start()
+        thread.join()
+        assert collector._publisher is not None
+        time.sleep(0.1)
+        collector._publisher_stop.set()
+        collector._publisher.join()
+        assert os.listdir(tmp_path) == [f'worker-{os.getpid()}.metrics']
+
+    def test_concurrent_publishes_are_serialized(self, tmp_path):
+        """Test the publisher thread and /metrics scrapes never write the snapshot file at the same time"""
+        collector = MetricsCollector()
+        collector.configure(str(tmp_path))
+        collector.record('POST', 'calculate', 200, 1000)
+        collector.publish()
+        snapshot_file = collector._snapshot_file
+        write = snapshot_file.write
+        writers = []
+        overlaps = []
+
+        def tracked_write(data):
+            writers.append(1)
+            if len(writers) > 1:
+                overlaps.append(len(writers))
+            time.sleep(0.001)
+            writers.pop()
+            return write(data)
+
+        snapshot_file.write = tracked_write
+
+        def scrape():
+            for _ in range(20):
+                collector.aggregate()
+
+        threads = [threading.Thread(target=scrape) for _ in range(4)] + \
+            [threading.Thread(target=lambda: [collector.publish() for _ in range(20)]) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        collector._publisher_stop.set()
+        assert overlaps == []
+        request_stats, _, _, _, workers = collector.aggregate()
+        assert workers == 1
+        assert request_stats[('POST', 'calculate', 200)].histogram.count == 1
@@ -0,0 +1,18 @@
+import pytest
+
+from app.numeric import NumericMode
+
+
+class TestNumericMode:
+    """In-process tests of the float mode's value handling."""
+
+    def test_float_parse(self):
+        """Test numbers and numeric strings parse to floats; bools, junk and non-finite values are rejected"""
+        mode = NumericMode()
+        assert mode.parse(2) == 2.0 and isinstance(mode.parse(2), float)
+        assert mode.parse(' 1.5 ') == 1.5
+        assert mode.literal('1e3') == 1000.0
+        assert mode.serialize(mode.apply(lambda a, b: a + b, 1.0, 2.0)) == 3.0
+        for value in (True, None, 'abc', [1], float('inf'), float('nan'), '-inf', '1e400'):
+            with pytest.raises(ValueError, match='Invalid number format'):
+                mode.parse(value)
@@ -0,0 +1,39 @@
+import threading
+
+from app.profiler import Profiler, ProfilerBusy
+
+
+class TestProfiler:
+    """In-process tests of the profiler's run lock and counters."""
+
+    def test_busy_count_is_exact_under_contention(self):
+        """Test concurrent requests rejected while a profile runs lose no busy counts"""
+        profiler = Profiler()
+        running = threading.Event()
+        release = threading.Event()
+
+        def hold():
+            running.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=profiler._run, args=(hold,))
+        holder.start()
+        assert running.wait(5)
+
+        def request_many():
+            for _ in range(2000):
+                try:
+                    profiler.sample(0.01)
+                except ProfilerBusy:
+                    pass
+
+        threads = [threading.Thread(target=request_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert profiler.stats()['running'] is True
+        release.set()
+        holder.join()
+        stats = profiler.stats()
+        assert (stats['busy'], stats['runs'], stats['running']) == (16000, 1, False)
@@ -0,0 +1,98 @@
+import json
+import os
+
+import pytest
+
+from app import create_app
+from app.asgi import CalculatorASGI
+from app.config import TestingConfig
+from app.rate_limit import BucketTable, rate_limiter
+from tests.test_asgi import call
+
+
+class RateLimitConfig(TestingConfig):
+    RATE_LIMIT_ENABLED = True
+    RATE_LIMIT_RATE = 0.5
+    RATE_LIMIT_BURST = 2
+    RATE_LIMIT_MAX_IN_FLIGHT = 1
+    RATE_LIMIT_CLIENT_HEADER = 'X-Client-Id'
+
+
+class TestRateLimit:
+    """In-process tests of the token buckets and in-flight limit, for both apps."""
+
+    @pytest.fixture(autouse=True)
+    def _app(self):
+        self.app = create_app(RateLimitConfig)
+        self.client = self.app.test_client()
+        yield
+        # The limiter is global; leave it as the other tests expect
+        rate_limiter.configure()
+
+    def post(self, path, **kwargs):
+        # Buffered, so the response is closed and the request released like a server would
+        return self.client.post(path, buffered=True, **kwargs)
+
+    def test_empty_bucket_is_rejected_before_parsing(self):
+        """Test 429 with Retry-After once a client's burst is spent, without reading the body"""
+        headers = {'X-Client-Id': 'bucket-test'}
+        for _ in range(2):
+            response = self.post('/api/calculate', json={'operation': '+', 'a': 1, 'b': 2}, headers=headers)
+            assert response.status_code == 200
+
+        # Unparseable and oversized bodies would get 400 and 413 if they were read
+        size = RateLimitConfig.MAX_CONTENT_LENGTH + 1
+        limited = rate_limiter.stats()['limited']
+        for response in (self.post('/api/calculate', data='not json', headers=headers,
+                                   content_type='application/json'),
+                         self.post('/api/calculate/batch', data=b'[' * size, headers=headers,
+                                   content_type='application/json')):
+            assert response.status_code == 429
+            assert response.get_json() == {'error': 'Rate limit exceeded'}
+            assert response.headers['Retry-After'] == '2'
+        assert rate_limiter.stats()['limited'] == limited + 2
+
+        # Other clients have their own buckets; probes and metrics are never limited
+        assert self.post('/api/calculate', json={'operation': '+', 'a': 1, 'b': 2},
+                         headers={'X-Client-Id': 'other'}).status_code == 200
+        assert self.client.get('/health', headers=headers).status_code == 200
+
+        status, response_headers, body = call(CalculatorASGI(self.app), 'POST', '/api/calculate', b'not json',
+                                              [('X-Client-Id', 'bucket-test')])
+        assert status == 429 and response_headers['retry-after'] == '2'
+        assert json.loads(body) == {'error': 'Rate limit exceeded'}
+
+    def test_requests_over_max_in_flight_are_shed(self):
+        """Test 503 when the worker already has RATE_LIMIT_MAX_IN_FLIGHT requests in progress"""
+        shed = rate_limiter.stats()['shed']
+        assert rate_limiter.acquire('in-progress') is None
+        try:
+            response = self.post('/api/calculate', json={'operation': '+', 'a': 1, 'b': 2},
+                                 headers={'X-Client-Id': 'shed-test'})
+            assert response.status_code == 503
+            assert response.get_json() == {'error': 'Server over capacity'}
+            assert response.headers['Retry-After'] == '1'
+            status, _, _ = call(CalculatorASGI(self.app), 'POST', '/api/calculate', b'{}')
+            assert status == 503
+            assert rate_limiter.stats()['shed'] == shed + 2
+        finally:
+            rate_limiter.release()
+
+        response = self.post('/api/calculate', json={'operation': '+', 'a': 1, 'b': 2},
+                             headers={'X-Client-Id': 'shed-test'})
+        assert response.status_code == 200
+        assert rate_limiter.stats()['in_flight'] == 0
+
+    def test_private_table_is_not_shared_after_fork(self):
+        """Test a table without a path is per process, even when built before a fork"""
+        table = BucketTable(slots=4)
+        pid = os.fork()
+        if pid == 0:
+            # The child spends the whole burst
+            for _ in range(3):
+                table.take('client', 1.0, 2.0, 1000.0)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        assert table.take('client', 1.0, 2.0, 1000.0) == 0.0
+        assert table.take('client', 1.0, 2.0, 1000.0) == 0.0
+        assert table.take('client', 1.0, 2.0, 1000.0) == 1.0
@@ -0,0 +1,116 @@
+import importlib
+import math
+
+import pytest
+
+from app import create_app
+from app.config import TestingConfig
+from app.result_cache import ResultCache, result_cache
+
+
+# The package re-exports the ``result_cache`` instance under the module's name
+result_cache_module = importlib.import_module('app.result_cache')
+
+
+class ResultCacheConfig(TestingConfig):
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_SIZE = 2
+
+
+class FakeClock:
+    now = 1000.0
+
+    @classmethod
+    def time(cls):
+        return cls.now
+
+
+class TestResultCache:
+    """In-process tests of the result cache, through the API and directly."""
+
+    @pytest.fixture(autouse=True)
+    def _restore(self):
+        yield
+        # The cache is global; leave it as the other tests expect
+        result_cache.configure(enabled=TestingConfig.RESULT_CACHE_ENABLED)
+
+    def cache_stats(self, client):
+        return client.get('/metrics').get_json()['metrics']['result_cache']
+
+    def test_hits_misses_and_cached_errors(self):
+        """Test repeated calculations and errors are answered from the cache"""
+        client = create_app(ResultCacheConfig).test_client()
+        assert self.cache_stats(client)['enabled'] is True
+
+        for _ in range(3):
+            response = client.post('/api/calculate', json={'operation': '*', 'a': 6, 'b': 7})
+            assert response.status_code == 200 and response.get_json()['result'] == 42
+        for _ in range(2):
+            response = client.post('/api/calculate', json={'operation': '/', 'a': 1, 'b': 0})
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Division by zero'
+        stats = self.cache_stats(client)
+        assert (stats['misses'], stats['hits'], stats['size']) == (2, 3, 2)
+        assert stats['hit_ratio'] == 3 / 5
+
+        # LRU: a third key evicts the least recently used one, which is then recomputed
+        client.post('/api/calculate', json={'operation': '+', 'a': 1, 'b': 1})
+        client.post('/api/calculate', json={'operation': '/', 'a': 1, 'b': 0})
+        stats = self.cache_stats(client)
+        assert (stats['misses'], stats['hits'], stats['evictions']) == (3, 4, 1)
+        client.post('/api/calculate', json={'operation': '*', 'a': 6, 'b': 7})
+        stats = self.cache_stats(client)
+        assert (stats['misses'], stats['evictions'], stats['size']) == (4, 2, 2)
+
+    def test_signed_zeros_are_distinct_keys(self, tmp_path):
+        """Test 0.0 and -0.0 are cached separately, locally and in the shared table"""
+        client = create_app(ResultCacheConfig).test_client()
+        misses = self.cache_stats(client)['misses']
+        response = client.post('/api/calculate', json={'operation': 'atan2', 'a': 0.0, 'b': -1})
+        assert response.get_json()['result'] == math.pi
+        response = client.post('/api/calculate', json={'operation': 'atan2', 'a': -0.0, 'b': -1})
+        assert response.get_json()['result'] == -math.pi
+        assert self.cache_stats(client)['misses'] == misses + 2
+
+        path = str(tmp_path / 'results')
+        first, second = ResultCache(), ResultCache()
+        for cache in (first, second):
+            # A single set, so both keys land in the same slots
+            cache.configure(shared_path=path, shared_slots=2)
+        assert first.calculate('atan2', 0.0, -1.0) == math.pi
+        assert second.calculate('atan2', -0.0, -1.0) == -math.pi
+        assert second.calculate('*', -0.0, 1.0) == 0.0
+        assert math.copysign(1, second.calculate('*', -0.0, 1.0)) == -1
+        assert second.shared_hits == 0
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        """Test an entry older than the TTL is recomputed"""
+        monkeypatch.setattr(result_cache_module, 'time', FakeClock)
+        cache = ResultCache()
+        cache.configure(ttl=10)
+        assert cache.calculate('+', 1, 2) == 3
+        FakeClock.now += 9
+        assert cache.calculate('+', 1, 2) == 3
+        assert (cache.misses, cache.local_hits) == (1, 1)
+        FakeClock.now += 2
+        assert cache.calculate('+', 1, 2) == 3
+        assert (cache.misses, cache.local_hits) == (2, 1)
+
+    def test_shared_table_across_workers(self, tmp_path):
+        """Test a result or error computed by one worker is found by another through the shared table"""
+        path = str(tmp_path / 'results')
+        first, second = ResultCache(), ResultCache()
+        for cache in (first, second):
+            cache.configure(shared_path=path, shared_slots=64)
+
+        assert first.calculate('sqrt', 16.0) == 4.0
+        with pytest.raises(ValueError, match='Division by zero'):
+            first.calculate('/', 1.0, 0.0)
+        assert second.calculate('sqrt', 16.0) == 4.0
+        with pytest.raises(ValueError, match='Division by zero'):
+            second.calculate('/', 1.0, 0.0)
+        assert (second.misses, second.shared_hits) == (0, 2)
+
+        # Found in the shared table once, then served from the worker's own LRU
+        assert second.calculate('sqrt', 16.0) == 4.0
+        assert (second.shared_hits, second.local_hits) == (2, 1)
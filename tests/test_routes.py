@@ -1,42 +1,33 @@
 import pytest
 import json
-import requests
-import time
-from requests.exceptions import ConnectionError, Timeout
+import os
+import re
+import struct
 
 
 class TestRoutes:
-    """Test suite for Flask Calculator API endpoints using real HTTP requests"""
+    """Test suite for Flask Calculator API endpoints.
+    
+    Runs in-process through Flask's test client by default, or with real
+    HTTP requests against a running server with ``--live-server`` (see
+    conftest.py).
+    """
     
-    BASE_URL = "http://localhost:8080"
     TIMEOUT = 5  # seconds
     
-    @classmethod
-    def setup_class(cls):
-        """Check if server is running before running tests"""
-        try:
-            response = requests.get(f"{cls.BASE_URL}/health", timeout=cls.TIMEOUT)
-            if response.status_code == 200:
-                print(f"\n✅ Server is running at {cls.BASE_URL}")
-            else:
-                pytest.exit(f"❌ Server responded with status {response.status_code}. Please start the server first.")
-        except ConnectionError:
-            pytest.exit(f"❌ Cannot connect to server at {cls.BASE_URL}. Please start the server first.\n"
-                       f"   Run: ./docker-start.sh or python run.py")
-        except Timeout:
-            pytest.exit(f"❌ Server at {cls.BASE_URL} is not responding. Please check server status.")
-        except Exception as e:
-            pytest.exit(f"❌ Error connecting to server: {str(e)}")
+    @pytest.fixture(autouse=True)
+    def _client(self, api_client):
+        self.client = api_client
     
     def test_index(self):
         """Test the main page loads correctly"""
-        response = requests.get(f"{self.BASE_URL}/")
+        response = self.client.get("/")
         assert response.status_code == 200
         assert 'Visual Calculator' in response.text
     
     def test_health_endpoint(self):
         """Test health check endpoint"""
-        response = requests.get(f"{self.BASE_URL}/health")
+        response = self.client.get("/health")
         assert response.status_code == 200
         data = response.json()
         assert data['status'] == 'healthy'
@@ -45,7 +36,7 @@ class TestRoutes:
     
     def test_metrics_endpoint(self):
         """Test metrics endpoint"""
-        response = requests.get(f"{self.BASE_URL}/metrics")
+        response = self.client.get("/metrics")
         assert response.status_code == 200
         data = response.json()
         assert data['status'] == 'ok'
@@ -55,7 +46,7 @@ class TestRoutes:
     def test_calculate_addition(self):
         """Test basic addition calculation"""
         payload = {'operation': '+', 'a': 5, 'b': 3}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -67,7 +58,7 @@ class TestRoutes:
     def test_calculate_division(self):
         """Test division calculation"""
         payload = {'operation': '/', 'a': 10, 'b': 2}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -76,7 +67,7 @@ class TestRoutes:
     def test_calculate_sqrt(self):
         """Test square root calculation"""
         payload = {'operation': 'sqrt', 'a': 16}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -84,7 +75,7 @@ class TestRoutes:
     
     def test_calculate_missing_data(self):
         """Test error handling for missing data"""
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                headers={'Content-Type': 'application/json'},
                                timeout=self.TIMEOUT)
         assert response.status_code == 400
@@ -92,10 +83,23 @@ class TestRoutes:
         assert 'error' in data
         assert data['error'] == 'No data provided'
     
+    def test_body_must_be_a_json_object(self):
+        """Test arrays, strings and other non-object bodies are rejected with 400"""
+        for path, error in (("/api/calculate", 'Invalid calculation format'),
+                            ("/api/calculate/batch", 'Invalid batch format'),
+                            ("/api/evaluate", 'Invalid expression format'),
+                            ("/api/evaluate/compile", 'Invalid expression format'),
+                            ("/api/aggregate", 'Invalid aggregate format')):
+            for body in ('[1, 2]', '"x"', '"expression"', '5', 'true'):
+                response = self.client.post(path, data=body, headers={'Content-Type': 'application/json'},
+                                            timeout=self.TIMEOUT)
+                assert response.status_code == 400, (path, body)
+                assert response.json()['error'] == error
+    
     def test_calculate_missing_parameters(self):
         """Test error handling for missing parameters"""
         payload = {'operation': '+'}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -105,7 +109,7 @@ class TestRoutes:
     def test_calculate_invalid_numbers(self):
         """Test error handling for invalid number format"""
         payload = {'operation': '+', 'a': 'not_a_number', 'b': 3}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -115,7 +119,7 @@ class TestRoutes:
     def test_calculate_division_by_zero(self):
         """Test error handling for division by zero"""
         payload = {'operation': '/', 'a': 10, 'b': 0}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -125,7 +129,7 @@ class TestRoutes:
     def test_evaluate_expression(self):
         """Test basic expression evaluation"""
         payload = {'expression': '5 + 3'}
-        response = requests.post(f"{self.BASE_URL}/api/evaluate", 
+        response = self.client.post("/api/evaluate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -134,7 +138,7 @@ class TestRoutes:
     
     def test_evaluate_missing_expression(self):
         """Test error handling for missing expression"""
-        response = requests.post(f"{self.BASE_URL}/api/evaluate", 
+        response = self.client.post("/api/evaluate", 
                                json={}, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -144,7 +148,7 @@ class TestRoutes:
     def test_evaluate_invalid_expression(self):
         """Test error handling for invalid expression"""
         payload = {'expression': 'not valid'}
-        response = requests.post(f"{self.BASE_URL}/api/evaluate", 
+        response = self.client.post("/api/evaluate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -154,7 +158,7 @@ class TestRoutes:
     def test_calculate_subtraction(self):
         """Test subtraction calculation"""
         payload = {'operation': '-', 'a': 10, 'b': 4}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -163,7 +167,7 @@ class TestRoutes:
     def test_calculate_multiplication(self):
         """Test multiplication calculation"""
         payload = {'operation': '*', 'a': 7, 'b': 6}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -173,7 +177,7 @@ class TestRoutes:
         """Test scientific function calculations"""
         # Test sin(0)
         payload = {'operation': 'sin', 'a': 0}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -181,7 +185,7 @@ class TestRoutes:
 
         # Test cos(0)
         payload = {'operation': 'cos', 'a': 0}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -189,7 +193,7 @@ class TestRoutes:
 
         # Test log(100)
         payload = {'operation': 'log', 'a': 100}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 200
         data = response.json()
@@ -199,7 +203,7 @@ class TestRoutes:
         """Test error cases for calculations"""
         # Test square root of negative
         payload = {'operation': 'sqrt', 'a': -4}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -207,7 +211,7 @@ class TestRoutes:
 
         # Test invalid operation
         payload = {'operation': 'invalid', 'a': 5, 'b': 3}
-        response = requests.post(f"{self.BASE_URL}/api/calculate", 
+        response = self.client.post("/api/calculate", 
                                json=payload, timeout=self.TIMEOUT)
         assert response.status_code == 400
         data = response.json()
@@ -225,7 +229,7 @@ class TestRoutes:
         
         for expression, expected in test_cases:
             payload = {'expression': expression}
-            response = requests.post(f"{self.BASE_URL}/api/evaluate", 
+            response = self.client.post("/api/evaluate", 
                                    json=payload, timeout=self.TIMEOUT)
             assert response.status_code == 200
             data = response.json()
@@ -238,7 +242,7 @@ class TestRoutes:
         """Test error cases for expression evaluation"""
         error_cases = [
             ('10 / 0', 'Division by zero'),
-            ('5 + 3 * 2', 'Invalid expression'),
+            ('5 + * 2', 'Invalid expression'),
             ('', 'No expression provided')
         ]
         
@@ -248,8 +252,451 @@ class TestRoutes:
             else:
                 payload = {'expression': ''}
             
-            response = requests.post(f"{self.BASE_URL}/api/evaluate", 
+            response = self.client.post("/api/evaluate", 
                                    json=payload, timeout=self.TIMEOUT)
             assert response.status_code == 400
             data = response.json()
-            assert 'error' in data
\ No newline at end of file
+            assert 'error' in data
+
+    def test_calculate_batch_rows(self):
+        """Test batch calculation with an array of calculations"""
+        payload = [
+            {'operation': '+', 'a': 5, 'b': 3},
+            {'operation': '/', 'a': 10, 'b': 0},
+            {'operation': 'sqrt', 'a': 16},
+            {'operation': 'sqrt', 'a': -4},
+            {'operation': '*', 'a': 7, 'b': 6}
+        ]
+        response = self.client.post("/api/calculate/batch",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['results'] == [8, None, 4, None, 42]
+        assert data['errors'][0] is None
+        assert 'Division by zero' in data['errors'][1]
+        assert 'square root' in data['errors'][3]
+        assert data['count'] == 5
+        assert data['error_count'] == 2
+
+    def test_calculate_batch_columns(self):
+        """Test batch calculation with columnar operands"""
+        payload = {'operation': '-', 'a': [10, 20, 'x'], 'b': [4, 5, 1]}
+        response = self.client.post("/api/calculate/batch",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['results'] == [6, 15, None]
+        assert data['errors'] == [None, None, 'Invalid number format']
+
+    def test_calculate_batch_invalid(self):
+        """Test error handling for malformed batches"""
+        payload = {'operation': ['+'], 'a': [1, 2], 'b': [3, 4]}
+        response = self.client.post("/api/calculate/batch",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 400
+        assert 'error' in response.json()
+        
+        # A non-string operation is a per-row error, not a server error
+        for payload in ({'operation': [['+'], '-'], 'a': [1, 1], 'b': [1, 2]},
+                        [{'operation': ['+'], 'a': 1, 'b': 2}, {'operation': '-', 'a': 1, 'b': 2}]):
+            response = self.client.post("/api/calculate/batch", json=payload, timeout=self.TIMEOUT)
+            assert response.status_code == 200
+            data = response.json()
+            assert data['errors'][0].startswith('Unknown operation')
+            assert data['results'][1] == -1 and data['errors'][1] is None
+        response = self.client.post("/api/calculate", json={'operation': ['+'], 'a': 1, 'b': 2},
+                                    timeout=self.TIMEOUT)
+        assert response.status_code == 400
+        
+        # A row whose scalar function fails does not fail the whole batch
+        body = '[{"operation": "sin", "a": Infinity}, {"operation": "+", "a": 1, "b": 2}]'
+        response = self.client.post("/api/calculate/batch", data=body,
+                                    headers={'Content-Type': 'application/json'}, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['results'] == [None, 3]
+        assert data['errors'] == ['Cannot calculate sin of infinity', None]
+        response = self.client.post("/api/evaluate", json={'expression': 'sin(x*x)', 'bindings': {'x': [1, 1e200]}},
+                                    timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        assert response.json()['errors'] == [None, 'Cannot calculate sin of infinity']
+
+    def test_evaluate_precedence_and_functions(self):
+        """Test operator precedence, parentheses and functions in expressions"""
+        test_cases = [
+            ('5 + 3 * 2', 11),
+            ('(5 + 3) * 2', 16),
+            ('-(2 + 3) * 4', -20),
+            ('2 * -3', -6),
+            ('sqrt(16) + ln(1)', 4),
+            ('10 / (2 + 3) - sqrt(4)', 0)
+        ]
+
+        for expression, expected in test_cases:
+            payload = {'expression': expression}
+            response = self.client.post("/api/evaluate",
+                                   json=payload, timeout=self.TIMEOUT)
+            assert response.status_code == 200
+            assert response.json()['result'] == expected
+
+    def test_evaluate_expression_cache_metrics(self):
+        """Test expression cache counters are exposed via metrics"""
+        for _ in range(2):
+            self.client.post("/api/evaluate",
+                        json={'expression': '7 * 6'}, timeout=self.TIMEOUT)
+        response = self.client.get("/metrics")
+        cache = response.json()['metrics']['expression_cache']
+        assert cache['hits'] >= 1
+        assert cache['misses'] >= 1
+        assert 'evictions' in cache
+
+    def test_evaluate_with_variables(self):
+        """Test expression evaluation with named variables"""
+        payload = {'expression': 'a * x + b', 'variables': {'a': 2, 'x': 3, 'b': 1}}
+        response = self.client.post("/api/evaluate",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        assert response.json()['result'] == 7
+
+        payload = {'expression': 'a * x + b', 'variables': {'a': 2}}
+        response = self.client.post("/api/evaluate",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 400
+        assert 'Missing value' in response.json()['error']
+
+    def test_evaluate_compiled_handle_with_bindings(self):
+        """Test compiling an expression once and evaluating it over bindings"""
+        response = self.client.post("/api/evaluate/compile",
+                               json={'expression': 'a * x + b'}, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        compiled = response.json()
+        assert compiled['variables'] == ['a', 'x', 'b']
+
+        payload = {
+            'handle': compiled['handle'],
+            'bindings': {'a': 2, 'x': [1, 2, 3, 'bad'], 'b': [0, 1, 2, 3]}
+        }
+        response = self.client.post("/api/evaluate",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['results'] == [2, 5, 8, None]
+        assert data['errors'][3] == 'Invalid number format'
+
+        payload = {'expression': 'sqrt(x) / y', 'bindings': [{'x': 16, 'y': 2}, {'x': 4, 'y': 0}]}
+        response = self.client.post("/api/evaluate",
+                               json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['results'] == [2, None]
+        assert data['errors'] == [None, 'Division by zero']
+
+    def test_metrics_latency_percentiles(self):
+        """Test metrics expose per-endpoint latency percentiles and rates"""
+        self.client.get("/health", timeout=self.TIMEOUT)
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        metrics = response.json()['metrics']
+        health = metrics['endpoints']['GET:main.health:200']
+        assert health['count'] >= 1
+        for field in ('p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'rate_1m', 'rate_5m', 'rate_15m'):
+            assert field in health
+        assert metrics['request_rates']['rate_1m'] > 0
+
+    def test_metrics_prometheus_format(self):
+        """Test metrics in the Prometheus text exposition format"""
+        self.client.get("/health", timeout=self.TIMEOUT)
+        response = self.client.get("/metrics?format=prometheus")
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain')
+        body = response.text
+        assert '# TYPE calculator_requests_total counter' in body
+        assert 'calculator_requests_total{method="GET",endpoint="main.health",status="200"}' in body
+        assert 'calculator_request_duration_seconds_bucket{' in body
+        assert 'le="+Inf"' in body
+
+    def test_metrics_result_cache(self):
+        """Test result cache counters are exposed via metrics"""
+        response = self.client.get("/metrics")
+        cache = response.json()['metrics']['result_cache']
+        for field in ('enabled', 'hits', 'misses', 'evictions', 'hit_ratio'):
+            assert field in cache
+
+    def test_non_finite_result_is_an_error(self):
+        """Test overflowing results are reported as errors, not Infinity or null"""
+        response = self.client.post("/api/calculate",
+                                 json={'operation': '*', 'a': 1e308, 'b': 10})
+        assert response.status_code == 400
+        assert response.json()['error'] == 'Result is not a finite number'
+
+        response = self.client.post("/api/evaluate", json={'expression': 'x * x', 'variables': {'x': 1e200}})
+        assert response.status_code == 400
+        assert response.json()['error'] == 'Result is not a finite number'
+
+        response = self.client.post("/api/calculate/batch",
+                                 json={'operation': '*', 'a': [1e308, 2], 'b': [10, 3]})
+        assert response.status_code == 200
+        data = json.loads(response.text, parse_constant=lambda c: pytest.fail(c))
+        assert data['results'] == [None, 6]
+        assert data['errors'] == ['Result is not a finite number', None]
+
+        response = self.client.post("/api/evaluate",
+                                 json={'expression': 'x * x', 'bindings': {'x': [1e200, 3]}})
+        assert response.status_code == 200
+        assert response.json()['results'] == [None, 9]
+        assert response.json()['errors'] == ['Result is not a finite number', None]
+
+    def test_calculate_stream(self):
+        """Test NDJSON streaming with per-line errors for malformed input"""
+        body = ('{"operation": "+", "a": 2, "b": 3, "id": "first"}\n'
+                'not json\n'
+                '{"operation": "/", "a": 1, "b": 0}\n'
+                '{"operation": "sqrt", "a": 16}\n')
+        response = self.client.post("/api/calculate/stream", data=body,
+                                 headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('application/x-ndjson')
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert lines[0] == {'line': 1, 'result': 5.0, 'error': None, 'id': 'first'}
+        assert lines[1]['line'] == 2 and lines[1]['error'] == 'Invalid JSON'
+        assert lines[2]['error'] == 'Division by zero'
+        assert lines[3]['result'] == 4.0
+        assert lines[4] == {'done': True, 'count': 4, 'error_count': 2}
+
+    def test_liveness_and_readiness(self):
+        """Test the probe endpoints and start-up timings in metrics"""
+        response = self.client.get("/livez")
+        assert response.status_code == 200
+        assert response.json() == {'status': 'alive'}
+        response = self.client.get("/readyz")
+        assert response.status_code == 200
+        assert response.json() == {'status': 'ready'}
+        
+        startup = self.client.get("/metrics").json()['metrics']['startup']
+        assert startup['ready'] is True
+        assert startup['ready_after_ms'] > 0
+        for phase in ('import', 'create_app', 'assets'):
+            assert phase in startup['phases_ms']
+
+    def test_metrics_executor(self):
+        """Test executor mode and counters are exposed via metrics"""
+        response = self.client.get("/metrics")
+        executor = response.json()['metrics']['executor']
+        assert executor['mode'] in ('inline', 'thread', 'process')
+        for field in ('workers', 'threshold', 'inline_runs', 'parallel_runs', 'chunks'):
+            assert field in executor
+
+    def test_calculate_exact_modes(self):
+        """Test decimal and rational modes return exact results as strings"""
+        response = self.client.post("/api/calculate",
+                                 json={'operation': '+', 'a': '0.1', 'b': '0.2', 'mode': 'decimal'})
+        assert response.status_code == 200
+        assert response.json()['result'] == '0.3'
+        assert response.json()['mode'] == 'decimal'
+
+        response = self.client.post("/api/evaluate",
+                                 json={'expression': 'x / 3 + 1/6', 'variables': {'x': '1/2'},
+                                       'mode': 'rational'})
+        assert response.status_code == 200
+        assert response.json()['result'] == '1/3'
+
+    def test_calculate_exact_mode_limits(self):
+        """Test exact modes reject oversized operands, precision and unsupported operations"""
+        for payload in ({'operation': '*', 'a': '1e100000', 'b': 2, 'mode': 'decimal'},
+                        {'operation': '/', 'a': 1, 'b': 3, 'mode': 'decimal', 'precision': 10 ** 6},
+                        {'operation': 'sin', 'a': 1, 'mode': 'rational'},
+                        {'operation': '+', 'a': 1, 'b': 2, 'mode': 'complex'}):
+            response = self.client.post("/api/calculate", json=payload)
+            assert response.status_code == 400
+            assert 'error' in response.json()
+
+    def test_request_body_too_large(self):
+        """Test bodies over MAX_CONTENT_LENGTH are rejected with 413 before parsing"""
+        body = '[' + ','.join(['{"operation": "+", "a": 1, "b": 2}'] * 100000) + ']'
+        response = self.client.post("/api/calculate/batch", data=body,
+                                 headers={'Content-Type': 'application/json'})
+        assert response.status_code == 413
+        assert 'too large' in response.json()['error']
+
+    def test_expression_admission_limits(self):
+        """Test oversized or deeply nested expressions are rejected with 422 and counted"""
+        before = self.client.get("/metrics").json()['metrics']['admission']['rejected']
+        for expression in ('+'.join(['1'] * 2000), '(' * 200 + '1' + ')' * 200, '-' * 200 + '1'):
+            response = self.client.post("/api/evaluate", json={'expression': expression})
+            assert response.status_code == 422
+            assert 'error' in response.json()
+        admission = self.client.get("/metrics").json()['metrics']['admission']
+        assert admission['rejected'] >= before + 3
+        assert admission['expression_tokens'] >= 1 and admission['expression_depth'] >= 2
+
+    def test_metrics_rate_limit(self):
+        """Test rate limiter state and the in-flight gauge are exposed via metrics"""
+        response = self.client.get("/metrics")
+        rate_limit = response.json()['metrics']['rate_limit']
+        for field in ('enabled', 'in_flight', 'peak_in_flight', 'admitted', 'limited', 'shed'):
+            assert field in rate_limit
+
+    def test_calculate_registered_operations(self):
+        """Test the extended operations, alone, in batches and in expressions"""
+        test_cases = [
+            ({'operation': 'pow', 'a': 2, 'b': 10}, 1024),
+            ({'operation': 'mod', 'a': -7, 'b': 3}, 2),
+            ({'operation': 'exp', 'a': 0}, 1),
+            ({'operation': 'hypot', 'a': 3, 'b': 4}, 5),
+            ({'operation': 'atan2', 'a': 0, 'b': 1}, 0),
+            ({'operation': 'factorial', 'a': 5}, 120),
+        ]
+        for payload, expected in test_cases:
+            response = self.client.post("/api/calculate", json=payload, timeout=self.TIMEOUT)
+            assert response.status_code == 200
+            assert response.json()['result'] == expected
+
+        for payload in ({'operation': 'pow', 'a': -8, 'b': 0.5}, {'operation': 'mod', 'a': 1, 'b': 0},
+                        {'operation': 'factorial', 'a': 2.5}, {'operation': 'hypot', 'a': 3}):
+            response = self.client.post("/api/calculate", json=payload, timeout=self.TIMEOUT)
+            assert response.status_code == 400
+            assert 'error' in response.json()
+
+        payload = {'operation': 'pow', 'a': [2, 0, -8], 'b': [3, -1, 0.5]}
+        response = self.client.post("/api/calculate/batch", json=payload, timeout=self.TIMEOUT)
+        data = response.json()
+        assert data['results'] == [8, None, None]
+        assert data['errors'][1] == 'Division by zero'
+        assert 'fractional power' in data['errors'][2]
+
+        response = self.client.post("/api/evaluate", json={'expression': 'pow(x, 2) + mod(7, 3)',
+                                                           'variables': {'x': 3}}, timeout=self.TIMEOUT)
+        assert response.json()['result'] == 10
+        response = self.client.post("/api/evaluate", json={'expression': 'pow(2)'}, timeout=self.TIMEOUT)
+        assert response.status_code == 400
+        assert 'takes 2 arguments' in response.json()['error']
+
+    def test_aggregate(self):
+        """Test aggregate statistics from JSON and packed float64 bodies"""
+        payload = {'values': [2, 4, 4, 4, 5, 5, 7, 9], 'quantiles': [0, 0.5, 1]}
+        response = self.client.post("/api/aggregate", json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        data = response.json()
+        assert data['count'] == 8
+        results = data['results']
+        assert results['sum'] == 40 and results['mean'] == 5
+        assert results['variance'] == 4 and results['stddev'] == 2
+        assert results['min'] == 2 and results['max'] == 9
+        assert [q['value'] for q in results['quantiles']] == [2, 4.5, 9]
+
+        # Compensated: a naive left-to-right sum of these returns 0
+        payload = {'values': [1e16, 1, -1e16, 1], 'other': [1, 1, 1, 1], 'operations': ['sum', 'dot', 'cumsum']}
+        results = self.client.post("/api/aggregate", json=payload, timeout=self.TIMEOUT).json()['results']
+        assert results['sum'] == 2 and results['dot'] == 2
+        assert results['cumsum'] == [1e16, 1e16, 1, 2]
+
+        body = struct.pack('<6d', 1, 2, 3, 4, 5, 6)
+        response = self.client.post("/api/aggregate?operations=sum,dot&columns=2", data=body,
+                                    headers={'Content-Type': 'application/octet-stream'}, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        assert response.json() == {'count': 3, 'results': {'sum': 6, 'dot': 32}}
+
+        # A partial sum that overflows does not lose the finite total
+        payload = {'values': [1e308, 1e308, -1e308], 'operations': ['sum', 'cumsum']}
+        response = self.client.post("/api/aggregate", json=payload, timeout=self.TIMEOUT)
+        assert response.status_code == 200
+        assert response.json()['results']['sum'] == 1e308
+        # Infinities give the IEEE result rather than an error
+        for values in ((float('inf'), 1), (float('inf'), float('-inf'))):
+            response = self.client.post("/api/aggregate?operations=sum,mean,cumsum",
+                                        data=struct.pack('<2d', *values),
+                                        headers={'Content-Type': 'application/octet-stream'}, timeout=self.TIMEOUT)
+            assert response.status_code == 200
+            assert len(response.json()['results']['cumsum']) == 2
+
+        for payload in ({'values': []}, {'values': [1, 'x']}, {'values': [1], 'operations': ['median']}, [1, 2]):
+            response = self.client.post("/api/aggregate", json=payload, timeout=self.TIMEOUT)
+            assert response.status_code == 400
+            assert 'error' in response.json()
+        response = self.client.post("/api/aggregate", data=b'1234567',
+                                    headers={'Content-Type': 'application/octet-stream'}, timeout=self.TIMEOUT)
+        assert response.status_code == 400
+
+    def test_static_assets(self):
+        """Test fingerprinted, pre-compressed assets and conditional requests"""
+        identity = {'Accept-Encoding': 'identity'}
+        page = self.client.get("/", headers=identity)
+        assert page.headers['Cache-Control'] == 'no-cache'
+        script = re.search(r'src="(/static/js/calculator\.[0-9a-f]+\.js)"', page.text).group(1)
+        stylesheet = re.search(r'href="(/static/css/style\.[0-9a-f]+\.css)"', page.text).group(1)
+        
+        response = self.client.get(script, headers=identity)
+        assert response.status_code == 200
+        assert 'immutable' in response.headers['Cache-Control']
+        assert 'Content-Encoding' not in response.headers
+        assert 'function calculate()' in response.text
+        etag = response.headers['ETag']
+        
+        response = self.client.get(script, headers={'Accept-Encoding': 'gzip'})
+        assert response.status_code == 200
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert response.headers['ETag'] != etag
+        
+        response = self.client.get(script, headers={'Accept-Encoding': 'identity', 'If-None-Match': etag})
+        assert response.status_code == 304
+        
+        response = self.client.get(stylesheet, headers=identity)
+        assert response.headers['Content-Type'].startswith('text/css')
+        response = self.client.get("/static/css/style.css", headers=identity)
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'no-cache'
+        assert self.client.get("/static/missing.js").status_code == 404
+    
+    def test_request_stage_metrics(self):
+        """Test traced requests report a per-stage latency breakdown in metrics"""
+        traceparent = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00'
+        for headers in ({'traceparent': traceparent}, {'traceparent': 'not-a-traceparent'}, {}):
+            response = self.client.post("/api/calculate", json={'operation': '+', 'a': 1, 'b': 2},
+                                        headers=headers)
+            assert response.status_code == 200
+            assert response.json()['result'] == 3
+        
+        metrics = self.client.get("/metrics").json()['metrics']
+        stages = metrics['stages']['main.calculate']
+        for name in ('parse', 'validate', 'calculate', 'serialize', 'other'):
+            assert stages[name]['count'] >= 3
+        assert metrics['tracing']['enabled'] is True
+        assert metrics['tracing']['started'] >= 3
+        
+        text = self.client.get("/metrics?format=prometheus").text
+        assert 'calculator_request_stage_seconds_count{endpoint="main.calculate",stage="parse"}' in text
+    
+    def test_debug_profiler(self):
+        """Test the admin-only stack profiler and allocation snapshot endpoints"""
+        response = self.client.get("/debug/profile?seconds=0.1")
+        if response.status_code == 404:
+            pytest.skip("profiling endpoints need ADMIN_TOKEN on the server")
+        assert response.status_code == 401
+        headers = {'Authorization': 'Bearer ' + os.environ.get('API_ADMIN_TOKEN', 'test-admin-token')}
+        response = self.client.get("/debug/profile?seconds=0.1", headers={'Authorization': 'Bearer wrong'})
+        assert response.status_code == 401
+        
+        response = self.client.get("/debug/profile?seconds=0.1&interval=0.005", headers=headers)
+        assert response.status_code == 200
+        assert response.headers['Content-Type'].startswith('text/plain')
+        for line in response.text.splitlines():
+            stack, count = line.rsplit(' ', 1)
+            assert int(count) >= 1 and stack
+        
+        response = self.client.get("/debug/profile?seconds=0.1&format=json&idle=true", headers=headers)
+        profile = response.json()
+        assert profile['samples'] >= 1
+        assert all(count >= 1 for count in profile['stacks'].values())
+        
+        response = self.client.get("/debug/allocations?seconds=0.1&top=5", headers=headers)
+        assert response.status_code == 200
+        allocations = response.json()
+        assert len(allocations['top']) <= 5
+        for entry in allocations['top']:
+            assert {'location', 'size_diff', 'count_diff'} <= set(entry)
+        
+        for query in ('seconds=0', 'seconds=abc', 'interval=5', 'format=svg'):
+            assert self.client.get("/debug/profile?" + query, headers=headers).status_code == 400
+        assert self.client.get("/debug/allocations?key=bogus", headers=headers).status_code == 400
+        assert self.client.get("/metrics").json()['metrics']['profiler']['runs'] >= 3
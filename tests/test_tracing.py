@@ -0,0 +1,50 @@
+import threading
+
+from app.tracing import SpanExporter, Tracer
+
+
+def run_concurrently(target, threads=8):
+    workers = [threading.Thread(target=target) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+
+class TestTracingCounters:
+    """In-process tests of the tracer and exporter counters."""
+
+    def test_tracer_counts_are_exact_under_contention(self):
+        """Test concurrent requests lose no started or sampled counts"""
+        tracer = Tracer()
+        tracer.configure(sample_rate=1.0)
+
+        def trace_many():
+            for _ in range(2000):
+                trace, token = tracer.start()
+                duration = tracer.finish(trace, token)
+                tracer.export(trace, duration, 'GET test', {})
+
+        run_concurrently(trace_many)
+        stats = tracer.stats()
+        assert (stats['started'], stats['sampled']) == (16000, 16000)
+
+    def test_exporter_counts_are_exact_under_contention(self):
+        """Test concurrent exports into a full queue lose no drop counts, and flushed spans are counted"""
+        sent = []
+        exporter = SpanExporter(sent.append, {'service.name': 'test'}, queue_size=1, batch_size=512,
+                                interval=60)
+        try:
+            exporter.export([{'name': 'queued'}])
+
+            def export_many():
+                for _ in range(2000):
+                    exporter.export([{'name': 'dropped'}])
+
+            run_concurrently(export_many)
+            assert exporter.stats()['dropped'] == 16000
+        finally:
+            exporter.close()
+        stats = exporter.stats()
+        assert (stats['exported'], stats['failed'], stats['queued']) == (1, 0, 0)
+        assert len(sent) == 1